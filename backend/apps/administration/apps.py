@@ -5,3 +5,8 @@ class AdministrationConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.administration"
     verbose_name = "Administration"
+
+    def ready(self):
+        from .audit import connect_signals
+
+        connect_signals()
@@ -0,0 +1,658 @@
+"""
+Audit Log Writer - capture changes to project data into AuditLog off the request path.
+
+AuditLog lives in the public schema, so writing it from every save would add
+a cross-schema INSERT to each mutation. Instead:
+
+- Single-object saves and deletes of the AUDITED_MODELS are captured by
+  signals (connected in AdministrationConfig.ready). Tag edits take no extra
+  query: the history triggers already write each save's diff to TagRevision,
+  and post_save / post_delete only hand over a job that copies that row into
+  AuditLog. For the other models, which are edited rarely, pre_save reads the
+  stored values of the fields being saved with one primary-key lookup and
+  post_save diffs them against the instance. Loading instances costs
+  nothing, so read paths don't pay for auditing.
+- Set-based writes (bulk updates, imports, typical instantiation) don't send
+  signals. They call audit_tag_revisions() inside their transaction; the
+  per-tag diffs the history triggers already wrote to TagRevision are then
+  copied into AuditLog by a single INSERT ... SELECT.
+- Captured records are handed over when the transaction commits (nothing is
+  audited for rolled-back work) to a process-wide AuditWriter: a bounded
+  in-process buffer drained by a background thread, which writes batches of
+  up to AUDIT_BATCH_SIZE records with one COPY.
+
+Back-pressure: when the buffer is full, callers wait up to
+AUDIT_ENQUEUE_TIMEOUT for room and then write their records themselves, so
+records are never dropped and memory stays bounded. The buffer is drained
+at interpreter exit (atexit), and AUDIT_LOG_MODE = "sync" writes records
+immediately inside the caller's transaction (for tests and scripts);
+"off" disables capture.
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import JSONField
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.utils import timezone
+from django_tenants.utils import get_public_schema_name
+
+from .audit_storage import ensure_partitions, month_start
+from .models import AuditLog, Organization
+
+logger = logging.getLogger(__name__)
+
+# Models whose saves and deletes are audited; only these get delete receivers,
+# so cascades through other models keep Django's fast deletes
+AUDITED_MODELS = (
+    "core_engineering.PlantHierarchy",
+    "core_engineering.InstrumentType",
+    "core_engineering.Loop",
+    "core_engineering.Tag",
+    "core_engineering.TypicalLoop",
+    "core_engineering.NamingConvention",
+)
+
+# Audited models whose changes are read from TagRevision (history triggers)
+HISTORY_MODELS = ("core_engineering.Tag",)
+TAG_REVISION_TABLE = "core_engineering_tagrevision"
+
+# Fields that change on every save and carry no information
+IGNORED_FIELDS = ("created_at", "updated_at", "lft", "rght", "tree_id", "level")
+
+# Fields that alone don't make a change worth auditing (bumped by Tag.save)
+NOISE_FIELDS = ("revision",)
+
+COLUMNS = (
+    "organization_id",
+    "project_id",
+    "user_id",
+    "action",
+    "model_name",
+    "object_id",
+    "object_repr",
+    "old_values",
+    "new_values",
+    "ip_address",
+    "user_agent",
+    "timestamp",
+)
+
+_request = contextvars.ContextVar("audit_request", default=None)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def audit_mode():
+    """"async" (default), "sync" or "off"."""
+    return _setting("AUDIT_LOG_MODE", "async")
+
+
+def _public_table():
+    quote = connection.ops.quote_name
+    return f"{quote(get_public_schema_name())}.{quote(AuditLog._meta.db_table)}"
+
+
+# =============================================================================
+# Request context
+# =============================================================================
+
+def set_request(request):
+    """Make request the source of user / IP / user agent for captured records."""
+    return _request.set(request)
+
+
+def reset_request(token):
+    _request.reset(token)
+
+
+def _actor():
+    """(user_id, ip_address, user_agent) of the current request."""
+    request = _request.get()
+    if request is None:
+        return None, None, ""
+    # DRF sets user on the underlying HttpRequest once it has authenticated
+    user = getattr(request, "user", None)
+    user_id = user.pk if user is not None and user.is_authenticated else None
+    forwarded = request.META.get("HTTP_X_FORWARDED_FOR", "")
+    ip_address = (
+        forwarded.split(",")[0].strip() or request.META.get("REMOTE_ADDR") or None
+    )
+    return user_id, ip_address, request.META.get("HTTP_USER_AGENT", "")[:500]
+
+
+_schema_projects = {}
+
+
+def _project():
+    """(organization_id, project_id) of the current tenant schema."""
+    tenant = getattr(connection, "tenant", None)
+    schema_name = getattr(tenant, "schema_name", None)
+    if tenant is None or schema_name == get_public_schema_name():
+        return None, None
+    if getattr(tenant, "pk", None) is not None:
+        return getattr(tenant, "organization_id", None), tenant.pk
+    # schema_context() sets a FakeTenant without the project
+    if schema_name not in _schema_projects:
+        from apps.tenants.models import ProjectTenant
+
+        project = (
+            ProjectTenant.objects.filter(schema_name=schema_name)
+            .values_list("organization_id", "pk").first()
+        )
+        _schema_projects[schema_name] = project or (None, None)
+    return _schema_projects[schema_name]
+
+
+# =============================================================================
+# Writer
+# =============================================================================
+
+def _revision_table(schema):
+    quote = connection.ops.quote_name
+    return f"{quote(schema)}.{quote(TAG_REVISION_TABLE)}"
+
+
+@dataclass
+class RevisionJob:
+    """
+    Copy TagRevision rows into AuditLog: those written by one set-based
+    operation, or the one written by a Tag save or delete. condition selects
+    the rows (as r) with params.
+    """
+
+    schema: str
+    condition: str
+    params: list
+    organization_id: Any
+    project_id: int
+    user_id: Any
+    ip_address: Any
+    user_agent: str
+
+    def run(self):
+        quote = connection.ops.quote_name
+        organizations = (
+            f"{quote(get_public_schema_name())}."
+            f"{quote(Organization._meta.db_table)}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {_public_table()} ({", ".join(COLUMNS)})
+                SELECT (SELECT o.id FROM {organizations} o WHERE o.id = %s),
+                       %s, %s, r.action, 'Tag', r.tag_id::text, r.tag_number,
+                       CASE WHEN r.action = 'CREATE' THEN '{{}}'::jsonb ELSE d.old END,
+                       CASE WHEN r.action = 'DELETE' THEN '{{}}'::jsonb ELSE d.new END,
+                       %s, %s, r.changed_at
+                FROM {_revision_table(self.schema)} r
+                CROSS JOIN LATERAL (
+                    SELECT jsonb_object_agg(key, CASE WHEN key = 'spec_data'
+                               THEN value -> '-' ELSE value -> 0 END) AS old,
+                           jsonb_object_agg(key, CASE WHEN key = 'spec_data'
+                               THEN value -> '+' ELSE value -> 1 END) AS new
+                    FROM jsonb_each(r.changes)
+                ) d
+                WHERE {self.condition}
+                  AND (r.action <> 'UPDATE' OR r.changes - 'revision' <> '{{}}'::jsonb)
+                ORDER BY r.id
+                """,
+                [
+                    self.organization_id, self.project_id, self.user_id,
+                    self.ip_address, self.user_agent, *self.params,
+                ],
+            )
+
+
+def _write_records(records):
+    """Write AuditLog instances in one statement through the current connection."""
+    organization_ids = {record.organization_id for record in records} - {None}
+    if organization_ids:
+        # ProjectTenant.organization_id isn't a foreign key; don't let a stale id
+        # fail the batch
+        existing = set(
+            Organization.objects.using(connection.alias)
+            .filter(pk__in=organization_ids).values_list("pk", flat=True)
+        )
+        for record in records:
+            if record.organization_id not in existing:
+                record.organization_id = None
+
+    with connection.cursor() as cursor:
+        with cursor.cursor.copy(
+            f"COPY {_public_table()} ({', '.join(COLUMNS)}) FROM STDIN"
+        ) as copy_:
+            for record in records:
+                copy_.write_row([
+                    json.dumps(getattr(record, column), cls=DjangoJSONEncoder)
+                    if column in ("old_values", "new_values")
+                    else getattr(record, column)
+                    for column in COLUMNS
+                ])
+
+
+def write(items):
+    """Write records and run revision jobs synchronously on the current connection."""
+    records = [item for item in items if isinstance(item, AuditLog)]
+    if records:
+        _write_records(records)
+    for item in items:
+        if isinstance(item, RevisionJob):
+            item.run()
+
+
+class AuditWriter:
+    """
+    Bounded buffer of audit records flushed by a background thread.
+
+    The thread wakes when batch_size items are waiting or flush_interval
+    seconds after the oldest one arrived, and writes through its own
+    database connection in the public schema. It also creates the monthly
+    audit partitions when a month starts (see audit_storage.py).
+    """
+
+    def __init__(self, buffer_size=10000, batch_size=500, flush_interval=1.0,
+                 enqueue_timeout=0.5):
+        self.buffer_size = buffer_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._buffer = deque()
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._partitions_month = None
+
+    def submit(self, items):
+        """
+        Queue records / jobs; blocks briefly and then writes inline when the
+        buffer is full.
+        """
+        if not items:
+            return
+        if self._pid != os.getpid():
+            # Forked worker process: the parent's thread and buffer aren't ours
+            self._reset()
+        with self._condition:
+            if not self._closed:
+                self._start()
+                deadline = time.monotonic() + self.enqueue_timeout
+                while len(self._buffer) + len(items) > self.buffer_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                else:
+                    was_empty = not self._buffer
+                    self._buffer.extend(items)
+                    # Wake the thread to start the flush timer, or to write a full batch
+                    if was_empty or len(self._buffer) >= self.batch_size:
+                        self._condition.notify_all()
+                    return
+        logger.warning(
+            "Audit buffer full or closed; writing %d records inline", len(items)
+        )
+        write(items)
+
+    def flush(self, timeout=None):
+        """
+        Wait until everything queued so far has been written. Returns False on
+        timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self._condition.notify_all()
+            while self._buffer or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                if self._thread is None or not self._thread.is_alive():
+                    break
+                self._condition.wait(remaining if remaining is not None else 0.1)
+        if self._buffer:
+            self._drain()
+        return True
+
+    def close(self, timeout=10.0):
+        """
+        Stop the thread after it has written the buffer; leftovers are written
+        inline.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self._drain()
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(
+                target=self._run, name="audit-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _take(self):
+        with self._condition:
+            batch = []
+            while self._buffer and len(batch) < self.batch_size:
+                batch.append(self._buffer.popleft())
+            self._in_flight = len(batch)
+            self._condition.notify_all()
+            return batch
+
+    def _drain(self):
+        while True:
+            batch = self._take()
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            finally:
+                with self._condition:
+                    self._in_flight = 0
+                    self._condition.notify_all()
+
+    def _run(self):
+        try:
+            connection.set_schema_to_public()
+            while True:
+                self._ensure_partitions()
+                with self._condition:
+                    if not self._buffer and not self._closed:
+                        self._condition.wait()
+                    if not self._closed and len(self._buffer) < self.batch_size:
+                        # Give a partial batch time to fill up
+                        self._condition.wait(self.flush_interval)
+                    if self._closed and not self._buffer:
+                        return
+                self._drain()
+        finally:
+            # Worker threads don't go through request_finished; close explicitly
+            connections.close_all()
+
+    def _ensure_partitions(self):
+        # Once per month per process; the default partition covers any gap
+        month = month_start(timezone.now())
+        if month == self._partitions_month:
+            return
+        try:
+            ensure_partitions()
+        except DatabaseError:
+            logger.exception("Failed to create audit log partitions")
+        self._partitions_month = month
+
+    def _write(self, batch):
+        for attempt in (1, 2):
+            try:
+                with transaction.atomic():
+                    write(batch)
+                return
+            except DatabaseError:
+                if attempt == 2:
+                    logger.exception("Failed to write %d audit records", len(batch))
+                    return
+                # A broken connection is replaced on the next attempt
+                connection.close_if_unusable_or_obsolete()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    """The process-wide AuditWriter, configured from settings."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AuditWriter(
+                buffer_size=_setting("AUDIT_BUFFER_SIZE", 10000),
+                batch_size=_setting("AUDIT_BATCH_SIZE", 500),
+                flush_interval=_setting("AUDIT_FLUSH_INTERVAL", 1.0),
+                enqueue_timeout=_setting("AUDIT_ENQUEUE_TIMEOUT", 0.5),
+            )
+            atexit.register(_writer.close, _setting("AUDIT_SHUTDOWN_TIMEOUT", 10.0))
+        return _writer
+
+
+def flush(timeout=None):
+    """Wait for queued audit records to be written (no-op outside async mode)."""
+    if _writer is not None:
+        return _writer.flush(timeout)
+    return True
+
+
+def enqueue(items):
+    """Hand captured records / jobs to the writer once the transaction commits."""
+    mode = audit_mode()
+    if mode == "off" or not items:
+        return
+    if mode == "sync":
+        # Written with the data, and rolled back with it
+        write(items)
+        return
+    transaction.on_commit(lambda: get_writer().submit(items), robust=True)
+
+
+# =============================================================================
+# Capture
+# =============================================================================
+
+def _json_value(value):
+    if value is None or isinstance(value, (str, int, float, bool, dict, list)):
+        return value
+    return json.loads(json.dumps(value, cls=DjangoJSONEncoder))
+
+
+class _ModelAudit:
+    """Per-model field list, stored values and diffs."""
+
+    def __init__(self, model):
+        self.model = model
+        self.attnames = [
+            field.attname for field in model._meta.concrete_fields
+            if not field.primary_key and field.name not in IGNORED_FIELDS
+        ]
+        self.json_fields = [
+            field.attname for field in model._meta.concrete_fields
+            if isinstance(field, JSONField)
+        ]
+
+    def stored(self, instance, using=None, update_fields=None):
+        """Stored values of the fields a save of instance will write."""
+        names = [name for name in self.attnames if name in instance.__dict__]
+        if update_fields is not None:
+            updated = {
+                self.model._meta.get_field(name).attname for name in update_fields
+            }
+            names = [name for name in names if name in updated]
+        if not names:
+            return {}
+        rows = self.model._base_manager.using(using).filter(pk=instance.pk)
+        return rows.values(*names).first() or {}
+
+    def values(self, instance):
+        state = instance.__dict__
+        return {
+            name: _json_value(state[name]) for name in self.attnames if name in state
+        }
+
+    def diff(self, old, instance):
+        """(old_values, new_values) of the fields that changed; JSON objects by key."""
+        old_values, new_values = {}, {}
+        state = instance.__dict__
+        for name in self.attnames:
+            if name not in old or name not in state or old[name] == state[name]:
+                continue
+            value = state[name]
+            before = old[name]
+            if (
+                name in self.json_fields
+                and isinstance(before, dict)
+                and isinstance(value, dict)
+            ):
+                changed = {
+                    key for key in before.keys() | value.keys()
+                    if key not in before
+                    or key not in value
+                    or before[key] != value[key]
+                }
+                before = {key: before[key] for key in changed if key in before}
+                value = {key: value[key] for key in changed if key in value}
+            old_values[name] = _json_value(before)
+            new_values[name] = _json_value(value)
+        if set(new_values) <= set(NOISE_FIELDS):
+            return None, None
+        return old_values, new_values
+
+
+_models = {}
+
+
+def _record(instance, action, old_values, new_values):
+    organization_id, project_id = _project()
+    user_id, ip_address, user_agent = _actor()
+    return AuditLog(
+        organization_id=organization_id,
+        project_id=project_id,
+        user_id=user_id,
+        action=action,
+        model_name=instance._meta.object_name,
+        object_id=str(instance.pk),
+        object_repr=str(instance)[:500],
+        old_values=old_values,
+        new_values=new_values,
+        ip_address=ip_address,
+        user_agent=user_agent,
+        timestamp=timezone.now(),
+    )
+
+
+def _updating(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    if raw or instance._state.adding or audit_mode() == "off":
+        return
+    instance._audit_stored = _models[sender].stored(instance, using, update_fields)
+
+
+def _revision_job(condition, params):
+    organization_id, project_id = _project()
+    user_id, ip_address, user_agent = _actor()
+    return RevisionJob(
+        schema=connection.schema_name,
+        condition=condition,
+        params=params,
+        organization_id=organization_id,
+        project_id=project_id,
+        user_id=user_id,
+        ip_address=ip_address,
+        user_agent=user_agent,
+    )
+
+
+def _tag_revision_job(instance, action):
+    """
+    Job copying the revision a Tag save or delete wrote. A tag is created and
+    deleted once, and each save bumps its revision number, so the row is the
+    first one with the tag's action (and, for updates, revision number).
+    """
+    condition, params = "tag_id = %s AND action = %s", [instance.pk, action]
+    if action == AuditLog.Action.UPDATE:
+        condition += " AND revision = %s"
+        params.append(instance.revision)
+    return _revision_job(
+        f"r.id = (SELECT min(id) FROM {_revision_table(connection.schema_name)} "
+        f"WHERE {condition})",
+        params,
+    )
+
+
+def _saved(sender, instance, created, raw=False, **kwargs):
+    if raw or audit_mode() == "off":
+        return
+    action = AuditLog.Action.CREATE if created else AuditLog.Action.UPDATE
+    if sender._meta.label in HISTORY_MODELS:
+        enqueue([_tag_revision_job(instance, action)])
+        return
+    audit = _models[sender]
+    if created:
+        record = _record(instance, action, {}, audit.values(instance))
+    else:
+        stored = instance.__dict__.pop("_audit_stored", {})
+        old_values, new_values = audit.diff(stored, instance)
+        if new_values is None:
+            return
+        record = _record(instance, action, old_values, new_values)
+    enqueue([record])
+
+
+def _deleted(sender, instance, **kwargs):
+    if audit_mode() == "off":
+        return
+    if sender._meta.label in HISTORY_MODELS:
+        enqueue([_tag_revision_job(instance, AuditLog.Action.DELETE)])
+        return
+    values = _models[sender].values(instance)
+    enqueue([_record(instance, AuditLog.Action.DELETE, values, {})])
+
+
+def audit_created(objects):
+    """Audit objects inserted with bulk_create (which sends no signals)."""
+    if audit_mode() == "off":
+        return
+    records = [
+        _record(obj, AuditLog.Action.CREATE, {}, _models[type(obj)].values(obj))
+        for obj in objects
+    ]
+    enqueue(records)
+
+
+def audit_tag_revisions(since):
+    """
+    Audit the tag changes written by a set-based operation in the current
+    transaction: since is current_revision() taken before the operation.
+    """
+    if audit_mode() == "off":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT now(), "
+            f"(SELECT coalesce(max(id), 0) FROM {TAG_REVISION_TABLE})"
+        )
+        changed_at, until = cursor.fetchone()
+    if until <= since:
+        return
+    enqueue([_revision_job(
+        "r.id > %s AND r.id <= %s AND r.changed_at = %s", [since, until, changed_at]
+    )])
+
+
+def connect_signals():
+    """Capture saves and deletes of the audited models."""
+    from django.apps import apps
+
+    for label in AUDITED_MODELS:
+        model = apps.get_model(label)
+        uid = f"audit:{label}"
+        if label not in HISTORY_MODELS:
+            _models[model] = _ModelAudit(model)
+            pre_save.connect(_updating, sender=model, dispatch_uid=uid)
+        post_save.connect(_saved, sender=model, dispatch_uid=uid)
+        post_delete.connect(_deleted, sender=model, dispatch_uid=uid)
@@ -0,0 +1,478 @@
+"""
+Audit Log Storage - monthly partitions, retention and archives.
+
+On PostgreSQL, administration_auditlog is range-partitioned by month on
+timestamp (migration 0002): queries bounded in time only touch the
+partitions they need, and old months are removed by detaching a partition
+instead of deleting rows. A DEFAULT partition catches rows outside the
+created months, so an insert never fails for want of a partition.
+
+Maintenance (manage.py audit_partitions, run daily; the audit writer also
+creates partitions when a month starts):
+- ensure_partitions() creates the partitions of the current month,
+  AUDIT_PARTITIONS_AHEAD months ahead and any month found in the default
+  partition (moving those rows into their month).
+- archive_partitions() writes every month older than
+  AUDIT_ARCHIVE_AFTER_MONTHS to gzipped NDJSON files, one per organization
+  (AUDIT_ARCHIVE_DIR/YYYY-MM/organization-<id>.ndjson.gz, newest record
+  first), then detaches and drops the partition.
+- apply_retention() enforces each organization's audit_retention_months
+  (default AUDIT_RETENTION_MONTHS): expired rows are deleted from live
+  partitions, expired archive files are removed, and partitions that every
+  policy has expired are dropped without archiving.
+
+read_archive() streams archived records back, newest first, for the
+AuditLogViewSet archive endpoint.
+"""
+
+import gzip
+import heapq
+import json
+import logging
+import os
+import re
+import shutil
+from datetime import date, datetime, time
+from datetime import timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django_tenants.utils import get_public_schema_name
+
+from .models import AuditLog, Organization
+
+logger = logging.getLogger(__name__)
+
+MONTH_DIR_RE = re.compile(r"^(\d{4})-(\d{2})$")
+ARCHIVE_FILE_RE = re.compile(r"^organization-(\d+|none)\.ndjson\.gz$")
+PARTITION_RE = re.compile(r"_p(\d{4})(\d{2})$")
+
+# Serializes partition changes between processes
+PARTITION_LOCK_KEY = "administration_auditlog_partitions"
+
+# Columns of an archived record, in file order: each line starts with its
+# sort key, so readers can skip records without decoding them
+ARCHIVE_COLUMNS = (
+    "timestamp",
+    "id",
+    "organization_id",
+    "project_id",
+    "user_id",
+    "action",
+    "model_name",
+    "object_id",
+    "object_repr",
+    "old_values",
+    "new_values",
+    "ip_address",
+    "user_agent",
+)
+ARCHIVE_KEY_RE = re.compile(r'^\{"timestamp":"([^"]+)","id":(\d+),')
+
+# Equality filters supported when reading archives
+ARCHIVE_FILTERS = (
+    "organization_id", "project_id", "user_id", "action", "model_name", "object_id"
+)
+INTEGER_FILTERS = ("organization_id", "project_id", "user_id")
+
+
+class AuditStorageError(Exception):
+    """Raised for invalid archive queries or an unpartitioned table."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def archive_dir():
+    return Path(_setting("AUDIT_ARCHIVE_DIR", settings.BASE_DIR / "audit_archive"))
+
+
+# =============================================================================
+# Months
+# =============================================================================
+
+def month_start(value):
+    """First day of the (UTC) month of a date or datetime."""
+    if isinstance(value, datetime):
+        value = value.astimezone(dt_timezone.utc).date()
+    return value.replace(day=1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_bounds(month):
+    """[start, end) of a month as aware UTC datetimes."""
+    start = datetime.combine(month, time.min, tzinfo=dt_timezone.utc)
+    end = datetime.combine(add_months(month, 1), time.min, tzinfo=dt_timezone.utc)
+    return start, end
+
+
+def parse_time(value):
+    """
+    Parse an ISO 8601 datetime or date (its start); naive times are in the
+    project time zone.
+    """
+    value = (value or "").strip()
+    try:
+        point = parse_datetime(value)
+        if point is None:
+            day = parse_date(value)
+            point = datetime.combine(day, time.min) if day else None
+    except ValueError:
+        point = None
+    if point is None:
+        raise AuditStorageError(f"Invalid date/time '{value}': use ISO 8601.")
+    if timezone.is_naive(point):
+        point = timezone.make_aware(point)
+    return point
+
+
+# =============================================================================
+# Partitions
+# =============================================================================
+
+def _table():
+    return AuditLog._meta.db_table
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def _qualified(name):
+    return f"{_quote(get_public_schema_name())}.{_quote(name)}"
+
+
+def partition_name(month):
+    return f"{_table()}_p{month:%Y%m}"
+
+
+def is_partitioned():
+    """Whether the audit table is partitioned (PostgreSQL after migration 0002)."""
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)",
+            [_qualified(_table())],
+        )
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def partitions():
+    """Monthly partitions as [(month, name, approximate rows)], oldest first."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname, c.reltuples::bigint
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+            """,
+            [_qualified(_table())],
+        )
+        rows = cursor.fetchall()
+    result = []
+    for name, estimate in rows:
+        match = PARTITION_RE.search(name)
+        if match:
+            month = date(int(match.group(1)), int(match.group(2)), 1)
+            result.append((month, name, max(estimate, 0)))
+    return sorted(result)
+
+
+def _lock(cursor):
+    cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [PARTITION_LOCK_KEY])
+
+
+def _create_partition(cursor, month):
+    """Create and attach one month, taking over its rows from the default partition."""
+    name, default = partition_name(month), f"{_table()}_default"
+    start, end = month_bounds(month)
+    cursor.execute(
+        f"CREATE TABLE {_qualified(name)} "
+        f"(LIKE {_qualified(_table())} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    )
+    cursor.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM {_qualified(default)}
+            WHERE "timestamp" >= %s AND "timestamp" < %s
+            RETURNING *
+        )
+        INSERT INTO {_qualified(name)} SELECT * FROM moved
+        """,
+        [start, end],
+    )
+    cursor.execute(
+        f"ALTER TABLE {_qualified(_table())} ATTACH PARTITION {_qualified(name)} "
+        f"FOR VALUES FROM (%s) TO (%s)",
+        [start, end],
+    )
+
+
+def ensure_partitions(ahead=None, now=None):
+    """
+    Create missing partitions from the current month to `ahead` months ahead.
+    Returns their names.
+    """
+    if not is_partitioned():
+        return []
+    ahead = _setting("AUDIT_PARTITIONS_AHEAD", 3) if ahead is None else ahead
+    current = month_start(now or timezone.now())
+    wanted = [add_months(current, offset) for offset in range(ahead + 1)]
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        _lock(cursor)
+        # Months that ended up in the default partition (e.g. backfilled records)
+        cursor.execute(
+            "SELECT DISTINCT "
+            """date_trunc('month', "timestamp" AT TIME ZONE 'UTC')::date """
+            f"FROM {_qualified(f'{_table()}_default')}"
+        )
+        wanted = sorted(set(wanted) | {row[0] for row in cursor.fetchall()})
+        existing = {month for month, _name, _rows in partitions()}
+        for month in wanted:
+            if month not in existing:
+                _create_partition(cursor, month)
+                created.append(partition_name(month))
+    return created
+
+
+def _drop_partition(cursor, name):
+    cursor.execute(
+        f"ALTER TABLE {_qualified(_table())} DETACH PARTITION {_qualified(name)}"
+    )
+    cursor.execute(f"DROP TABLE {_qualified(name)}")
+
+
+# =============================================================================
+# Archives
+# =============================================================================
+
+def _archive_path(month, organization_id):
+    owner = "none" if organization_id is None else organization_id
+    return archive_dir() / f"{month:%Y-%m}" / f"organization-{owner}.ndjson.gz"
+
+
+def export_partition(month, name):
+    """
+    Write one partition to per-organization archive files, newest record
+    first. Returns {organization id: rows}.
+    """
+    counts = {}
+    month_dir = _archive_path(month, None).parent
+    month_dir.mkdir(parents=True, exist_ok=True)
+    current, handle, tmp_path = None, None, None
+
+    def close():
+        if handle is not None:
+            handle.close()
+            # Files replace earlier archives of the month atomically
+            with open(tmp_path, "rb") as raw:
+                os.fsync(raw.fileno())
+            os.replace(tmp_path, _archive_path(month, current))
+
+    with connection.cursor() as cursor:
+        with cursor.cursor.copy(
+            f"""
+            COPY (
+                SELECT coalesce(a.organization_id::text, 'none'), row_to_json(a)::text
+                FROM (
+                    SELECT {", ".join(_quote(column) for column in ARCHIVE_COLUMNS)}
+                    FROM {_qualified(name)}
+                    ORDER BY organization_id NULLS FIRST, "timestamp" DESC, id DESC
+                ) a
+            ) TO STDOUT
+            """
+        ) as copy:
+            for owner, line in copy.rows():
+                organization_id = None if owner == "none" else int(owner)
+                if handle is None or organization_id != current:
+                    close()
+                    current = organization_id
+                    tmp_path = _archive_path(month, organization_id).with_suffix(".tmp")
+                    handle = gzip.open(tmp_path, "wt", encoding="utf-8")
+                    counts[organization_id] = 0
+                handle.write(line)
+                handle.write("\n")
+                counts[organization_id] += 1
+    close()
+    return counts
+
+
+def archive_partitions(archive_after=None, now=None, dry_run=False):
+    """
+    Archive and drop the partitions older than `archive_after` months.
+    Returns [(month, {organization id: rows})].
+    """
+    if not is_partitioned():
+        return []
+    if archive_after is None:
+        archive_after = _setting("AUDIT_ARCHIVE_AFTER_MONTHS", 12)
+    cutoff = add_months(month_start(now or timezone.now()), -archive_after)
+    archived = []
+    for month, name, _rows in partitions():
+        if month >= cutoff:
+            break
+        if dry_run:
+            archived.append((month, {}))
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            _lock(cursor)
+            # No writes can reach the month while it's exported and dropped
+            cursor.execute(f"LOCK TABLE {_qualified(name)} IN SHARE MODE")
+            counts = export_partition(month, name)
+            _drop_partition(cursor, name)
+        logger.info("Archived audit partition %s (%d rows)", name, sum(counts.values()))
+        archived.append((month, counts))
+    return archived
+
+
+def archived_months():
+    """Months with archive files, newest first."""
+    root = archive_dir()
+    if not root.is_dir():
+        return []
+    months = []
+    for entry in root.iterdir():
+        match = MONTH_DIR_RE.match(entry.name)
+        if match and entry.is_dir():
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months, reverse=True)
+
+
+def _archive_files(month, organization_id=None):
+    month_dir = archive_dir() / f"{month:%Y-%m}"
+    if organization_id is not None:
+        path = _archive_path(month, organization_id)
+        return [path] if path.exists() else []
+    return sorted(
+        path for path in month_dir.iterdir() if ARCHIVE_FILE_RE.match(path.name)
+    )
+
+
+def _read_file(path, needles):
+    # Lines lacking a filtered "column":value pair are skipped undecoded
+    with gzip.open(path, "rt", encoding="utf-8") as handle:
+        for line in handle:
+            if all(needle in line for needle in needles):
+                timestamp, pk = ARCHIVE_KEY_RE.match(line).groups()
+                yield (datetime.fromisoformat(timestamp), int(pk)), line
+
+
+def _needle(column, value):
+    if column in INTEGER_FILTERS:
+        return f'"{column}":{value}'
+    return f'"{column}":{json.dumps(str(value), ensure_ascii=False)}'
+
+
+def read_archive(since=None, until=None, filters=None, after=None):
+    """
+    Archived records newest first, as dicts of AuditLog columns.
+
+    since (inclusive) and until (exclusive) bound the timestamp, filters
+    maps ARCHIVE_FILTERS columns to values, and after is the (timestamp, id)
+    of the last record of the previous page. Only the month files that can
+    match are opened.
+    """
+    filters = {
+        key: value for key, value in (filters or {}).items() if value is not None
+    }
+    needles = [_needle(column, value) for column, value in filters.items()]
+    organization_id = filters.get("organization_id")
+    for month in archived_months():
+        start, end = month_bounds(month)
+        if (since is not None and end <= since) or (
+            until is not None and start >= until
+        ):
+            continue
+        if after is not None and start > after[0]:
+            continue
+        files = [
+            _read_file(path, needles)
+            for path in _archive_files(month, organization_id)
+        ]
+        for (timestamp, pk), line in heapq.merge(
+            *files, key=lambda item: item[0], reverse=True
+        ):
+            if after is not None and (timestamp, pk) >= after:
+                continue
+            if until is not None and timestamp >= until:
+                continue
+            if since is not None and timestamp < since:
+                break
+            record = json.loads(line)
+            if all(
+                str(record[column]) == str(value)
+                for column, value in filters.items()
+            ):
+                record["timestamp"] = timestamp
+                yield record
+
+
+# =============================================================================
+# Retention
+# =============================================================================
+
+def retention_policies():
+    """{organization id (None for records without one): retention in months}."""
+    default = _setting("AUDIT_RETENTION_MONTHS", 84)
+    policies = {None: default}
+    for pk, months in Organization.objects.values_list("pk", "audit_retention_months"):
+        policies[pk] = months or default
+    return policies
+
+
+def apply_retention(now=None, dry_run=False):
+    """
+    Remove audit records older than their organization's retention.
+    Returns {"rows": deleted live rows, "files": removed archive files,
+    "partitions": dropped partition names}.
+    """
+    current = month_start(now or timezone.now())
+    policies = retention_policies()
+    cutoffs = {
+        owner: add_months(current, -months) for owner, months in policies.items()
+    }
+    result = {"rows": 0, "files": [], "partitions": []}
+
+    if is_partitioned():
+        # Months every policy has expired go as a whole, without archiving
+        oldest_kept = min(cutoffs.values())
+        for month, name, _rows in partitions():
+            if month_bounds(month)[1] > month_bounds(oldest_kept)[0]:
+                break
+            result["partitions"].append(name)
+            if not dry_run:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    _lock(cursor)
+                    _drop_partition(cursor, name)
+
+    for owner, cutoff in cutoffs.items():
+        expired = AuditLog.objects.filter(
+            organization_id=owner, timestamp__lt=month_bounds(cutoff)[0]
+        )
+        # A single DELETE: AuditLog has no dependent rows or delete signals
+        result["rows"] += expired.count() if dry_run else expired.delete()[0]
+
+    for month in archived_months():
+        for path in _archive_files(month):
+            owner = ARCHIVE_FILE_RE.match(path.name).group(1)
+            owner = None if owner == "none" else int(owner)
+            # Files of deleted organizations follow the default policy
+            if month < cutoffs.get(owner, cutoffs[None]):
+                result["files"].append(str(path))
+                if not dry_run:
+                    path.unlink()
+        month_dir = archive_dir() / f"{month:%Y-%m}"
+        if not dry_run and not any(month_dir.iterdir()):
+            shutil.rmtree(month_dir)
+    return result
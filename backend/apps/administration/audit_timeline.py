@@ -0,0 +1,187 @@
+"""
+Audit Timeline - streaming export and per-field history of AuditLog.
+
+The audit table only grows, so the list endpoint pages with a keyset cursor
+on (timestamp, id) instead of OFFSET + COUNT(*), and this module adds the
+two reads that don't fit a page:
+- iter_timeline() walks a filtered queryset newest first in keyset chunks,
+  with PostgreSQL encoding each record as an NDJSON line. Each chunk is a
+  short indexed query of its own, so a long export neither holds one
+  snapshot open for its whole duration nor blocks the partition
+  maintenance of audit_storage.py (DETACH waits for every open reader).
+- field_history() returns the successive values of one field of one object.
+  Rows are found through the (model_name, object_id) index and the field is
+  extracted from old_values / new_values inside PostgreSQL, so only the
+  requested value of each matching record is transferred.
+
+Both can continue into the archived months (read_archive()), which always
+hold older records than the live partitions.
+"""
+
+import json
+import re
+from functools import reduce
+
+from django.db import connections
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.db.models.fields.json import KeyTransform
+
+from .audit_storage import ARCHIVE_COLUMNS, read_archive
+from .models import AuditLog
+
+# Records fetched per keyset chunk when streaming
+CHUNK_SIZE = 5000
+
+# A field path: a stored column name, then JSON keys separated by dots
+# (e.g. "status", "unit_id", "spec_data.range_max")
+FIELD_PATH_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[^.\s]+)*$")
+
+
+class AuditTimelineError(Exception):
+    """Raised for an invalid field path."""
+
+
+def parse_field(value):
+    """Split a dotted field path into its keys."""
+    value = (value or "").strip()
+    if not FIELD_PATH_RE.match(value):
+        raise AuditTimelineError(
+            f"Invalid field '{value}': use a column name as stored in the audit "
+            "record, optionally followed by JSON keys (e.g. 'spec_data.range_max')."
+        )
+    return value.split(".")
+
+
+def _json_default(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+# =============================================================================
+# Timeline
+# =============================================================================
+
+def iter_timeline(queryset, chunk_size=CHUNK_SIZE):
+    """
+    Yield the records of queryset newest first as NDJSON lines, in the
+    format of the archive files. Lines are built by PostgreSQL
+    (row_to_json), so JSON values are never decoded in Python.
+    """
+    rows = queryset.order_by("-timestamp", "-id").values(*ARCHIVE_COLUMNS)
+    last = None
+    while True:
+        chunk = rows
+        if last is not None:
+            chunk = rows.filter(
+                Q(timestamp__lte=last[0]),
+                Q(timestamp__lt=last[0]) | Q(timestamp=last[0], id__lt=last[1]),
+            )
+        sql, params = chunk[:chunk_size].query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT t."timestamp", t.id, row_to_json(t)::text
+                FROM ({sql}) t
+                ORDER BY t."timestamp" DESC, t.id DESC
+                """,
+                params,
+            )
+            lines = cursor.fetchall()
+        for _timestamp, _pk, line in lines:
+            yield line + "\n"
+        if len(lines) < chunk_size:
+            return
+        last = lines[-1][:2]
+
+
+def stream_ndjson(records):
+    """Yield record dicts (e.g. from read_archive()) as NDJSON lines."""
+    for record in records:
+        yield json.dumps(record, default=_json_default, separators=(",", ":")) + "\n"
+
+
+# =============================================================================
+# Field history
+# =============================================================================
+
+def _extract(values, path):
+    """(present, value) of a key path in a stored old_values / new_values dict."""
+    for key in path:
+        if not isinstance(values, dict) or key not in values:
+            return False, None
+        values = values[key]
+    return True, values
+
+
+def _change(record, old, new, has_old=True, has_new=True):
+    change = {
+        "id": record["id"],
+        "timestamp": record["timestamp"],
+        "action": record["action"],
+        "user": record["user_id"],
+    }
+    if has_old:
+        change["old"] = old
+    if has_new:
+        change["new"] = new
+    return change
+
+
+def field_history(model_name, object_id, path, project_id=None, include_archived=False):
+    """
+    Changes of one field of one object, oldest first.
+
+    path is a list of keys as returned by parse_field(). Each change is
+    {"id", "timestamp", "action", "user", "old", "new"}, leaving out the
+    side on which the field wasn't recorded (e.g. "old" of a CREATE).
+    Object ids are per project, so pass project_id for tenant models.
+    """
+    records = AuditLog.objects.filter(model_name=model_name, object_id=str(object_id))
+    if project_id is not None:
+        records = records.filter(project_id=project_id)
+    old, new = (reduce(lambda expr, key: KeyTransform(key, expr), path, column)
+                for column in ("old_values", "new_values"))
+    # JSON nulls are kept: IS NULL on a key transform means the key is absent
+    records = (
+        records.alias(old=old, new=new)
+        .filter(Q(old__isnull=False) | Q(new__isnull=False))
+        .annotate(
+            has_old=ExpressionWrapper(
+                Q(old__isnull=False), output_field=BooleanField()
+            ),
+            has_new=ExpressionWrapper(
+                Q(new__isnull=False), output_field=BooleanField()
+            ),
+        )
+        .annotate(old_value=old, new_value=new)
+        .order_by("timestamp", "id")
+        .values(
+            "id", "timestamp", "action", "user_id",
+            "old_value", "new_value", "has_old", "has_new",
+        )
+    )
+
+    changes = []
+    if include_archived:
+        filters = {
+            "model_name": model_name,
+            "object_id": str(object_id),
+            "project_id": project_id,
+        }
+        for record in read_archive(filters=filters):
+            has_old, old_value = _extract(record["old_values"], path)
+            has_new, new_value = _extract(record["new_values"], path)
+            if has_old or has_new:
+                changes.append(_change(record, old_value, new_value, has_old, has_new))
+        changes.reverse()
+
+    for record in records.iterator(chunk_size=CHUNK_SIZE):
+        changes.append(_change(
+            record,
+            record["old_value"],
+            record["new_value"],
+            record["has_old"],
+            record["has_new"],
+        ))
+    return changes
@@ -0,0 +1,31 @@
+"""
+Administration Filters - django-filter FilterSets for administration models
+"""
+
+from django_filters import rest_framework as filters
+
+from .models import AuditLog
+
+
+class AuditLogFilter(filters.FilterSet):
+    """
+    Filters for AuditLog. Bounding the time with since/until lets
+    PostgreSQL skip the monthly partitions outside the range.
+    """
+
+    since = filters.IsoDateTimeFilter(
+        field_name="timestamp",
+        lookup_expr="gte",
+        help_text="Only records at or after this ISO 8601 date/time",
+    )
+    until = filters.IsoDateTimeFilter(
+        field_name="timestamp",
+        lookup_expr="lt",
+        help_text="Only records before this ISO 8601 date/time",
+    )
+
+    class Meta:
+        model = AuditLog
+        fields = [
+            "organization", "project_id", "user", "action", "model_name", "object_id"
+        ]
@@ -0,0 +1,77 @@
+"""
+Management command maintaining the monthly AuditLog partitions.
+
+Run it daily (e.g. from cron) against the public schema:
+    python manage.py audit_partitions
+creates the partitions of the coming months, archives months older than
+AUDIT_ARCHIVE_AFTER_MONTHS to AUDIT_ARCHIVE_DIR and applies each
+organization's audit retention (see apps.administration.audit_storage).
+    python manage.py audit_partitions --list
+    python manage.py audit_partitions --dry-run
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.administration.audit_storage import (
+    apply_retention,
+    archive_partitions,
+    archived_months,
+    ensure_partitions,
+    is_partitioned,
+    partitions,
+)
+
+
+class Command(BaseCommand):
+    help = "Create, archive and expire monthly audit log partitions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--list",
+            action="store_true",
+            help="List the partitions and archived months",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report what would be archived or removed without changing anything",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Audit log partitions require PostgreSQL.")
+        connection.set_schema_to_public()
+        if not is_partitioned():
+            raise CommandError(
+                "The audit log table isn't partitioned; run migrate first."
+            )
+
+        if options["list"]:
+            for month, name, rows in partitions():
+                self.stdout.write(f"{month:%Y-%m}  {name}  ~{rows} rows")
+            for month in archived_months():
+                self.stdout.write(f"{month:%Y-%m}  archived")
+            return
+
+        dry_run = options["dry_run"]
+        if not dry_run:
+            for name in ensure_partitions():
+                self.stdout.write(self.style.SUCCESS(f"Created {name}"))
+
+        for month, counts in archive_partitions(dry_run=dry_run):
+            if dry_run:
+                self.stdout.write(f"Would archive {month:%Y-%m}")
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Archived {month:%Y-%m}: {sum(counts.values())} records, "
+                    f"{len(counts)} organization files"
+                ))
+
+        removed = apply_retention(dry_run=dry_run)
+        prefix = "Would remove" if dry_run else "Removed"
+        for name in removed["partitions"]:
+            self.stdout.write(f"{prefix} partition {name}")
+        for path in removed["files"]:
+            self.stdout.write(f"{prefix} archive {path}")
+        self.stdout.write(f"{prefix} {removed['rows']} expired records")
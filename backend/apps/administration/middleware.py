@@ -0,0 +1,25 @@
+"""
+Administration Middleware - request context for the audit log.
+"""
+
+from .audit import reset_request, set_request
+
+
+class AuditContextMiddleware:
+    """
+    Expose the current request to audit capture (see audit.py).
+
+    Saves don't receive the request, so the user, IP address and user agent
+    recorded in AuditLog are read from a context variable set here. The user
+    is read when a change is captured, i.e. after DRF has authenticated.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = set_request(request)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_request(token)
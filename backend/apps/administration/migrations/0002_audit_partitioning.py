@@ -0,0 +1,158 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:52
+
+from datetime import date
+
+from django.db import migrations, models
+from django.utils import timezone
+from django_tenants.utils import get_public_schema_name
+
+TABLE = "administration_auditlog"
+
+# Months created ahead of the current one (settings.AUDIT_PARTITIONS_AHEAD)
+PARTITIONS_AHEAD = 3
+
+
+def _add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _applies(connection):
+    # AuditLog is a shared model: only the public schema has the table
+    public = get_public_schema_name()
+    return (
+        connection.vendor == "postgresql"
+        and getattr(connection, "schema_name", public) == public
+    )
+
+
+def _definitions(cursor):
+    """Secondary index and foreign key definitions of the audit table."""
+    cursor.execute(
+        "SELECT pg_get_indexdef(indexrelid) FROM pg_index "
+        "WHERE indrelid = %s::regclass AND NOT indisprimary",
+        [TABLE],
+    )
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [TABLE],
+    )
+    return indexes, cursor.fetchall()
+
+
+def _restore(cursor, primary_key, indexes, foreign_keys):
+    cursor.execute(
+        f"ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY ({primary_key})"
+    )
+    for name, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}")
+    for definition in indexes:
+        cursor.execute(definition)
+
+
+def partition_auditlog(apps, schema_editor):
+    """
+    Rebuild the audit table partitioned by month on timestamp: one partition
+    per month from the oldest record to PARTITIONS_AHEAD months ahead, plus
+    a default partition. The primary key becomes (id, timestamp), as
+    PostgreSQL requires the partition key in unique constraints; ids still
+    come from a single sequence.
+    """
+    connection = schema_editor.connection
+    if not _applies(connection):
+        return
+    with connection.cursor() as cursor:
+        indexes, foreign_keys = _definitions(cursor)
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_unpartitioned")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {TABLE}_unpartitioned) "
+            f'PARTITION BY RANGE ("timestamp")'
+        )
+        # id is an identity column, or uses a plain sequence after a reverse migration
+        cursor.execute(
+            "SELECT attidentity <> '' FROM pg_attribute "
+            "WHERE attrelid = %s::regclass AND attname = 'id'",
+            [f"{TABLE}_unpartitioned"],
+        )
+        identity = cursor.fetchone()[0]
+        if not identity:
+            cursor.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY NONE")
+            cursor.execute(
+                f"ALTER TABLE {TABLE}_unpartitioned ALTER COLUMN id DROP DEFAULT"
+            )
+
+        cursor.execute(f'SELECT min("timestamp"), max(id) FROM {TABLE}_unpartitioned')
+        oldest, max_id = cursor.fetchone()
+        current = timezone.now().date().replace(day=1)
+        month = (oldest.date() if oldest else current).replace(day=1)
+        while month <= _add_months(current, PARTITIONS_AHEAD):
+            cursor.execute(
+                f"CREATE TABLE {TABLE}_p{month:%Y%m} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{month.isoformat()} 00:00+00') "
+                f"TO ('{_add_months(month, 1).isoformat()} 00:00+00')"
+            )
+            month = _add_months(month, 1)
+        cursor.execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_unpartitioned")
+        cursor.execute(f"DROP TABLE {TABLE}_unpartitioned")
+
+        if identity:
+            cursor.execute(f"CREATE SEQUENCE {TABLE}_id_seq")
+            if max_id:
+                cursor.execute(f"SELECT setval('{TABLE}_id_seq', %s)", [max_id])
+        cursor.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')"
+        )
+        _restore(cursor, 'id, "timestamp"', indexes, foreign_keys)
+
+
+def unpartition_auditlog(apps, schema_editor):
+    """Copy the partitions back into a plain table."""
+    connection = schema_editor.connection
+    if not _applies(connection):
+        return
+    with connection.cursor() as cursor:
+        indexes, foreign_keys = _definitions(cursor)
+        cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_partitioned")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} (LIKE {TABLE}_partitioned INCLUDING DEFAULTS)"
+        )
+        cursor.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY NONE")
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_partitioned")
+        cursor.execute(f"DROP TABLE {TABLE}_partitioned")
+        cursor.execute(f"ALTER SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+        _restore(cursor, "id", indexes, foreign_keys)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("administration", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="organization",
+            name="audit_retention_months",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                help_text=(
+                    "Months audit records are kept (blank: AUDIT_RETENTION_MONTHS)"
+                ),
+                null=True,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="auditlog",
+            index=models.Index(
+                fields=["timestamp", "id"], name="administrat_timesta_0e91cd_idx"
+            ),
+        ),
+        migrations.RunPython(partition_auditlog, unpartition_auditlog),
+    ]
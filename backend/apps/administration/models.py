@@ -52,6 +52,11 @@ class Organization(TimeStampedModel):
         default=True,
         help_text=_("Whether this organization is active"),
     )
+    audit_retention_months = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        help_text=_("Months audit records are kept (blank: AUDIT_RETENTION_MONTHS)"),
+    )
     
     class Meta:
         verbose_name = _("Organization")
@@ -370,6 +375,10 @@ class AuditLog(models.Model):
     """
     AuditLog - Records all data operations (Who/When/What).
     Stored in public schema for cross-project audit trail.
+    
+    On PostgreSQL the table is partitioned by month on timestamp, with old
+    months archived to files (see audit_storage.py); filter on timestamp
+    so queries only touch the months they need.
     """
     
     class Action(models.TextChoices):
@@ -447,6 +456,7 @@ class AuditLog(models.Model):
         verbose_name_plural = _("Audit Logs")
         ordering = ["-timestamp"]
         indexes = [
+            models.Index(fields=["timestamp", "id"]),
             models.Index(fields=["organization", "-timestamp"]),
             models.Index(fields=["project_id", "-timestamp"]),
             models.Index(fields=["user", "-timestamp"]),
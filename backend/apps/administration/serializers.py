@@ -32,7 +32,7 @@ class OrganizationSerializer(serializers.ModelSerializer):
         model = Organization
         fields = [
             "id", "code", "name", "description", "logo",
-            "is_active", "created_at", "updated_at"
+            "is_active", "audit_retention_months", "created_at", "updated_at"
         ]
         read_only_fields = ["id", "created_at", "updated_at"]
 
@@ -178,7 +178,11 @@ class ProjectTaskForceSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at", "updated_at"]
     
     def get_member_count(self, obj):
-        return obj.memberships.count()
+        # Prefer the count annotated by the viewset queryset
+        count = getattr(obj, "member_count", None)
+        if count is None:
+            count = obj.memberships.count()
+        return count
 
 
 class TaskForceMembershipSerializer(serializers.ModelSerializer):
@@ -1,3 +1,128 @@
-from django.test import TestCase
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django_tenants.test.cases import TenantTestCase
 
-# Create your tests here.
+from apps.core_engineering.models import (
+    Client,
+    InstrumentType,
+    PlantHierarchy,
+    Tag,
+    TagRevision,
+)
+
+from .audit import AUDITED_MODELS
+from .models import AuditLog
+
+NodeType = PlantHierarchy.NodeType
+
+
+# =============================================================================
+# Audit capture
+# =============================================================================
+
+class AuditCaptureTests(TenantTestCase):
+    @classmethod
+    def setup_tenant(cls, tenant):
+        tenant.name = "Audit tests"
+        tenant.project_no = "TEST-AUDIT"
+        tenant.organization_id = 1
+
+    def setUp(self):
+        # Records are written inline, in the test transaction
+        self.enterContext(override_settings(AUDIT_LOG_MODE="sync"))
+        plant = PlantHierarchy.objects.create(
+            name="P1", code="P1", node_type=NodeType.PLANT
+        )
+        area = PlantHierarchy.objects.create(
+            name="A1", code="A1", node_type=NodeType.AREA, parent=plant
+        )
+        self.unit = PlantHierarchy.objects.create(
+            name="U1", code="U1", node_type=NodeType.UNIT, parent=area
+        )
+        self.tag = Tag.objects.create(
+            tag_number="FT-101",
+            unit=self.unit,
+            instrument_type=InstrumentType.objects.create(
+                name="Flow Transmitter",
+                code="FT",
+                category=InstrumentType.Category.TRANSMITTER,
+            ),
+            spec_data={"range_min": 0, "range_max": 100},
+        )
+
+    def records(self, model_name="Tag"):
+        return AuditLog.objects.filter(
+            project_id=self.tenant.pk, model_name=model_name
+        ).order_by("id")
+
+    def test_tag_changes_are_read_from_revisions(self):
+        self.tag.service = "Feed flow"
+        self.tag.spec_data = {"range_min": 0, "range_max": 250}
+        self.tag.save()
+        self.tag.save()  # bumps only the revision number
+        self.tag.delete()
+
+        created, updated, deleted = self.records()
+        self.assertEqual(created.action, AuditLog.Action.CREATE)
+        self.assertEqual(created.new_values["tag_number"], "FT-101")
+        self.assertEqual(updated.action, AuditLog.Action.UPDATE)
+        self.assertEqual(
+            {key: updated.old_values[key] for key in ("service", "spec_data")},
+            {"service": "", "spec_data": {"range_max": 100}},
+        )
+        self.assertEqual(
+            {key: updated.new_values[key] for key in ("service", "spec_data")},
+            {"service": "Feed flow", "spec_data": {"range_max": 250}},
+        )
+        self.assertEqual(deleted.action, AuditLog.Action.DELETE)
+        self.assertEqual(deleted.old_values["service"], "Feed flow")
+        self.assertEqual(deleted.new_values, {})
+
+    def test_tag_save_adds_no_query(self):
+        def count_queries(mode):
+            with override_settings(AUDIT_LOG_MODE=mode), CaptureQueriesContext(
+                connection
+            ) as queries:
+                self.tag.save()
+            return len(queries)
+
+        # The job is handed over on commit, which never happens in a test
+        self.assertEqual(count_queries("async"), count_queries("off"))
+
+    def test_other_models_are_diffed_against_stored_values(self):
+        self.unit.name = "Unit 1"
+        self.unit.save()
+
+        record = self.records("PlantHierarchy").last()
+        self.assertEqual(record.action, AuditLog.Action.UPDATE)
+        self.assertEqual(record.old_values, {"name": "U1"})
+        self.assertEqual(record.new_values, {"name": "Unit 1"})
+
+    def test_delete_receivers_only_on_audited_models(self):
+        self.assertIn("core_engineering.Tag", AUDITED_MODELS)
+        for model in (Client, TagRevision):
+            self.assertFalse(
+                post_delete.disconnect(
+                    sender=model, dispatch_uid=f"audit:{model._meta.label}"
+                )
+            )
+
+
+# =============================================================================
+# Audit storage
+# =============================================================================
+
+class AuditIndexTests(TestCase):
+    def test_timeline_index_is_created_once(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT indexname, indexdef FROM pg_indexes "
+                "WHERE tablename = %s AND indexdef LIKE %s",
+                [AuditLog._meta.db_table, '%("timestamp"%'],
+            )
+            indexes = dict(cursor.fetchall())
+
+        self.assertEqual(list(indexes), ["administrat_timesta_0e91cd_idx"])
+        self.assertIn('("timestamp", id)', indexes["administrat_timesta_0e91cd_idx"])
@@ -6,11 +6,31 @@ Note: Project, Client, Site, Plant, NamingConvention have been moved to tenant-s
 - Client, Site, Plant, NamingConvention → apps.core_engineering (tenant schema)
 """
 
+from datetime import datetime
+from itertools import chain, islice
+
 from django.contrib.auth import get_user_model
+from django.db.models import Count
+from django.http import StreamingHttpResponse
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 
+from apps.core.pagination import KeysetPagination
+from apps.core.params import query_flag
+
+from .audit_storage import AuditStorageError, parse_time, read_archive
+from .audit_timeline import (
+    AuditTimelineError,
+    field_history,
+    iter_timeline,
+    parse_field,
+    stream_ndjson,
+)
+from .filters import AuditLogFilter
 from .models import (
     Organization,
     Role,
@@ -138,7 +158,9 @@ class ProjectMembershipViewSet(viewsets.ModelViewSet):
 class ProjectTaskForceViewSet(viewsets.ModelViewSet):
     """API endpoint for ProjectTaskForce CRUD operations."""
     
-    queryset = ProjectTaskForce.objects.select_related("leader").all()
+    queryset = ProjectTaskForce.objects.select_related("leader").annotate(
+        member_count=Count("memberships")
+    )
     serializer_class = ProjectTaskForceSerializer
     permission_classes = [permissions.IsAuthenticated]
     filterset_fields = ["project_id", "is_active"]
@@ -231,11 +253,274 @@ class TaskForceMembershipViewSet(viewsets.ModelViewSet):
 
 
 class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
-    """API endpoint for AuditLog read operations (read-only)."""
+    """
+    API endpoint for AuditLog read operations (read-only).
+    
+    The list is a timeline paged with a keyset cursor on (timestamp, id);
+    large ranges are streamed by the export action and the values of one
+    field over time by field-history (see audit_timeline.py). Months moved
+    out of the database by archive_partitions() are read through the
+    archive action, with the same filters and fields.
+    """
     
     queryset = AuditLog.objects.select_related("organization", "user").all()
     serializer_class = AuditLogSerializer
     permission_classes = [permissions.IsAuthenticated]
-    filterset_fields = ["organization", "project_id", "user", "action", "model_name"]
+    pagination_class = KeysetPagination
+    filterset_class = AuditLogFilter
     search_fields = ["object_repr", "model_name"]
+    ordering_fields = ["timestamp"]
     ordering = ["-timestamp"]
+
+    def _archive_filters(self, request):
+        """ARCHIVE_FILTERS values from the list filter query params."""
+        params = request.query_params
+        return {
+            "organization_id": params.get("organization"),
+            "project_id": params.get("project_id"),
+            "user_id": params.get("user"),
+            "action": params.get("action"),
+            "model_name": params.get("model_name"),
+            "object_id": params.get("object_id"),
+        }
+
+    def _time_range(self, request):
+        """Parse since/until; returns ((since, until), error Response)."""
+        params = request.query_params
+        try:
+            since = parse_time(params["since"]) if params.get("since") else None
+            until = parse_time(params["until"]) if params.get("until") else None
+        except AuditStorageError as e:
+            return None, Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return (since, until), None
+
+    @extend_schema(
+        summary="Export the audit timeline",
+        description=(
+            "Streams every record matching the list filters as NDJSON, newest "
+            "first, in the same line format as the archive files. Records are read "
+            "in keyset chunks, so memory use stays flat and no query stays open for "
+            "the whole download. With include_archived, records of archived months "
+            "follow (only since/until and the equality filters apply to them)."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="include_archived",
+                description="Also export archived months",
+                required=False,
+                type=bool,
+            ),
+        ],
+        responses={(200, "application/x-ndjson"): OpenApiTypes.BINARY},
+    )
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Stream the filtered audit timeline as NDJSON."""
+        time_range, error = self._time_range(request)
+        if error is not None:
+            return error
+        queryset = self.filter_queryset(AuditLog.objects.all())
+        lines = iter_timeline(queryset)
+        if query_flag(request, "include_archived"):
+            archived = read_archive(*time_range, self._archive_filters(request))
+            lines = chain(lines, stream_ndjson(archived))
+
+        response = StreamingHttpResponse(lines, content_type="application/x-ndjson")
+        response["Content-Disposition"] = 'attachment; filename="audit-log.ndjson"'
+        return response
+
+    @extend_schema(
+        summary="Get the history of one field of an object",
+        description=(
+            "Every recorded change of one field of one object, oldest first, as "
+            "old/new values (a side is left out where the field wasn't recorded, "
+            "e.g. the old value of a CREATE). The field is a column name as stored "
+            "in the audit records ('status', 'unit_id'), optionally followed by "
+            "JSON keys ('spec_data.range_max'). Object ids are per project, so pass "
+            "project_id for project data."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="model_name",
+                description="Model name (e.g. 'Tag')",
+                required=True,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="object_id",
+                description="ID of the object",
+                required=True,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="field",
+                description="Field path (e.g. 'status' or 'spec_data.range_max')",
+                required=True,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="project_id",
+                description="Project ID",
+                required=False,
+                type=int,
+            ),
+            OpenApiParameter(
+                name="include_archived",
+                description="Also read archived months",
+                required=False,
+                type=bool,
+            ),
+        ],
+    )
+    @action(detail=False, methods=["get"], url_path="field-history")
+    def field_history(self, request):
+        """Values of one field of one object over time."""
+        params = request.query_params
+        for name in ("model_name", "object_id", "field"):
+            if not params.get(name):
+                return Response(
+                    {"error": f"Query parameter '{name}' is required"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        project_id = params.get("project_id")
+        if project_id is not None and not project_id.isdigit():
+            return Response(
+                {"error": "project_id must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            path = parse_field(params["field"])
+        except AuditTimelineError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        changes = field_history(
+            params["model_name"],
+            params["object_id"],
+            path,
+            project_id=int(project_id) if project_id else None,
+            include_archived=query_flag(request, "include_archived"),
+        )
+        return Response({
+            "model_name": params["model_name"],
+            "object_id": params["object_id"],
+            "field": params["field"],
+            "count": len(changes),
+            "results": changes,
+        })
+
+    @extend_schema(
+        summary="List archived audit records",
+        description=(
+            "Audit records of months archived to files, newest first. Only the "
+            "archive files of the months in since/until (and of the organization, "
+            "if given) are read. Follow 'next' for further pages."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="since",
+                description="Only records at or after this ISO 8601 date/time",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="until",
+                description="Only records before this ISO 8601 date/time",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="organization",
+                description="Organization ID",
+                required=False,
+                type=int,
+            ),
+            OpenApiParameter(
+                name="project_id",
+                description="Project ID",
+                required=False,
+                type=int,
+            ),
+            OpenApiParameter(
+                name="user",
+                description="User ID",
+                required=False,
+                type=int,
+            ),
+            OpenApiParameter(
+                name="action",
+                description="CREATE, READ, UPDATE or DELETE",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="model_name",
+                description="Model name (e.g. 'Tag')",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="object_id",
+                description="ID of the affected object",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="cursor",
+                description="Cursor from a next link",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="page_size",
+                description="Records per page",
+                required=False,
+                type=int,
+            ),
+        ],
+        responses={200: AuditLogSerializer(many=True)},
+    )
+    @action(detail=False, methods=["get"])
+    def archive(self, request):
+        """Archived audit records, newest first."""
+        time_range, error = self._time_range(request)
+        if error is not None:
+            return error
+        since, until = time_range
+        filters = self._archive_filters(request)
+
+        # Same cursor format as the keyset-paginated lists, forward only
+        paginator = KeysetPagination()
+        paginator.base_url = request.build_absolute_uri()
+        page_size = paginator.get_page_size(request)
+        after = None
+        _reverse, position = paginator.decode_cursor(request)
+        if position is not None:
+            try:
+                after = (datetime.fromisoformat(position[0]), int(position[1]))
+            except (TypeError, ValueError, IndexError):
+                raise NotFound(paginator.invalid_cursor_message)
+
+        records = list(
+            islice(read_archive(since, until, filters, after), page_size + 1)
+        )
+        has_next = len(records) > page_size
+        records = records[:page_size]
+        users = User.objects.in_bulk({record["user_id"] for record in records} - {None})
+        logs = []
+        for record in records:
+            log = AuditLog(**record)
+            if record["user_id"] in users:
+                log.user = users[record["user_id"]]
+            logs.append(log)
+
+        next_cursor = None
+        if has_next:
+            last = records[-1]
+            next_cursor = paginator.encode_cursor(
+                [last["timestamp"].isoformat(), last["id"]]
+            )
+        return Response({
+            "next": next_cursor,
+            "page_size": page_size,
+            "results": AuditLogSerializer(logs, many=True).data,
+        })
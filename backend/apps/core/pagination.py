@@ -0,0 +1,363 @@
+"""
+Core Pagination - keyset (cursor) pagination for large, virtualized lists.
+
+Page-number pagination costs an OFFSET scan plus a full COUNT(*) per page,
+so deep pages get slower the further a client scrolls. Keyset pagination
+instead remembers the sort key of the last row and asks for rows strictly
+after it, which an index on the ordering columns answers in constant time.
+
+The active ordering (as applied by OrderingFilter) is used as the key, with
+the primary key appended as a tie-breaker so the position is always unique.
+
+Keyset pagination is opt-in: requests without a cursor parameter get the
+regular page-number responses (?page=N, exact "count"), so existing clients
+keep working. A client starts scrolling with an empty ?cursor= and then
+follows the next/previous links; those responses have no exact "count"
+unless ?include_count=exact asks for the COUNT(*).
+"""
+
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def _position_after(field, value, descending):
+    """
+    Q for rows strictly after value on one ordering field.
+    NULLs sort last in ascending order (PostgreSQL's default), so they are
+    treated as the largest value.
+    """
+    if descending:
+        if value is None:
+            return Q(**{f"{field}__isnull": False})
+        return Q(**{f"{field}__lt": value})
+    if value is None:
+        return Q(pk__in=[])
+    return Q(**{f"{field}__gt": value}) | Q(**{f"{field}__isnull": True})
+
+
+def _leading_bound(queryset, field, value, descending):
+    """
+    Redundant range on the first ordering field (e.g. field <= value going
+    down). The OR of _position_after() terms can't be used as an index
+    condition, so without it every page would scan the index from the
+    first row. Ascending bounds would exclude NULLs, so they are only added
+    for non-nullable columns of the model itself.
+    """
+    if value is None:
+        return None
+    if descending:
+        return Q(**{f"{field}__lte": value})
+    opts = queryset.model._meta
+    try:
+        model_field = opts.pk if field == "pk" else opts.get_field(field)
+    except FieldDoesNotExist:
+        return None
+    if model_field.null:
+        return None
+    return Q(**{f"{field}__gte": value})
+
+
+def _position_equal(field, value):
+    if value is None:
+        return Q(**{f"{field}__isnull": True})
+    return Q(**{field: value})
+
+
+def _resolve_value(obj, field):
+    """Read an ordering value from an instance or a .values() row."""
+    if isinstance(obj, dict):
+        return obj[field]
+    value = obj
+    for part in field.split("__"):
+        if value is None:
+            return None
+        value = getattr(value, part)
+    return value
+
+
+class KeysetPagination(PageNumberPagination):
+    """
+    Page-number pagination, or cursor pagination keyed on the active ordering
+    plus the primary key when the request has a cursor parameter.
+
+    Query parameters:
+    - page: page number, without a cursor (PageNumberPagination)
+    - cursor: opaque position returned in the next/previous links; empty
+      for the first page
+    - page_size: rows per page (up to max_page_size)
+    - include_count: with a cursor, add an approximate total read from
+      PostgreSQL statistics instead of running COUNT(*); include_count=exact
+      also returns the exact total as "count"
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    count_query_param = "include_count"
+    exact_count_value = "exact"
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 5000
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.cursor_query_param in request.query_params
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        reverse, position = self.decode_cursor(request)
+        self.has_cursor = position is not None
+        self.approximate_count = None
+        self.count = None
+        if self.include_count(request):
+            self.approximate_count = self.get_approximate_count(queryset, view)
+            if self.exact_count_requested(request):
+                self.count = queryset.count()
+
+        fields = [field.lstrip("-") for field in self.ordering]
+        descending = [field.startswith("-") for field in self.ordering]
+        if reverse:
+            descending = [not desc for desc in descending]
+
+        if position is not None:
+            if len(position) != len(fields):
+                raise NotFound(self.invalid_cursor_message)
+            condition = Q(pk__in=[])
+            for index, field in enumerate(fields):
+                term = _position_after(field, position[index], descending[index])
+                for prior in range(index):
+                    term &= _position_equal(fields[prior], position[prior])
+                condition |= term
+            bound = _leading_bound(queryset, fields[0], position[0], descending[0])
+            if bound is not None:
+                condition &= bound
+            queryset = queryset.filter(condition)
+
+        order_by = [
+            f"-{field}" if desc else field for field, desc in zip(fields, descending)
+        ]
+        rows = list(queryset.order_by(*order_by)[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if reverse:
+            rows.reverse()
+
+        # Going forward there is a previous page only if we came from a cursor;
+        # going backward there is always a next page (the one we came from).
+        self.has_next = has_more if not reverse else True
+        self.has_previous = has_more if reverse else self.has_cursor
+        self.first_position = self.get_position(rows[0], fields) if rows else None
+        self.last_position = self.get_position(rows[-1], fields) if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("page_size", self.page_size),
+                    ("count", self.count),
+                    ("approximate_count", self.approximate_count),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "page_size": {
+                    "type": "integer",
+                    "example": 500,
+                    "description": f"With {self.cursor_query_param} only",
+                },
+                "count": {
+                    "type": "integer",
+                    "nullable": True,
+                    "example": 100000,
+                    "description": (
+                        f"Exact total; with {self.cursor_query_param}, only with "
+                        f"{self.count_query_param}={self.exact_count_value}"
+                    ),
+                },
+                "approximate_count": {
+                    "type": "integer",
+                    "nullable": True,
+                    "example": 100000,
+                    "description": f"With {self.cursor_query_param} only",
+                },
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            *super().get_schema_operation_parameters(view),
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": (
+                    "Cursor from a next/previous link; empty for the first page. "
+                    "Switches to cursor pagination"
+                ),
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.count_query_param,
+                "required": False,
+                "in": "query",
+                "description": (
+                    f"With {self.cursor_query_param}: include an approximate "
+                    f"total row count; '{self.exact_count_value}' also returns "
+                    "the exact count"
+                ),
+                "schema": {"type": "string", "enum": ["true", self.exact_count_value]},
+            },
+        ]
+
+    # -------------------------------------------------------------------------
+    # Options
+    # -------------------------------------------------------------------------
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def include_count(self, request):
+        value = request.query_params.get(self.count_query_param)
+        return value is not None and value.lower() in (
+            "", "1", "true", "yes", self.exact_count_value
+        )
+
+    def exact_count_requested(self, request):
+        value = request.query_params.get(self.count_query_param, "")
+        return value.lower() == self.exact_count_value
+
+    def get_ordering(self, queryset):
+        """
+        Return the queryset ordering with the primary key appended.
+        Expressions (e.g. random ordering) can't be used as a key and are dropped.
+        """
+        ordering = [
+            field
+            for field in (queryset.query.order_by or queryset.model._meta.ordering)
+            if isinstance(field, str) and field != "?"
+        ]
+        pk_names = {"pk", queryset.model._meta.pk.name}
+        if not any(field.lstrip("-") in pk_names for field in ordering):
+            descending = bool(ordering) and ordering[-1].startswith("-")
+            ordering.append("-pk" if descending else "pk")
+        return ordering
+
+    # -------------------------------------------------------------------------
+    # Cursors
+    # -------------------------------------------------------------------------
+
+    def get_position(self, obj, fields):
+        return [_resolve_value(obj, field) for field in fields]
+
+    def decode_cursor(self, request):
+        """(reverse, position) of the request cursor; position is None without one."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return False, None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            reverse = bool(payload.get("r", False))
+            position = payload["p"]
+        except (TypeError, ValueError, KeyError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list):
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, position
+
+    def encode_cursor(self, position, reverse=False):
+        payload = {"p": position}
+        if reverse:
+            payload["r"] = True
+        # str() keeps full datetime precision, which the lookups parse back
+        encoded = base64.urlsafe_b64encode(
+            json.dumps(payload, default=str, separators=(",", ":")).encode()
+        ).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next or self.last_position is None:
+            return None
+        return self.encode_cursor(self.last_position)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous:
+            return None
+        if self.first_position is None:
+            # An empty page reached through a cursor: go back to the start
+            return replace_query_param(self.base_url, self.cursor_query_param, "")
+        return self.encode_cursor(self.first_position, reverse=True)
+
+    # -------------------------------------------------------------------------
+    # Approximate count
+    # -------------------------------------------------------------------------
+
+    def get_approximate_count(self, queryset, view=None):
+        """
+        Estimate the number of rows without COUNT(*).
+
+        Unfiltered querysets use pg_class.reltuples (summed over the leaf
+        partitions of a partitioned table); filtered ones use the planner's
+        row estimate. Tables that were never analyzed fall back to an exact
+        count.
+        """
+        with connections[queryset.db].cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute(
+                    """
+                    SELECT CASE WHEN c.relkind = 'p' THEN (
+                        SELECT sum(greatest(leaf.reltuples, 0))
+                        FROM pg_partition_tree(c.oid) tree
+                        JOIN pg_class leaf ON leaf.oid = tree.relid
+                        WHERE tree.isleaf
+                    ) ELSE c.reltuples END::bigint
+                    FROM pg_class c WHERE c.oid = to_regclass(%s)
+                    """,
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+                if row and row[0] is not None and row[0] >= 0:
+                    return row[0]
+                return queryset.count()
+
+            sql, params = queryset.order_by().query.sql_with_params()
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
@@ -0,0 +1,11 @@
+"""
+Core Query Parameters - parsing shared by the API views of all apps.
+"""
+
+
+def query_flag(request, name, default=False):
+    """Read a boolean query parameter; a bare "?name" counts as true."""
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("", "true", "1", "yes")
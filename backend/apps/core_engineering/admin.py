@@ -5,7 +5,7 @@ Core Engineering Admin Configuration
 from django.contrib import admin
 from mptt.admin import DraggableMPTTAdmin
 
-from .models import PlantHierarchy, Loop, InstrumentType, Tag
+from .models import PlantHierarchy, Loop, InstrumentType, Tag, TagRevision, TypicalLoop
 
 
 @admin.register(PlantHierarchy)
@@ -50,3 +50,30 @@ class TagAdmin(admin.ModelAdmin):
     list_filter = ("status", "instrument_type", "unit")
     search_fields = ("tag_number", "service", "description")
     raw_id_fields = ("unit", "loop", "instrument_type")
+
+
+@admin.register(TagRevision)
+class TagRevisionAdmin(admin.ModelAdmin):
+    list_display = ("id", "tag_number", "revision", "action", "changed_at")
+    list_filter = ("action",)
+    search_fields = ("tag_number",)
+    readonly_fields = (
+        "tag", "tag_number", "unit", "revision", "action", "changes", "changed_at",
+    )
+
+    # Written by database triggers only
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TypicalLoop)
+class TypicalLoopAdmin(admin.ModelAdmin):
+    list_display = ("name", "function", "is_active")
+    list_filter = ("function", "is_active")
+    search_fields = ("name", "description")
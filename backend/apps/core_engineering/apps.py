@@ -5,3 +5,6 @@ class CoreEngineeringConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.core_engineering"
     verbose_name = "Core Engineering"
+
+    def ready(self):
+        from . import signals  # noqa: F401
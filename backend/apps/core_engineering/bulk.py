@@ -0,0 +1,280 @@
+"""
+Bulk Tag Updates - set-based edits that keep Tag.save() semantics.
+
+Tag.save() increments revision and runs Tag.clean(): the unit must be a
+UNIT node, the loop must belong to the tag's unit and spec_data must match
+the instrument type's schema. A plain queryset.update() skips all of that.
+
+TagBulkUpdater applies the same rules to a whole selection with a handful of
+queries, independent of the number of tags:
+- the target rows are locked and counted in one query
+- loop/unit consistency and (unit, tag_number) uniqueness are each checked
+  with one query over the selection
+- spec_data is validated once per distinct (instrument type, spec_data)
+  document instead of once per tag
+- a single UPDATE writes the changes, applies the spec_data patch in the
+  database (see specpatch.py) and sets revision = revision + 1
+- the per-tag diffs recorded by the history triggers are audited in one
+  statement (see apps.administration.audit)
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Case, Count, F, JSONField, Q, Value, When
+from django.utils import timezone
+
+from apps.administration.audit import audit_tag_revisions
+
+from .history import current_revision
+from .models import InstrumentType, Loop, PlantHierarchy, Tag
+from .refcache import bump_generation_on_commit
+from .specpatch import (
+    SpecPatchError,
+    apply_operations,
+    operations_expression,
+    spec_patch_operations,
+)
+from .validation import get_validator, run_validator
+
+# Tag fields that can be set for a whole selection
+BULK_UPDATE_FIELDS = (
+    "status", "unit", "loop", "instrument_type", "service", "description"
+)
+
+# Tags listed per error message
+MAX_REPORTED_TAGS = 10
+
+
+class TagBulkUpdateError(Exception):
+    """Raised when a bulk update would leave tags invalid; nothing is written."""
+
+    def __init__(self, errors):
+        super().__init__("Bulk update failed validation")
+        self.errors = errors
+
+
+def _tag_list(queryset):
+    return ", ".join(queryset.values_list("tag_number", flat=True)[:MAX_REPORTED_TAGS])
+
+
+class TagBulkUpdater:
+    """
+    Apply the same changes to many tags in the current tenant schema.
+
+    Usage:
+        updater = TagBulkUpdater(
+            ids, {"status": "INACTIVE"}, spec_patch={"range_max": 250}
+        )
+        updater = TagBulkUpdater(
+            ids, spec_patch=[{"op": "remove", "path": "/material"}]
+        )
+        updated = updater.run()
+
+    changes maps BULK_UPDATE_FIELDS to values (model instances or None for
+    relations). spec_patch is a JSON Merge Patch (object) or JSON Patch
+    (array) for spec_data. Raises TagBulkUpdateError, with per-field
+    errors, before anything is written.
+    """
+
+    def __init__(self, ids, changes=None, spec_patch=None):
+        self.ids = sorted(set(ids))
+        self.changes = dict(changes or {})
+        try:
+            self.spec_operations = (
+                spec_patch_operations(spec_patch) if spec_patch else []
+            )
+        except SpecPatchError as e:
+            raise TagBulkUpdateError({"spec_data": [str(e)]})
+        unknown = set(self.changes) - set(BULK_UPDATE_FIELDS)
+        if unknown:
+            raise ValueError(
+                f"Fields can't be bulk updated: {', '.join(sorted(unknown))}"
+            )
+
+    def run(self):
+        """
+        Validate and apply the update in one transaction.
+        Returns the number of tags updated.
+        """
+        if not self.ids or not (self.changes or self.spec_operations):
+            return 0
+
+        with transaction.atomic():
+            # Lock the selection so the checks below stay true until the UPDATE
+            found = set(
+                Tag.objects.select_for_update()
+                .filter(pk__in=self.ids)
+                .values_list("pk", flat=True)
+            )
+            errors = {}
+            missing = [pk for pk in self.ids if pk not in found]
+            if missing:
+                reported = ", ".join(map(str, missing[:MAX_REPORTED_TAGS]))
+                errors["ids"] = [f"Tags not found: {reported}"]
+            else:
+                self._check_relations(errors)
+                self._check_spec_data(errors)
+            if errors:
+                raise TagBulkUpdateError(errors)
+
+            since = current_revision()
+            updated = self._update()
+            audit_tag_revisions(since)
+            bump_generation_on_commit(Tag)
+            return updated
+
+    @property
+    def selection(self):
+        return Tag.objects.filter(pk__in=self.ids)
+
+    def _check_relations(self, errors):
+        unit = self.changes.get("unit")
+        loop = self.changes.get("loop")
+
+        if "unit" in self.changes:
+            if unit is None:
+                errors["unit"] = ["Tags must be assigned to a unit."]
+                return
+            if unit.node_type != PlantHierarchy.NodeType.UNIT:
+                errors["unit"] = [
+                    "Tag must be assigned to a UNIT, not a PLANT or AREA."
+                ]
+                return
+
+        # The loop each tag will have after the update must share its unit
+        if loop is not None:
+            loop = Loop.objects.select_for_update().get(pk=loop.pk)
+            if unit is not None:
+                if loop.unit_id != unit.pk:
+                    errors["loop"] = [
+                        f"Loop {loop.loop_tag} belongs to another unit than {unit}."
+                    ]
+            else:
+                mismatched = self.selection.exclude(unit_id=loop.unit_id)
+                if mismatched.exists():
+                    errors["loop"] = [
+                        f"Loop {loop.loop_tag} belongs to another unit than tags: "
+                        f"{_tag_list(mismatched)}"
+                    ]
+        elif unit is not None and "loop" not in self.changes:
+            mismatched = self.selection.filter(loop__isnull=False).exclude(
+                loop__unit_id=unit.pk
+            )
+            if mismatched.exists():
+                errors["unit"] = [
+                    "Tags keep loops of another unit (clear or reassign the loop): "
+                    f"{_tag_list(mismatched)}"
+                ]
+
+        # (unit, tag_number) stays unique when tags move to another unit
+        if unit is not None:
+            duplicates = (
+                self.selection.values("tag_number")
+                .annotate(n=Count("pk"))
+                .filter(n__gt=1)
+            )
+            conflicts = Tag.objects.filter(
+                unit_id=unit.pk,
+                tag_number__in=self.selection.values("tag_number"),
+            ).exclude(pk__in=self.ids)
+            taken = [row["tag_number"] for row in duplicates[:MAX_REPORTED_TAGS]]
+            taken += list(
+                conflicts.values_list("tag_number", flat=True)[:MAX_REPORTED_TAGS]
+            )
+            if taken:
+                errors["unit"] = [
+                    f"Tag numbers already exist in {unit}: {', '.join(taken)}"
+                ]
+
+    def _check_spec_data(self, errors):
+        instrument_type = self.changes.get("instrument_type")
+        if "instrument_type" in self.changes and instrument_type is None:
+            errors["instrument_type"] = ["Tags must have an instrument type."]
+            return
+        if instrument_type is None and not self.spec_operations:
+            return
+
+        if instrument_type is not None:
+            self.types = {instrument_type.pk: instrument_type}
+        else:
+            self.types = {
+                instrument_type.pk: instrument_type
+                for instrument_type in InstrumentType.objects.filter(
+                    pk__in=self.selection.values("instrument_type_id")
+                )
+            }
+
+        # Validate each distinct document once, as it will be after the update.
+        # order_by() drops Tag.Meta.ordering, which would add tag_number to
+        # the DISTINCT and make every row distinct.
+        documents = (
+            self.selection.order_by()
+            .values_list("instrument_type_id", "spec_data")
+            .distinct()
+        )
+        # (type code, message) -> documents failing with it
+        messages = {}
+        for type_id, spec_data in documents.iterator():
+            target = self._target_type(type_id)
+            try:
+                patched = self._patched_spec(spec_data, target)
+            except SpecPatchError as e:
+                validation_errors = [str(e)]
+            else:
+                if not patched or not target.schema_template:
+                    continue
+                is_valid, validation_errors = run_validator(
+                    get_validator(target), patched
+                )
+                if is_valid:
+                    continue
+            key = (target.code, "; ".join(validation_errors))
+            if key not in messages and len(messages) == MAX_REPORTED_TAGS:
+                break
+            messages.setdefault(key, []).append(
+                Q(instrument_type_id=type_id, spec_data=spec_data)
+            )
+        if messages:
+            errors["spec_data"] = [
+                f"{message} ({code}: "
+                f"{_tag_list(self.selection.filter(reduce(or_, documents)))})"
+                for (code, message), documents in messages.items()
+            ]
+
+    def _target_type(self, type_id):
+        return self.changes.get("instrument_type") or self.types[type_id]
+
+    def _patched_spec(self, spec_data, instrument_type):
+        # Tag.save() fills an empty spec_data from the instrument type defaults
+        if not spec_data:
+            spec_data = instrument_type.default_spec_data
+        return apply_operations(spec_data, self.spec_operations)
+
+    def _spec_data_expression(self):
+        """spec_data after the update: type defaults when empty, then the patch."""
+        defaults = [
+            When(
+                Q(spec_data={}) if "instrument_type" in self.changes
+                else Q(spec_data={}, instrument_type_id=type_id),
+                then=Value(instrument_type.default_spec_data, output_field=JSONField()),
+            )
+            for type_id, instrument_type in self.types.items()
+            if instrument_type.default_spec_data
+        ]
+        base = Case(*defaults, default=F("spec_data")) if defaults else F("spec_data")
+        return operations_expression(self.spec_operations, base)
+
+    def _update(self):
+        values = {
+            field if field in ("status", "service", "description") else f"{field}_id":
+            value.pk if hasattr(value, "pk") else value
+            for field, value in self.changes.items()
+        }
+        values["revision"] = F("revision") + 1
+        values["updated_at"] = timezone.now()
+
+        if self.spec_operations or "instrument_type" in self.changes:
+            values["spec_data"] = self._spec_data_expression()
+        return self.selection.update(**values)
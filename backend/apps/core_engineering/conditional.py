@@ -0,0 +1,120 @@
+"""
+Conditional GET - ETag / Last-Modified validators for the read endpoints.
+
+Clients polling the tag, loop and hierarchy endpoints mostly receive the
+data they already have. Instead of hashing each rendered body, the
+validators of a response are derived from the change generations of the
+tables it reads (see refcache.py), which signals.py and the bulk write paths
+bump on every change:
+
+- ETag: a strong validator hashing the tenant schema, the generations, the
+  full path (query string included) and the negotiated media type.
+- Last-Modified: the latest change time of those tables.
+
+Both come from one Redis round trip, checked in initial() after
+authentication and permissions: a matching If-None-Match (or, without it,
+If-Modified-Since) answers 304 Not Modified before the queryset is touched
+or anything is serialized. HTTP dates have whole seconds, so a change
+later within the second Last-Modified names would still match
+If-Modified-Since: unless the change time is a whole second, requests
+validating with If-Modified-Since alone get the full response. If the cache
+is unreachable, responses go out without validators.
+"""
+
+import hashlib
+import logging
+
+from django.db import connection
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
+
+from .refcache import change_generations
+
+logger = logging.getLogger(__name__)
+
+
+class NotModifiedError(Exception):
+    """Carries the 304 / 412 response of a conditional request out of initial()."""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    ViewSet mixin answering conditional GET / HEAD requests on
+    conditional_actions.
+
+    The generations of the queryset's model and of conditional_models are
+    the validators' inputs, so conditional_models must list every other
+    model whose rows appear in (or are counted by) the responses.
+    """
+
+    conditional_actions = ("list", "retrieve")
+    conditional_models = ()
+
+    def get_conditional_models(self):
+        return (self.queryset.model, *self.conditional_models)
+
+    def get_validators(self, request):
+        """(ETag, Last-Modified Unix time) of the response, or None."""
+        schema = getattr(connection, "schema_name", None)
+        try:
+            generations = change_generations(self.get_conditional_models(), schema)
+        except Exception:
+            logger.warning("Change generations unavailable", exc_info=True)
+            return None
+        parts = [schema, request.get_full_path(), request.accepted_media_type]
+        parts.extend(
+            f"{model._meta.label}:{generation}"
+            for model, (generation, _changed_at) in generations.items()
+        )
+        etag = '"%s"' % hashlib.sha1("\n".join(map(str, parts)).encode()).hexdigest()
+        last_modified = max(changed_at for _, changed_at in generations.values())
+        return etag, last_modified
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.conditional_validators = None
+        if request.method not in ("GET", "HEAD"):
+            return
+        if self.action not in self.conditional_actions:
+            return
+        self.conditional_validators = self.get_validators(request)
+        if self.conditional_validators is not None:
+            etag, last_modified = self.conditional_validators
+            response = get_conditional_response(
+                request, etag=etag, last_modified=int(last_modified)
+            )
+            if response is None:
+                return
+            if (
+                response.status_code == 304
+                and last_modified != int(last_modified)
+                and "HTTP_IF_NONE_MATCH" not in request.META
+            ):
+                # Matched If-Modified-Since on a truncated time
+                return
+            raise NotModifiedError(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModifiedError):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        validators = getattr(self, "conditional_validators", None)
+        if validators is not None and response.status_code in (200, 304):
+            etag, last_modified = validators
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(int(last_modified))
+            # Revalidate on every use; the tenant is chosen by a header
+            patch_cache_control(response, private=True, no_cache=True)
+            patch_vary_headers(response, ("X-Project-ID",))
+        return response
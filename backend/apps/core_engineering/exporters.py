@@ -0,0 +1,188 @@
+"""
+Instrument Index Export - streaming CSV / XLSX / NDJSON export of tags.
+
+Rows are read with a server-side cursor (QuerySet.iterator) and encoded one
+at a time, so memory use stays flat regardless of how many tags are
+exported. Only the selected columns are fetched; spec_data keys are
+extracted inside PostgreSQL rather than loading whole JSON documents.
+
+Column names match the bulk importer, so an exported file can be edited
+and re-imported as-is.
+"""
+
+import csv
+import json
+import tempfile
+from datetime import datetime
+
+from django.db.models.fields.json import KeyTransform
+
+from .importers import SPEC_COLUMN_PREFIX
+from .models import InstrumentType
+
+# Export column name -> queryset lookup
+EXPORT_COLUMNS = {
+    "id": "id",
+    "tag_number": "tag_number",
+    "unit": "unit__path",
+    "unit_code": "unit__code",
+    "loop": "loop__loop_tag",
+    "instrument_type": "instrument_type__code",
+    "service": "service",
+    "description": "description",
+    "status": "status",
+    "revision": "revision",
+    "created_at": "created_at",
+    "updated_at": "updated_at",
+}
+
+DEFAULT_EXPORT_COLUMNS = [
+    "tag_number",
+    "unit",
+    "loop",
+    "instrument_type",
+    "service",
+    "description",
+    "status",
+    "revision",
+    f"{SPEC_COLUMN_PREFIX}*",
+]
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "xlsx": (
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "xlsx",
+    ),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+class ExportError(Exception):
+    """Raised for invalid export options (unknown columns or formats)."""
+
+
+def spec_keys_for(queryset):
+    """
+    Return spec_data keys declared by the instrument types used in queryset,
+    in schema order. Uses the schema_template properties so no tag rows need
+    to be scanned.
+    """
+    keys = {}
+    instrument_types = InstrumentType.objects.filter(
+        pk__in=queryset.order_by().values("instrument_type_id").distinct()
+    ).order_by("code")
+    for schema in instrument_types.values_list("schema_template", flat=True):
+        for key in (schema or {}).get("properties", {}):
+            keys.setdefault(key, None)
+    return list(keys)
+
+
+def resolve_columns(requested, queryset):
+    """
+    Expand a list of requested column names.
+    "spec_data.*" expands to every spec key of the exported instrument types.
+    """
+    columns = []
+    for column in requested or DEFAULT_EXPORT_COLUMNS:
+        column = column.strip()
+        if not column:
+            continue
+        if column == f"{SPEC_COLUMN_PREFIX}*":
+            columns.extend(
+                f"{SPEC_COLUMN_PREFIX}{key}" for key in spec_keys_for(queryset)
+            )
+        elif column.startswith(SPEC_COLUMN_PREFIX) or column in EXPORT_COLUMNS:
+            columns.append(column)
+        else:
+            raise ExportError(f"Unknown export column '{column}'.")
+    # Keep the first occurrence of each column
+    return list(dict.fromkeys(columns))
+
+
+def iter_export_rows(queryset, columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield one tuple of values per tag, streaming from a server-side cursor."""
+    lookups = []
+    annotations = {}
+    for index, column in enumerate(columns):
+        if column.startswith(SPEC_COLUMN_PREFIX):
+            alias = f"_spec_{index}"
+            annotations[alias] = KeyTransform(
+                column[len(SPEC_COLUMN_PREFIX):], "spec_data"
+            )
+            lookups.append(alias)
+        else:
+            lookups.append(EXPORT_COLUMNS[column])
+
+    queryset = queryset.annotate(**annotations) if annotations else queryset
+    # select_related is meaningless for values_list; the lookups join directly
+    yield from queryset.select_related(None).values_list(*lookups).iterator(
+        chunk_size=chunk_size
+    )
+
+
+def _text_cell(value):
+    """Render a value for text formats (CSV)."""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class _Echo:
+    """File-like object whose write() returns the value, for streaming csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows, columns):
+    """Yield CSV lines, header first."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_text_cell(value) for value in row])
+
+
+def stream_ndjson(rows, columns):
+    """Yield one JSON object per line."""
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), default=_json_default) + "\n"
+
+
+def write_xlsx(rows, columns):
+    """
+    Write rows to an XLSX file using openpyxl's write-only mode.
+    Returns an open temporary file positioned at the start.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError as e:
+        raise ExportError("XLSX export requires the 'openpyxl' package.") from e
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Instrument Index")
+    worksheet.append(columns)
+    for row in rows:
+        worksheet.append([
+            value.replace(tzinfo=None) if isinstance(value, datetime)
+            else json.dumps(value) if isinstance(value, (dict, list))
+            else value
+            for value in row
+        ])
+
+    output = tempfile.TemporaryFile()
+    workbook.save(output)
+    output.seek(0)
+    return output
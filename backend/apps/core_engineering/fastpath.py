@@ -0,0 +1,197 @@
+"""
+Fast Read Path - serializer-free rendering for large read-only lists.
+
+Instantiating a ModelSerializer per row and calling to_representation on
+every field dominates CPU time once a list returns thousands of tags.
+RowSerializer compiles a flat, read-only serializer class once into a list
+of (key, lookup, mapper) entries, reads rows with .values() and builds the
+output dicts directly. The result is encoded with orjson when it is
+installed. The fast path is off unless settings.FAST_READ_ENABLED is set.
+
+Output is byte-identical to the DRF serializer rendered by JSONRenderer:
+same keys in the same order, the same value formatting, and fields whose
+source crosses a NULL relation are omitted just like DRF skips them.
+"""
+
+import json
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+JSON_CONTENT_TYPE = "application/json"
+
+
+def dumps(data):
+    """
+    Encode data as compact UTF-8 JSON bytes, matching DRF's JSONRenderer
+    defaults (no ASCII escaping, U+2028/U+2029 escaped).
+    """
+    if orjson is not None:
+        content = orjson.dumps(data)
+    else:
+        content = json.dumps(
+            data, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+        ).encode()
+    return content.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+        b"\xe2\x80\xa9", b"\\u2029"
+    )
+
+
+def _identity(value):
+    return value
+
+
+def _to_str(value):
+    return value if value is None or type(value) is str else str(value)
+
+
+def _to_int(value):
+    return value if value is None or type(value) is int else int(value)
+
+
+def _mapper_for(field):
+    """Return a value mapper reproducing field.to_representation for a raw value."""
+    if isinstance(field, PrimaryKeyRelatedField):
+        # .values() already yields the primary key
+        return _identity
+    if isinstance(field, serializers.ChoiceField):
+        choices = field.choice_strings_to_values
+        return lambda value: (
+            value if value in ("", None) else choices.get(str(value), value)
+        )
+    if isinstance(field, serializers.CharField):
+        return _to_str
+    if isinstance(field, serializers.IntegerField):
+        return _to_int
+    if isinstance(field, serializers.BooleanField):
+        return _identity
+    if isinstance(field, serializers.JSONField) and not field.binary:
+        return _identity
+    return lambda value: None if value is None else field.to_representation(value)
+
+
+class RowSerializer:
+    """
+    A read-only serializer compiled to run over .values() rows.
+
+    Only fields with a plain source (model columns or forward relations)
+    are supported; method fields and properties raise ValueError.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.entries = []
+        lookups = []
+
+        for key, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if field.source == "*" or isinstance(
+                field, serializers.SerializerMethodField
+            ):
+                raise ValueError(
+                    f"{serializer_class.__name__}.{key} "
+                    "can't be rendered from .values()"
+                )
+            lookup = field.source.replace(".", "__")
+            # DRF skips a field when an intermediate relation is NULL
+            guard = None
+            if "." in field.source:
+                guard = field.source.rsplit(".", 1)[0].replace(".", "__")
+                lookups.append(guard)
+            lookups.append(lookup)
+            self.entries.append((key, lookup, guard, _mapper_for(field)))
+
+        self.lookups = list(dict.fromkeys(lookups))
+
+    def values(self, queryset, *extra_lookups):
+        """Return queryset.values() with the lookups this serializer reads."""
+        lookups = list(dict.fromkeys(self.lookups + list(extra_lookups)))
+        return queryset.select_related(None).values(*lookups)
+
+    def to_representation(self, rows):
+        """Build output dicts from .values() rows."""
+        entries = self.entries
+        data = []
+        append = data.append
+        for row in rows:
+            item = {}
+            for key, lookup, guard, mapper in entries:
+                if guard is not None and row[guard] is None:
+                    continue
+                item[key] = mapper(row[lookup])
+            append(item)
+        return data
+
+
+_row_serializers = {}
+
+
+def get_row_serializer(serializer_class):
+    """Return the compiled RowSerializer for a serializer class (cached)."""
+    row_serializer = _row_serializers.get(serializer_class)
+    if row_serializer is None:
+        row_serializer = RowSerializer(serializer_class)
+        _row_serializers[serializer_class] = row_serializer
+    return row_serializer
+
+
+def json_response(data, status=200):
+    """Return pre-encoded JSON, bypassing the DRF renderer."""
+    return HttpResponse(dumps(data), content_type=JSON_CONTENT_TYPE, status=status)
+
+
+class FastReadMixin:
+    """
+    ViewSet mixin rendering read-only lists through a RowSerializer.
+
+    fast_read_actions lists the actions allowed to use it. The fast path is
+    only taken when settings.FAST_READ_ENABLED is set, JSON is the negotiated
+    format and no sparse fieldset is requested; otherwise the regular
+    serializer runs.
+    """
+
+    fast_read_actions = ()
+
+    def fast_read_enabled(self):
+        if not getattr(settings, "FAST_READ_ENABLED", False):
+            return False
+        if self.action not in self.fast_read_actions:
+            return False
+        renderer = getattr(self.request, "accepted_renderer", None)
+        if not isinstance(renderer, JSONRenderer):
+            return False
+        projection_requested = getattr(self, "projection_requested", None)
+        return not (projection_requested and projection_requested())
+
+    def fast_read_response(self, queryset, serializer_class, paginate=True):
+        """Render queryset with the fast path, paginated like the regular list."""
+        row_serializer = get_row_serializer(serializer_class)
+        if paginate and self.paginator is not None:
+            # Pagination reads the ordering values from each row
+            ordering = [
+                field.lstrip("-")
+                for field in (
+                    self.paginator.get_ordering(queryset)
+                    if hasattr(self.paginator, "get_ordering")
+                    else queryset.query.order_by
+                )
+                if isinstance(field, str)
+            ]
+            page = self.paginate_queryset(row_serializer.values(queryset, *ordering))
+            if page is not None:
+                response = self.get_paginated_response(
+                    row_serializer.to_representation(page)
+                )
+                return json_response(response.data, status=response.status_code)
+
+        rows = row_serializer.values(queryset).iterator(chunk_size=2000)
+        return json_response(row_serializer.to_representation(rows))
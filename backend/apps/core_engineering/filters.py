@@ -0,0 +1,197 @@
+"""
+Core Engineering Filters - django-filter FilterSets for engineering models
+"""
+
+import json
+import math
+import re
+
+from django.db.models import BooleanField, CharField, Func, Q, Value
+from django.db.models.fields.json import KeyTransform
+from django.db.models.lookups import Exact
+from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
+
+from .models import PlantHierarchy, Tag
+
+
+def path_prefix_q(field, path):
+    """
+    Match a hierarchy path and everything below it.
+
+    Uses the indexed materialized path, so "PLANT-001 / A-100" matches the
+    area itself and all of its descendants without walking the tree.
+    """
+    path = path.strip()
+    return Q(**{field: path}) | Q(
+        **{f"{field}__startswith": f"{path}{PlantHierarchy.PATH_SEPARATOR}"}
+    )
+
+
+class PlantHierarchyFilter(filters.FilterSet):
+    """Filters for PlantHierarchy, including subtree lookup by path."""
+
+    path = filters.CharFilter(
+        method="filter_path",
+        help_text="Hierarchy path prefix (e.g., 'PLANT-001 / A-100')",
+    )
+
+    class Meta:
+        model = PlantHierarchy
+        fields = ["node_type", "is_active", "parent"]
+
+    def filter_path(self, queryset, name, value):
+        return queryset.filter(path_prefix_q("path", value))
+
+
+class TagFilter(filters.FilterSet):
+    """
+    Filters for Tag, including all tags under a hierarchy path and
+    spec_data attributes (spec__<key>[__<lookup>], see spec_data_q).
+    """
+
+    path = filters.CharFilter(
+        method="filter_path",
+        help_text="Hierarchy path prefix of the tag's unit (e.g., 'PLANT-001 / A-100')",
+    )
+
+    class Meta:
+        model = Tag
+        fields = ["status", "unit", "loop", "instrument_type"]
+
+    def filter_path(self, queryset, name, value):
+        return queryset.filter(path_prefix_q("unit__path", value))
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        condition = spec_data_q(self.data)
+        return queryset.filter(condition) if condition else queryset
+
+
+# =============================================================================
+# spec_data filtering
+# =============================================================================
+
+SPEC_FILTER_PREFIX = "spec__"
+SPEC_RANGE_LOOKUPS = ("gt", "gte", "lt", "lte")
+SPEC_LOOKUPS = ("exact", "in", "exists") + SPEC_RANGE_LOOKUPS
+
+# Top-level spec_data keys that can be filtered on ("__" separates the lookup)
+SPEC_KEY_RE = re.compile(r"^[A-Za-z](?:_?[A-Za-z0-9\-])*$")
+
+TRUE_VALUES = ("true", "1", "yes", "")
+FALSE_VALUES = ("false", "0", "no")
+
+
+class JSONPathExists(Func):
+    """jsonb @? jsonpath, which the jsonb_path_ops GIN index supports (unlike ?)."""
+
+    template = "%(expressions)s"
+    arg_joiner = " @? "
+    output_field = BooleanField()
+
+    def __init__(self, expression, path, **extra):
+        path = Func(Value(path), template="%(expressions)s::jsonpath")
+        super().__init__(expression, path, **extra)
+
+
+def parse_spec_value(raw):
+    """
+    Return the JSON values a query string value may stand for.
+
+    "100" matches both the number 100 and the string "100", "true" both
+    true and "true"; anything else is a string. Raises ValueError for
+    numbers JSON can't store (NaN, Infinity, 1e999).
+    """
+    candidates = []
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        pass
+    else:
+        if isinstance(value, float) and not math.isfinite(value):
+            raise ValueError("Numbers must be finite.")
+        if isinstance(value, (bool, int, float)) or value is None:
+            candidates.append(value)
+    candidates.append(raw)
+    return candidates
+
+
+def spec_key_q(key, lookup, raw):
+    """
+    Build the filter for one spec__<key>[__<lookup>] parameter.
+
+    - exact / in: containment (spec_data @> {...}), served by the
+      jsonb_path_ops GIN index
+    - exists: spec_data @? '$."key"', also served by the GIN index
+    - gt / gte / lt / lte: comparison of spec_data -> 'key' restricted to
+      values of the same JSON type, served by per-instrument-type
+      expression indexes (see the spec_index command)
+    """
+    if lookup in ("exact", "in"):
+        values = raw.split(",") if lookup == "in" else [raw]
+        condition = Q()
+        for value in values:
+            for candidate in parse_spec_value(value.strip()):
+                condition |= Q(spec_data__contains={key: candidate})
+        return condition
+
+    if lookup == "exists":
+        value = raw.strip().lower()
+        if value not in TRUE_VALUES + FALSE_VALUES:
+            raise ValidationError(
+                {f"{SPEC_FILTER_PREFIX}{key}__exists": ["Expected true or false."]}
+            )
+        condition = Q(JSONPathExists("spec_data", f'$."{key}"'))
+        return condition if value in TRUE_VALUES else ~condition
+
+    value = parse_spec_value(raw.strip())[0]
+    if isinstance(value, bool) or value is None:
+        raise ValidationError(
+            {f"{SPEC_FILTER_PREFIX}{key}__{lookup}": ["Expected a number or a string."]}
+        )
+    # jsonb orders all strings below all numbers below all booleans
+    json_type = "string" if isinstance(value, str) else "number"
+    return Q(**{f"spec_data__{key}__{lookup}": value}) & Q(
+        Exact(
+            Func(
+                KeyTransform(key, "spec_data"),
+                function="jsonb_typeof",
+                output_field=CharField(),
+            ),
+            json_type,
+        )
+    )
+
+
+def spec_data_q(params):
+    """
+    Build a filter from spec__<key>[__<lookup>] query parameters.
+
+    e.g. ?spec__output_signal=HART&spec__range_max__gte=100
+    Raises ValidationError for unknown keys or lookups and non-finite numbers.
+    """
+    condition = Q()
+    for name in params:
+        if not name.startswith(SPEC_FILTER_PREFIX):
+            continue
+        key, _sep, lookup = name[len(SPEC_FILTER_PREFIX):].partition("__")
+        lookup = lookup or "exact"
+        if not SPEC_KEY_RE.match(key):
+            raise ValidationError({name: [f"Invalid spec_data key '{key}'."]})
+        if lookup not in SPEC_LOOKUPS:
+            raise ValidationError(
+                {
+                    name: [
+                        f"Unknown lookup '{lookup}'. "
+                        f"Use one of: {', '.join(SPEC_LOOKUPS)}."
+                    ]
+                }
+            )
+        values = params.getlist(name) if hasattr(params, "getlist") else [params[name]]
+        for raw in values:
+            try:
+                condition &= spec_key_q(key, lookup, raw)
+            except ValueError as e:
+                raise ValidationError({name: [str(e)]})
+    return condition
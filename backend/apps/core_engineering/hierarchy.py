@@ -0,0 +1,76 @@
+"""
+Plant Hierarchy helpers - in-memory tree assembly for PlantHierarchy.
+
+The MPTT columns (tree_id, lft, rght, level) let us fetch an entire forest,
+or any subtree, in a single ordered query. Rows arrive in pre-order, so every
+parent is seen before its children and the nested structure can be built in
+one pass without recursive queries.
+"""
+
+from .models import PlantHierarchy
+
+TREE_NODE_FIELDS = (
+    "id",
+    "name",
+    "code",
+    "node_type",
+    "description",
+    "is_active",
+)
+
+
+def build_hierarchy_tree(
+    root=None, max_depth=None, include_inactive=False, prune_inactive=False
+):
+    """
+    Build the nested plant hierarchy with a single database query.
+
+    Args:
+        root: Optional PlantHierarchy node; only its subtree is returned.
+        max_depth: Optional number of levels below the top node(s) to include
+            (0 returns only the top node(s)).
+        include_inactive: Include inactive top-level node(s). As before, only
+            the top level is filtered on is_active by default; inactive nodes
+            below an active one are returned.
+        prune_inactive: Also drop inactive nodes below the top level, together
+            with their whole subtree.
+
+    Returns:
+        A list of top-level node dicts, each with a nested "children" list.
+    """
+    queryset = PlantHierarchy.objects.order_by("tree_id", "lft")
+    top_level = 0
+
+    if root is not None:
+        top_level = root.level
+        queryset = queryset.filter(
+            tree_id=root.tree_id, lft__gte=root.lft, rght__lte=root.rght
+        )
+
+    if max_depth is not None:
+        queryset = queryset.filter(level__lte=top_level + max_depth)
+
+    nodes = {}
+    roots = []
+
+    for row in queryset.values(*TREE_NODE_FIELDS, "parent_id", "level").iterator():
+        parent_id = row.pop("parent_id")
+        level = row.pop("level")
+        node = {**row, "children": []}
+
+        if level == top_level:
+            if not include_inactive and not row["is_active"]:
+                continue
+            roots.append(node)
+        else:
+            if prune_inactive and not row["is_active"]:
+                continue
+            parent = nodes.get(parent_id)
+            if parent is None:
+                # Top node or ancestor was left out, drop the whole branch
+                continue
+            parent["children"].append(node)
+
+        nodes[node["id"]] = node
+
+    return roots
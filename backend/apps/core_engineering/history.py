@@ -0,0 +1,337 @@
+"""
+Tag History - as-of reconstruction and diffs over TagRevision rows.
+
+TagRevision rows are written by database triggers (migration 0007) for every
+INSERT, UPDATE and DELETE on the tag table, each holding only the columns
+that changed as [old, new] and the spec_data keys that changed as
+{"-": {key: old value}, "+": {key: new value}}.
+
+A point in history is a snapshot token, a global revision (TagRevision.id,
+increasing across the whole project) or a timestamp. Ids and timestamps are
+assigned when a revision is written, not when its transaction commits, so a
+transaction committing late can land below a point taken in between; only
+snapshot tokens are commit-ordered. A token is PostgreSQL's
+pg_current_snapshot() ("xmin:xmax:xip,..."): a revision is after it if its
+transaction (TagRevision.txid) started from xmax on or was still in
+progress, so reports chained with "since=<previous token>" miss nothing.
+Both queries below read only the revisions after / between points, through
+the (tag, id), (unit, id), (changed_at, id) and (txid) indexes:
+- states_as_of() starts from the current tag rows and reverts the revisions
+  written after the point, newest first. Tags that existed before history
+  was recorded are reconstructed correctly as long as they haven't changed.
+- changes_between() folds the revisions between two points into one net
+  change per tag (first old value, last new value), without reconstructing
+  any state.
+"""
+
+import re
+from datetime import datetime, time
+from typing import NamedTuple
+
+from django.db import connection
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import PlantHierarchy, Tag, TagRevision
+
+# Tag columns tracked by the history triggers
+STATE_FIELDS = (
+    "tag_number",
+    "unit_id",
+    "loop_id",
+    "instrument_type_id",
+    "service",
+    "description",
+    "status",
+    "revision",
+    "spec_data",
+)
+
+# API names of the relation columns
+FIELD_NAMES = {
+    "unit_id": "unit",
+    "loop_id": "loop",
+    "instrument_type_id": "instrument_type",
+}
+
+# Rows fetched per round trip when reading tags and revisions
+CHUNK_SIZE = 10000
+
+_MISSING = object()
+
+_SNAPSHOT_RE = re.compile(r"^(\d+):(\d+):((?:\d+(?:,\d+)*)?)$")
+
+
+class HistoryError(Exception):
+    """Raised for an invalid point in history."""
+
+
+class Snapshot(NamedTuple):
+    """
+    A pg_snapshot: transactions below xmin had ended, those from xmax on
+    hadn't started and those in xip were in progress.
+    """
+
+    xmin: int
+    xmax: int
+    xip: tuple
+
+    def __str__(self):
+        return f"{self.xmin}:{self.xmax}:{','.join(map(str, self.xip))}"
+
+
+def parse_point(value):
+    """
+    Parse a point in history: a snapshot token, an integer global revision,
+    or an ISO 8601 datetime / date (a date means its start). Naive times are
+    in the project time zone.
+    """
+    value = (value or "").strip()
+    match = _SNAPSHOT_RE.match(value)
+    if match:
+        xmin, xmax, xip = match.groups()
+        return Snapshot(
+            int(xmin), int(xmax), tuple(int(txid) for txid in xip.split(",") if txid)
+        )
+    if value.isdigit():
+        return int(value)
+    try:
+        point = parse_datetime(value)
+        if point is None:
+            day = parse_date(value)
+            point = datetime.combine(day, time.min) if day else None
+    except ValueError:
+        point = None
+    if point is None:
+        raise HistoryError(
+            f"Invalid point in history '{value}': "
+            "use a snapshot token, a revision number or an ISO 8601 date/time."
+        )
+    if timezone.is_naive(point):
+        point = timezone.make_aware(point)
+    return point
+
+
+def _after(point):
+    if isinstance(point, Snapshot):
+        # Transactions the snapshot doesn't see
+        return Q(txid__gte=point.xmax) | Q(txid__in=point.xip)
+    if isinstance(point, int):
+        return Q(id__gt=point)
+    return Q(changed_at__gt=point)
+
+
+def _until(point):
+    if isinstance(point, Snapshot):
+        return Q(txid__lt=point.xmax) & ~Q(txid__in=point.xip)
+    if isinstance(point, int):
+        return Q(id__lte=point)
+    return Q(changed_at__lte=point)
+
+
+def revisions_between(since=None, until=None):
+    """TagRevision rows after since and up to until (either may be None)."""
+    revisions = TagRevision.objects.all()
+    if since is not None:
+        revisions = revisions.filter(_after(since))
+    if until is not None:
+        revisions = revisions.filter(_until(until))
+    return revisions
+
+
+def current_revision():
+    """The latest global revision of the project (0 before any change)."""
+    return TagRevision.objects.aggregate(revision=Max("id"))["revision"] or 0
+
+
+def current_point():
+    """A snapshot token for now, to use as the next report's since."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_current_snapshot()::text")
+        return parse_point(cursor.fetchone()[0])
+
+
+def units_under(node):
+    """Ids of the UNIT nodes at or below a hierarchy node."""
+    return list(
+        node.get_descendants(include_self=True)
+        .filter(node_type=PlantHierarchy.NodeType.UNIT)
+        .values_list("pk", flat=True)
+    )
+
+
+def _in_units(units):
+    # Revisions of tags in the units: after the change, or moved out of them
+    return Q(unit_id__in=units) | Q(changes__unit_id__0__in=units)
+
+
+# =============================================================================
+# As-of reconstruction
+# =============================================================================
+
+def _revert(state, action, changes):
+    """Return the state before a revision (None if the tag didn't exist)."""
+    if action == TagRevision.Action.CREATE:
+        return None
+    if action == TagRevision.Action.DELETE:
+        state = {"spec_data": {}}
+    elif state is None:
+        return None
+    for field, delta in changes.items():
+        if field == "spec_data":
+            spec_data = dict(state.get("spec_data") or {})
+            for key in delta["+"]:
+                spec_data.pop(key, None)
+            spec_data.update(delta["-"])
+            state["spec_data"] = spec_data
+        else:
+            state[field] = delta[0]
+    return state
+
+
+def states_as_of(point, tag_ids=None, units=None):
+    """
+    Reconstruct tags as they were at a point in history.
+
+    Limit the tags with tag_ids, or with units (ids of UNIT nodes) to get
+    the tags that were in those units at that point, including tags moved
+    or deleted since. Returns {tag id: {column: value}} for the tags that
+    existed at the point.
+    """
+    revisions = revisions_between(since=point)
+    tags = Tag.objects.all()
+    if tag_ids is not None:
+        tag_ids = set(tag_ids)
+        tags = tags.filter(pk__in=tag_ids)
+        revisions = revisions.filter(tag_id__in=tag_ids)
+    elif units is not None:
+        # Tags in the units now, or that were in them after the point;
+        # subqueries rather than id lists, which get long for whole plants
+        units = set(units)
+        touched = revisions.filter(_in_units(units)).values("tag_id")
+        tags = tags.filter(Q(unit_id__in=units) | Q(pk__in=touched))
+        revisions = revisions.filter(
+            Q(tag_id__in=Tag.objects.filter(unit_id__in=units).values("pk"))
+            | Q(tag_id__in=touched)
+        )
+
+    states = {
+        row.pop("id"): row
+        for row in tags.values("id", *STATE_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+    }
+    rows = revisions.order_by("-id").values_list("tag_id", "action", "changes")
+    for tag_id, action, changes in rows.iterator(chunk_size=CHUNK_SIZE):
+        states[tag_id] = _revert(states.get(tag_id), action, changes)
+
+    return {
+        tag_id: state
+        for tag_id, state in states.items()
+        if state is not None and (units is None or state["unit_id"] in units)
+    }
+
+
+def state_as_dict(tag_id, state):
+    """API representation of a reconstructed tag."""
+    return {
+        "id": tag_id,
+        **{FIELD_NAMES.get(field, field): state.get(field) for field in STATE_FIELDS},
+    }
+
+
+# =============================================================================
+# Changes between two points
+# =============================================================================
+
+def _net_change(entry):
+    """Collapse a folded entry into {field: {old, new}}, dropping reverted changes."""
+    def old_new(old, new):
+        values = {}
+        if old is not _MISSING:
+            values["old"] = old
+        if new is not _MISSING:
+            values["new"] = new
+        return values
+
+    fields = {
+        FIELD_NAMES.get(field, field): old_new(old, new)
+        for field, (old, new) in entry["fields"].items()
+        if old != new
+    }
+    spec_data = {
+        key: old_new(old, new)
+        for key, (old, new) in sorted(entry["spec_data"].items())
+        if old != new
+    }
+    return fields, spec_data
+
+
+def changes_between(since, until=None, tag_ids=None, units=None):
+    """
+    Net change of each tag between two points in history (since excluded,
+    until included; until defaults to now).
+
+    Returns a list ordered by tag number of {"tag", "tag_number", "unit",
+    "change" (created / modified / deleted), "fields", "spec_data",
+    "revisions"}, where fields and spec_data map names to {"old", "new"}
+    (a side is left out for spec_data keys that didn't exist). Tags created
+    and deleted within the range, or changed and changed back, are omitted.
+    """
+    revisions = revisions_between(since, until)
+    if tag_ids is not None:
+        revisions = revisions.filter(tag_id__in=set(tag_ids))
+    if units is not None:
+        # All revisions of the tags that were in the units at some point
+        revisions = revisions.filter(
+            tag_id__in=revisions.filter(_in_units(set(units))).values("tag_id")
+        )
+
+    entries = {}
+    rows = revisions.order_by("id").values_list(
+        "tag_id", "tag_number", "unit_id", "action", "changes"
+    )
+    for tag_id, tag_number, unit_id, action, changes in rows.iterator(
+        chunk_size=CHUNK_SIZE
+    ):
+        entry = entries.get(tag_id)
+        if entry is None:
+            entry = entries[tag_id] = {
+                "first": action, "fields": {}, "spec_data": {}, "revisions": 0,
+            }
+        entry.update(tag_number=tag_number, unit=unit_id, last=action)
+        entry["revisions"] += 1
+
+        for field, delta in changes.items():
+            if field == "spec_data":
+                removed, added = delta["-"], delta["+"]
+                for key in removed.keys() | added.keys():
+                    new = added.get(key, _MISSING)
+                    if key in entry["spec_data"]:
+                        entry["spec_data"][key][1] = new
+                    else:
+                        entry["spec_data"][key] = [removed.get(key, _MISSING), new]
+            elif field in entry["fields"]:
+                entry["fields"][field][1] = delta[1]
+            else:
+                entry["fields"][field] = list(delta)
+
+    report = []
+    for tag_id, entry in entries.items():
+        created = entry["first"] == TagRevision.Action.CREATE
+        deleted = entry["last"] == TagRevision.Action.DELETE
+        if created and deleted:
+            continue
+        fields, spec_data = _net_change(entry)
+        if not (created or deleted or spec_data or set(fields) - {"revision"}):
+            continue
+        report.append({
+            "tag": tag_id,
+            "tag_number": entry["tag_number"],
+            "unit": entry["unit"],
+            "change": "created" if created else "deleted" if deleted else "modified",
+            "fields": fields,
+            "spec_data": spec_data,
+            "revisions": entry["revisions"],
+        })
+    report.sort(key=lambda change: (change["tag_number"], change["tag"]))
+    return report
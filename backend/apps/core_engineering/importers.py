@@ -0,0 +1,482 @@
+"""
+Bulk Tag Import - high-throughput loading of instrument index spreadsheets.
+
+Rows are streamed from CSV or XLSX, unit/loop/instrument-type references are
+resolved through in-memory lookup maps built once per import, and rows are
+validated in batches with the cached spec_data validators. Valid rows are
+loaded into a temporary staging table with PostgreSQL COPY and merged into
+the tag table with a single INSERT ... ON CONFLICT statement, bypassing the
+per-row Tag.save() path.
+
+Every rejected row is reported with its spreadsheet row number and the
+per-field errors, so the file can be fixed and re-imported.
+"""
+
+import codecs
+import csv
+import json
+
+from django.db import connection, transaction
+
+from apps.administration.audit import audit_tag_revisions
+
+from .history import current_revision
+from .models import Loop, PlantHierarchy, Tag
+from .refcache import bump_generation_on_commit, instrument_types, units
+from .validation import get_validator, run_validator
+
+SPEC_COLUMN_PREFIX = "spec_data."
+
+# Accepted header aliases -> canonical column name
+COLUMN_ALIASES = {
+    "tag": "tag_number",
+    "tag_number": "tag_number",
+    "unit": "unit",
+    "unit_code": "unit",
+    "unit_path": "unit",
+    "loop": "loop",
+    "loop_tag": "loop",
+    "instrument_type": "instrument_type",
+    "instrument_type_code": "instrument_type",
+    "type": "instrument_type",
+    "service": "service",
+    "description": "description",
+    "status": "status",
+    "spec_data": "spec_data",
+}
+
+STAGING_COLUMNS = (
+    "tag_number",
+    "unit_id",
+    "loop_id",
+    "instrument_type_id",
+    "service",
+    "description",
+    "spec_data",
+    "status",
+)
+
+DEFAULT_BATCH_SIZE = 5000
+
+
+class TagImportError(Exception):
+    """Raised when an import file cannot be read at all."""
+
+
+# =============================================================================
+# Row sources
+# =============================================================================
+
+def read_csv_rows(fileobj, encoding="utf-8-sig"):
+    """Yield one dict per CSV data row. Accepts a binary or text file object."""
+    if isinstance(fileobj.read(0), bytes):
+        fileobj = codecs.getreader(encoding)(fileobj)
+    try:
+        yield from csv.DictReader(fileobj)
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise TagImportError(f"Could not read CSV file: {e}") from e
+
+
+def read_xlsx_rows(fileobj):
+    """Yield one dict per row of the first worksheet, streaming in read-only mode."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError as e:
+        raise TagImportError("XLSX import requires the 'openpyxl' package.") from e
+
+    try:
+        workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    except Exception as e:
+        raise TagImportError(f"Could not read XLSX file: {e}") from e
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(name) if name is not None else "" for name in header]
+        for values in rows:
+            if values and any(value is not None for value in values):
+                yield dict(zip(header, values))
+    finally:
+        workbook.close()
+
+
+def read_rows(fileobj, filename):
+    """Pick a row reader based on the file extension."""
+    name = (filename or "").lower()
+    if name.endswith(".xlsx"):
+        return read_xlsx_rows(fileobj)
+    if name.endswith(".csv") or name.endswith(".txt"):
+        return read_csv_rows(fileobj)
+    raise TagImportError("Unsupported file type. Upload a .csv or .xlsx file.")
+
+
+# =============================================================================
+# Importer
+# =============================================================================
+
+def _cell(value):
+    """Normalize a spreadsheet cell: strip strings, map blanks to None."""
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def _coerce_spec_value(value, property_schema):
+    """Convert a text cell to the JSON type declared in the schema property."""
+    if not isinstance(value, str):
+        return value
+    expected = property_schema.get("type")
+    types = expected if isinstance(expected, list) else [expected]
+    try:
+        if "integer" in types and value.lstrip("+-").isdigit():
+            return int(value)
+        if "number" in types:
+            number = float(value)
+            return int(number) if number.is_integer() and "." not in value else number
+        if "boolean" in types and value.lower() in (
+            "true", "false", "1", "0", "yes", "no"
+        ):
+            return value.lower() in ("true", "1", "yes")
+    except ValueError:
+        pass
+    return value
+
+
+class TagImporter:
+    """
+    Bulk importer for Tag rows in the current tenant schema.
+
+    Usage:
+        importer = TagImporter(update_existing=True)
+        report = importer.run(read_rows(fileobj, filename))
+    """
+
+    def __init__(
+        self, update_existing=True, dry_run=False, batch_size=DEFAULT_BATCH_SIZE
+    ):
+        self.update_existing = update_existing
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self._build_lookups()
+
+    def _build_lookups(self):
+        """Load every reference a row can point to, once per import."""
+        self.units = {}
+        ambiguous_codes = set()
+        for unit_id, unit in units().items():
+            code, path = unit.code, unit.path
+            self.units[path] = unit_id
+            if code in self.units and self.units[code] != unit_id:
+                ambiguous_codes.add(code)
+            self.units.setdefault(code, unit_id)
+        for code in ambiguous_codes:
+            # Unit codes are only unique per area; require the full path
+            self.units[code] = None
+        # Plant and area references, rejected like Tag.clean() does
+        self.non_units = set()
+        for code, path in PlantHierarchy.objects.exclude(
+            node_type=PlantHierarchy.NodeType.UNIT
+        ).values_list("code", "path"):
+            self.non_units.update((code, path))
+
+        self.loops = {
+            loop_tag: (loop_id, unit_id)
+            for loop_id, loop_tag, unit_id in Loop.objects.values_list(
+                "id", "loop_tag", "unit_id"
+            )
+        }
+        self.instrument_types = {
+            instrument_type.code: instrument_type
+            for instrument_type in instrument_types().values()
+        }
+        self.validators = {}
+        self.statuses = set(Tag.Status.values)
+        self.max_lengths = {
+            name: Tag._meta.get_field(name).max_length
+            for name in ("tag_number", "service")
+        }
+
+    def _validator_for(self, instrument_type):
+        if instrument_type.pk not in self.validators:
+            self.validators[instrument_type.pk] = (
+                get_validator(instrument_type)
+                if instrument_type.schema_template
+                else None
+            )
+        return self.validators[instrument_type.pk]
+
+    def normalize_row(self, raw):
+        """
+        Map raw spreadsheet headers to canonical column names.
+        Returns (row, spec_columns) where spec_columns holds the
+        "spec_data.<key>" cells.
+        """
+        row = {}
+        spec_columns = {}
+        for name, value in raw.items():
+            if name is None:
+                continue
+            key = str(name).strip()
+            if key.lower().startswith(SPEC_COLUMN_PREFIX):
+                value = _cell(value)
+                if value is not None:
+                    spec_columns[key[len(SPEC_COLUMN_PREFIX):]] = value
+                continue
+            canonical = COLUMN_ALIASES.get(key.lower().replace(" ", "_"))
+            if canonical:
+                row[canonical] = _cell(value)
+        return row, spec_columns
+
+    def clean_row(self, row, spec_columns):
+        """
+        Resolve and validate one normalized row.
+        Returns (values, errors): a dict of staging column values, or a dict
+        of field -> error message.
+        """
+        errors = {}
+
+        tag_number = row.get("tag_number")
+        tag_number = str(tag_number) if tag_number is not None else None
+        if not tag_number:
+            errors["tag_number"] = "This field is required."
+        elif len(tag_number) > self.max_lengths["tag_number"]:
+            errors["tag_number"] = (
+                "Ensure this field has no more than "
+                f"{self.max_lengths['tag_number']} characters."
+            )
+
+        unit_ref = row.get("unit")
+        unit_id = None
+        if unit_ref is None:
+            errors["unit"] = "This field is required."
+        else:
+            unit_ref = str(unit_ref)
+            if unit_ref not in self.units and unit_ref in self.non_units:
+                errors["unit"] = "Tag must be assigned to a UNIT, not a PLANT or AREA."
+            elif unit_ref not in self.units:
+                errors["unit"] = f"Unit '{unit_ref}' not found."
+            elif self.units[unit_ref] is None:
+                errors["unit"] = (
+                    f"Unit code '{unit_ref}' is ambiguous; use the full path "
+                    "(e.g., 'PLANT-001 / A-100 / U-110')."
+                )
+            else:
+                unit_id = self.units[unit_ref]
+
+        loop_id = None
+        loop_ref = row.get("loop")
+        if loop_ref is not None:
+            loop = self.loops.get(str(loop_ref))
+            if loop is None:
+                errors["loop"] = f"Loop '{loop_ref}' not found."
+            else:
+                loop_id, loop_unit_id = loop
+                if unit_id is not None and loop_unit_id != unit_id:
+                    errors["loop"] = "Loop must belong to the same unit as the tag."
+
+        instrument_type = None
+        type_ref = row.get("instrument_type")
+        if type_ref is None:
+            errors["instrument_type"] = "This field is required."
+        else:
+            instrument_type = self.instrument_types.get(str(type_ref))
+            if instrument_type is None:
+                errors["instrument_type"] = f"Instrument type '{type_ref}' not found."
+
+        status = row.get("status") or Tag.Status.ACTIVE
+        status = str(status).upper()
+        if status not in self.statuses:
+            errors["status"] = f"'{status}' is not a valid status."
+
+        service = str(row.get("service") or "")
+        if len(service) > self.max_lengths["service"]:
+            errors["service"] = (
+                "Ensure this field has no more than "
+                f"{self.max_lengths['service']} characters."
+            )
+
+        spec_data = {}
+        if row.get("spec_data") is not None:
+            spec_data = row["spec_data"]
+            if isinstance(spec_data, str):
+                try:
+                    spec_data = json.loads(spec_data)
+                except ValueError:
+                    errors["spec_data"] = "spec_data must be valid JSON."
+            if not isinstance(spec_data, dict):
+                errors["spec_data"] = "spec_data must be a JSON object."
+                spec_data = {}
+
+        if instrument_type is not None and "spec_data" not in errors:
+            properties = (instrument_type.schema_template or {}).get("properties", {})
+            for key, value in spec_columns.items():
+                spec_data[key] = _coerce_spec_value(value, properties.get(key, {}))
+            if not spec_data:
+                spec_data = dict(instrument_type.default_spec_data or {})
+
+            validator = self._validator_for(instrument_type)
+            if validator is not None and spec_data:
+                is_valid, spec_errors = run_validator(
+                    validator, spec_data, all_errors=True
+                )
+                if not is_valid:
+                    errors["spec_data"] = "; ".join(spec_errors)
+
+        if errors:
+            return None, errors
+
+        return {
+            "tag_number": tag_number,
+            "unit_id": unit_id,
+            "loop_id": loop_id,
+            "instrument_type_id": instrument_type.pk,
+            "service": service,
+            "description": str(row.get("description") or ""),
+            "spec_data": spec_data,
+            "status": status,
+        }, None
+
+    def run(self, rows):
+        """
+        Validate and load rows.
+        Returns a report dict with counts and per-row errors.
+        """
+        report = {
+            "total": 0,
+            "created": 0,
+            "updated": 0,
+            "unchanged": 0,
+            "skipped": 0,
+            "invalid": 0,
+            "dry_run": self.dry_run,
+            "errors": [],
+        }
+        seen = set()
+
+        def validated_batches():
+            batch = []
+            for index, raw in enumerate(rows):
+                report["total"] += 1
+                # Row 1 is the header row in the source spreadsheet
+                row_number = index + 2
+                row, spec_columns = self.normalize_row(raw)
+                values, errors = self.clean_row(row, spec_columns)
+                if values is not None:
+                    key = (values["unit_id"], values["tag_number"])
+                    if key in seen:
+                        values, errors = None, {
+                            "tag_number": (
+                                "Duplicate tag number for this unit in the file."
+                            )
+                        }
+                    else:
+                        seen.add(key)
+                if errors:
+                    report["invalid"] += 1
+                    report["errors"].append({
+                        "row": row_number,
+                        "tag_number": row.get("tag_number"),
+                        "errors": errors,
+                    })
+                    continue
+                batch.append(values)
+                if len(batch) >= self.batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        if self.dry_run:
+            for _batch in validated_batches():
+                pass
+            return report
+
+        with transaction.atomic():
+            since = current_revision()
+            created, updated = self._load_with_copy(validated_batches())
+            audit_tag_revisions(since)
+            bump_generation_on_commit(Tag)
+        report["created"] = created
+        report["updated"] = updated
+        # Valid rows that matched an existing tag and weren't written
+        untouched = report["total"] - report["invalid"] - created - updated
+        report["unchanged" if self.update_existing else "skipped"] = untouched
+        return report
+
+    # -------------------------------------------------------------------------
+    # Loaders
+    # -------------------------------------------------------------------------
+
+    def _load_with_copy(self, batches):
+        """COPY rows into a staging table, then upsert into the tag table."""
+        table = connection.ops.quote_name(Tag._meta.db_table)
+        columns = ", ".join(STAGING_COLUMNS)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                CREATE TEMPORARY TABLE tag_import_staging (
+                    tag_number varchar(50) NOT NULL,
+                    unit_id bigint NOT NULL,
+                    loop_id bigint NULL,
+                    instrument_type_id bigint NOT NULL,
+                    service varchar(500) NOT NULL,
+                    description text NOT NULL,
+                    spec_data jsonb NOT NULL,
+                    status varchar(20) NOT NULL
+                ) ON COMMIT DROP
+                """
+            )
+            with cursor.cursor.copy(
+                f"COPY tag_import_staging ({columns}) FROM STDIN"
+            ) as copy:
+                for batch in batches:
+                    for values in batch:
+                        copy.write_row([
+                            json.dumps(values[column]) if column == "spec_data"
+                            else values[column]
+                            for column in STAGING_COLUMNS
+                        ])
+
+            if self.update_existing:
+                conflict = """
+                    ON CONFLICT (unit_id, tag_number) DO UPDATE SET
+                        loop_id = EXCLUDED.loop_id,
+                        instrument_type_id = EXCLUDED.instrument_type_id,
+                        service = EXCLUDED.service,
+                        description = EXCLUDED.description,
+                        spec_data = EXCLUDED.spec_data,
+                        status = EXCLUDED.status,
+                        revision = t.revision + 1,
+                        updated_at = now()
+                    WHERE (t.loop_id, t.instrument_type_id, t.service,
+                           t.description, t.spec_data, t.status)
+                        IS DISTINCT FROM
+                          (EXCLUDED.loop_id, EXCLUDED.instrument_type_id,
+                           EXCLUDED.service, EXCLUDED.description,
+                           EXCLUDED.spec_data, EXCLUDED.status)
+                """
+            else:
+                conflict = "ON CONFLICT (unit_id, tag_number) DO NOTHING"
+
+            cursor.execute(
+                f"""
+                WITH upserted AS (
+                    INSERT INTO {table} AS t
+                        ({columns}, revision, created_at, updated_at)
+                    SELECT {columns}, 1, now(), now() FROM tag_import_staging
+                    {conflict}
+                    RETURNING (xmax = 0) AS inserted
+                )
+                SELECT count(*) FILTER (WHERE inserted),
+                       count(*) FILTER (WHERE NOT inserted)
+                FROM upserted
+                """
+            )
+            created, updated = cursor.fetchone()
+            # ON COMMIT DROP only fires at the outermost commit; drop it now
+            # so another import in the same transaction can create it again
+            cursor.execute("DROP TABLE tag_import_staging")
+        return created, updated
@@ -0,0 +1,75 @@
+"""
+Management command comparing the DRF and fast-path tag list renderers.
+
+Run it against a project schema with django-tenants:
+    python manage.py tenant_command benchmark_tag_list --schema=<schema>
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from apps.core_engineering.fastpath import dumps, get_row_serializer
+from apps.core_engineering.models import Tag
+from apps.core_engineering.serializers import TagListSerializer
+
+
+class Command(BaseCommand):
+    help = "Benchmark TagListSerializer against the fast read path (rows/second)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=10000,
+            help="Number of tags to render per run",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Runs per renderer; the best run is reported",
+        )
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        queryset = Tag.objects.select_related(
+            "unit", "loop", "instrument_type"
+        ).order_by("tag_number", "pk")[:rows]
+        count = queryset.count()
+        if not count:
+            raise CommandError("No tags to render in this schema.")
+
+        renderer = JSONRenderer()
+        row_serializer = get_row_serializer(TagListSerializer)
+
+        def render_drf():
+            return renderer.render(TagListSerializer(queryset, many=True).data)
+
+        def render_fast():
+            values = row_serializer.values(queryset)
+            return dumps(row_serializer.to_representation(values))
+
+        results = {}
+        renders = (("DRF serializer", render_drf), ("Fast path", render_fast))
+        for name, render in renders:
+            best = None
+            for _ in range(max(options["repeat"], 1)):
+                started = time.perf_counter()
+                content = render()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = (best, content)
+            self.stdout.write(
+                f"{name:<16} {count / best:>12,.0f} rows/s  "
+                f"({best * 1000:.1f} ms for {count} rows, {len(content):,} bytes)"
+            )
+
+        drf_time, drf_content = results["DRF serializer"]
+        fast_time, fast_content = results["Fast path"]
+        self.stdout.write(f"Speedup: {drf_time / fast_time:.1f}x")
+        if drf_content == fast_content:
+            self.stdout.write(self.style.SUCCESS("Output is byte-identical."))
+        else:
+            raise CommandError("Fast path output differs from TagListSerializer.")
@@ -0,0 +1,73 @@
+"""
+Management command to bulk import tags from a CSV or XLSX file.
+
+Run it against a project schema with django-tenants:
+    python manage.py tenant_command import_tags --schema=<schema> tags.xlsx
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core_engineering.importers import (
+    DEFAULT_BATCH_SIZE,
+    TagImporter,
+    TagImportError,
+    read_rows,
+)
+
+
+class Command(BaseCommand):
+    help = "Bulk import instrument tags from a CSV or XLSX file"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to a .csv or .xlsx file")
+        parser.add_argument(
+            "--no-update",
+            action="store_true",
+            help="Skip tags that already exist instead of updating them",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate the file without writing anything",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help="Rows validated per batch",
+        )
+        parser.add_argument(
+            "--max-errors",
+            type=int,
+            default=50,
+            help="Maximum number of row errors to print",
+        )
+
+    def handle(self, *args, **options):
+        importer = TagImporter(
+            update_existing=not options["no_update"],
+            dry_run=options["dry_run"],
+            batch_size=options["batch_size"],
+        )
+
+        try:
+            with open(options["path"], "rb") as fileobj:
+                report = importer.run(read_rows(fileobj, options["path"]))
+        except (OSError, TagImportError) as e:
+            raise CommandError(str(e))
+
+        for error in report["errors"][: options["max_errors"]]:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"  Row {error['row']} ({error['tag_number']}): {error['errors']}"
+                )
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{'Validated' if report['dry_run'] else 'Imported'} "
+                f"{report['total']} rows: {report['created']} created, "
+                f"{report['updated']} updated, {report['unchanged']} unchanged, "
+                f"{report['skipped']} skipped, {report['invalid']} invalid"
+            )
+        )
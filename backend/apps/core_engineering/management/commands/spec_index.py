@@ -0,0 +1,99 @@
+"""
+Management command maintaining expression indexes on hot spec_data keys.
+
+Range filters such as ?instrument_type=3&spec__range_max__gte=100 can't use
+the jsonb_path_ops GIN index. For keys that are filtered often, a partial
+B-tree index on (spec_data -> 'key') for one instrument type serves both
+ranges and equality. Run it against a project schema with django-tenants:
+    python manage.py tenant_command spec_index --schema=<schema> FT range_max
+    python manage.py tenant_command spec_index --schema=<schema> --list
+"""
+
+import hashlib
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.core_engineering.filters import SPEC_KEY_RE
+from apps.core_engineering.models import InstrumentType, Tag
+
+INDEX_PREFIX = "tag_spec_"
+MAX_NAME_LENGTH = 63
+
+
+def spec_index_name(instrument_type, key):
+    """Index name for an instrument type code and spec_data key (<= 63 chars)."""
+    name = f"{INDEX_PREFIX}{instrument_type.code}_{key}".lower()
+    name = "".join(char if char.isalnum() else "_" for char in name)
+    if len(name) > MAX_NAME_LENGTH:
+        digest = hashlib.md5(name.encode()).hexdigest()[:8]
+        name = f"{name[:MAX_NAME_LENGTH - 9]}_{digest}"
+    return name
+
+
+class Command(BaseCommand):
+    help = "Create, drop or list per-instrument-type indexes on spec_data keys"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "type_code", nargs="?", help="Instrument type code (e.g. FT)"
+        )
+        parser.add_argument(
+            "key", nargs="?", help="Top-level spec_data key (e.g. range_max)"
+        )
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Drop the index instead of creating it",
+        )
+        parser.add_argument(
+            "--list",
+            action="store_true",
+            help="List the spec_data indexes in this schema",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("spec_data indexes require PostgreSQL.")
+        table = Tag._meta.db_table
+
+        if options["list"]:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT indexname, indexdef FROM pg_indexes "
+                    "WHERE schemaname = current_schema() AND tablename = %s "
+                    "AND indexname LIKE %s ORDER BY indexname",
+                    [table, f"{INDEX_PREFIX}%"],
+                )
+                for name, definition in cursor.fetchall():
+                    self.stdout.write(f"{name}: {definition}")
+            return
+
+        if not options["type_code"] or not options["key"]:
+            raise CommandError(
+                "Give an instrument type code and a spec_data key, or --list."
+            )
+        try:
+            instrument_type = InstrumentType.objects.get(code=options["type_code"])
+        except InstrumentType.DoesNotExist:
+            raise CommandError(f"Unknown instrument type '{options['type_code']}'.")
+        key = options["key"]
+        if not SPEC_KEY_RE.match(key):
+            raise CommandError(f"Invalid spec_data key '{key}'.")
+
+        name = connection.ops.quote_name(spec_index_name(instrument_type, key))
+        # CONCURRENTLY keeps the tag table writable; it can't run in a transaction
+        if options["drop"]:
+            sql = f"DROP INDEX CONCURRENTLY IF EXISTS {name}"
+        else:
+            sql = (
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                f"ON {connection.ops.quote_name(table)} ((spec_data -> '{key}')) "
+                f"WHERE instrument_type_id = {int(instrument_type.pk)}"
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            if not options["drop"]:
+                # Expression indexes need fresh statistics to be costed
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(table)}")
+        self.stdout.write(self.style.SUCCESS(sql))
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:45
+
+from django.db import migrations, models
+
+
+def populate_paths(apps, schema_editor):
+    """Compute the materialized path for existing hierarchy nodes."""
+    PlantHierarchy = apps.get_model("core_engineering", "PlantHierarchy")
+    paths = {}
+    nodes = []
+    for node in PlantHierarchy.objects.order_by("tree_id", "lft").only(
+        "id", "parent_id", "code"
+    ):
+        if node.parent_id:
+            node.path = f"{paths[node.parent_id]} / {node.code}"
+        else:
+            node.path = node.code
+        paths[node.id] = node.path
+        nodes.append(node)
+    PlantHierarchy.objects.bulk_update(nodes, ["path"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core_engineering", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="planthierarchy",
+            name="path",
+            field=models.TextField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                help_text=(
+                    "Materialized hierarchy path of codes "
+                    "(e.g., 'PLANT-001 / A-100 / U-110'). "
+                    "Maintained automatically on save."
+                ),
+            ),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+    ]
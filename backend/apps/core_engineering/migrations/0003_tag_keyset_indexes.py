@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core_engineering", "0002_planthierarchy_path"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="tag",
+            index=models.Index(
+                fields=["tag_number", "id"], name="core_engine_tag_num_645ce0_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tag",
+            index=models.Index(
+                fields=["updated_at", "id"], name="core_engine_updated_a4915b_idx"
+            ),
+        ),
+    ]
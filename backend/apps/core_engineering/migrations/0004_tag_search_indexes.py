@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:01
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core_engineering", "0003_tag_keyset_indexes"),
+    ]
+
+    operations = [
+        # Install pg_trgm once per database in the public schema, which is on
+        # every tenant's search_path (TrigramExtension would install it into
+        # the first tenant schema migrated).
+        migrations.RunSQL(
+            "CREATE EXTENSION IF NOT EXISTS pg_trgm SCHEMA public",
+            reverse_sql=migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="loop",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("loop_tag"),
+                    name="gin_trgm_ops",
+                ),
+                name="loop_tag_trgm_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tag",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.CombinedSearchVector(
+                    django.contrib.postgres.search.CombinedSearchVector(
+                        django.contrib.postgres.search.SearchVector(
+                            "tag_number", config="simple", weight="A"
+                        ),
+                        "||",
+                        django.contrib.postgres.search.SearchVector(
+                            "service", config="simple", weight="B"
+                        ),
+                        django.contrib.postgres.search.SearchConfig("simple"),
+                    ),
+                    "||",
+                    django.contrib.postgres.search.SearchVector(
+                        "description", config="simple", weight="C"
+                    ),
+                    django.contrib.postgres.search.SearchConfig("simple"),
+                ),
+                name="tag_search_vector_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tag",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("tag_number"),
+                    name="gin_trgm_ops",
+                ),
+                name="tag_number_trgm_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:14
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core_engineering", "0004_tag_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="tag",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["spec_data"],
+                name="tag_spec_data_idx",
+                opclasses=["jsonb_path_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core_engineering", "0005_tag_spec_data_index"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TypicalLoop",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "name",
+                    models.CharField(
+                        help_text="Template name (e.g., 'Standard flow control loop')",
+                        max_length=200,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "function",
+                    models.CharField(
+                        choices=[
+                            ("F", "Flow"),
+                            ("T", "Temperature"),
+                            ("P", "Pressure"),
+                            ("L", "Level"),
+                            ("A", "Analysis"),
+                            ("C", "Control"),
+                            ("H", "Hand/Manual"),
+                            ("I", "Indicate"),
+                            ("S", "Safety"),
+                            ("X", "Other"),
+                        ],
+                        help_text="Function of the loops created from this template",
+                        max_length=2,
+                    ),
+                ),
+                (
+                    "description",
+                    models.TextField(blank=True, help_text="Template description"),
+                ),
+                (
+                    "template_data",
+                    models.JSONField(
+                        default=dict,
+                        help_text=(
+                            "Loop and member tag definitions. Example: "
+                            "{'loop': {'function_code': 'FIC'}, 'tags': "
+                            "[{'function_code': 'FT', 'instrument_type': 'FT', "
+                            "'service': '...', 'spec_data': {...}}, ...]}"
+                        ),
+                    ),
+                ),
+                (
+                    "is_active",
+                    models.BooleanField(
+                        default=True, help_text="Whether this template is active"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Typical Loop",
+                "verbose_name_plural": "Typical Loops",
+                "ordering": ["name"],
+            },
+        ),
+    ]
@@ -0,0 +1,230 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Tag columns tracked by the history triggers (history.STATE_FIELDS)
+TRACKED_COLUMNS = (
+    "tag_number",
+    "unit_id",
+    "loop_id",
+    "instrument_type_id",
+    "service",
+    "description",
+    "status",
+    "revision",
+)
+
+# Field-level delta between two tag rows (NULL for a missing row):
+# {column: [old, new]} for changed columns, and for spec_data the keys whose
+# value changed, as {"-": {key: old value}, "+": {key: new value}}. Columns
+# are compared one by one; spec_data is only expanded when it changed.
+TAG_DELTA_SQL = """
+CREATE OR REPLACE FUNCTION core_engineering_tag_delta(
+    o core_engineering_tag, n core_engineering_tag
+)
+RETURNS jsonb LANGUAGE sql IMMUTABLE AS $$
+    SELECT jsonb_strip_nulls(jsonb_build_object(
+%s
+    ))
+    || CASE
+        WHEN COALESCE(o.spec_data, '{}') = COALESCE(n.spec_data, '{}') THEN '{}'::jsonb
+        ELSE jsonb_build_object('spec_data', jsonb_build_object(
+            '-', COALESCE((
+                SELECT jsonb_object_agg(s.key, s.value)
+                FROM jsonb_each(COALESCE(o.spec_data, '{}')) AS s
+                WHERE (n.spec_data -> s.key) IS DISTINCT FROM s.value
+            ), '{}'::jsonb),
+            '+', COALESCE((
+                SELECT jsonb_object_agg(s.key, s.value)
+                FROM jsonb_each(COALESCE(n.spec_data, '{}')) AS s
+                WHERE (o.spec_data -> s.key) IS DISTINCT FROM s.value
+            ), '{}'::jsonb)
+        ))
+    END
+$$;
+""" % ",\n".join(
+    f"        '{column}', CASE WHEN o.id IS NULL OR n.id IS NULL "
+    f"OR o.{column} IS DISTINCT FROM n.{column} "
+    f"THEN jsonb_build_array(o.{column}, n.{column}) END"
+    for column in TRACKED_COLUMNS
+)
+
+# Statement-level triggers read all affected rows from the transition tables
+# and write their history with one INSERT per statement, so set-based
+# updates, COPY upserts and bulk_create stay set-based. Updates that don't
+# change any tracked column (e.g. only updated_at) aren't recorded. EXECUTE
+# plans each INSERT for the actual number of rows: a plan cached from a
+# one-row save() would nest-loop over the transition tables of a bulk update.
+# txid records the writing transaction for snapshot points (history.py).
+TAG_HISTORY_SQL = """
+CREATE OR REPLACE FUNCTION core_engineering_tag_history()
+RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        EXECUTE $q$
+            INSERT INTO core_engineering_tagrevision
+                (tag_id, tag_number, unit_id, revision, action, changes, changed_at,
+                 txid)
+            SELECT n.id, n.tag_number, n.unit_id, n.revision, 'CREATE',
+                   core_engineering_tag_delta(NULL, n), now(),
+                   pg_current_xact_id()::text::bigint
+            FROM new_rows AS n
+        $q$;
+    ELSIF TG_OP = 'UPDATE' THEN
+        EXECUTE $q$
+            INSERT INTO core_engineering_tagrevision
+                (tag_id, tag_number, unit_id, revision, action, changes, changed_at,
+                 txid)
+            SELECT n.id, n.tag_number, n.unit_id, n.revision, 'UPDATE', d.changes,
+                   now(), pg_current_xact_id()::text::bigint
+            FROM old_rows AS o
+            JOIN new_rows AS n ON n.id = o.id
+            CROSS JOIN LATERAL core_engineering_tag_delta(o, n) AS d(changes)
+            WHERE d.changes <> '{}'::jsonb
+        $q$;
+    ELSE
+        EXECUTE $q$
+            INSERT INTO core_engineering_tagrevision
+                (tag_id, tag_number, unit_id, revision, action, changes, changed_at,
+                 txid)
+            SELECT o.id, o.tag_number, o.unit_id, o.revision, 'DELETE',
+                   core_engineering_tag_delta(o, NULL), now(),
+                   pg_current_xact_id()::text::bigint
+            FROM old_rows AS o
+        $q$;
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER tag_history_insert AFTER INSERT ON core_engineering_tag
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_engineering_tag_history();
+CREATE TRIGGER tag_history_update AFTER UPDATE ON core_engineering_tag
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_engineering_tag_history();
+CREATE TRIGGER tag_history_delete AFTER DELETE ON core_engineering_tag
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION core_engineering_tag_history();
+"""
+
+DROP_TAG_HISTORY_SQL = """
+DROP TRIGGER IF EXISTS tag_history_insert ON core_engineering_tag;
+DROP TRIGGER IF EXISTS tag_history_update ON core_engineering_tag;
+DROP TRIGGER IF EXISTS tag_history_delete ON core_engineering_tag;
+DROP FUNCTION IF EXISTS core_engineering_tag_history();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core_engineering", "0006_typicalloop"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TagRevision",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "tag_number",
+                    models.CharField(
+                        help_text=(
+                            "Tag number after the change (before it, for deletes)"
+                        ),
+                        max_length=50,
+                    ),
+                ),
+                (
+                    "revision",
+                    models.PositiveIntegerField(
+                        help_text="Tag revision after the change"
+                    ),
+                ),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("CREATE", "Create"),
+                            ("UPDATE", "Update"),
+                            ("DELETE", "Delete"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "changes",
+                    models.JSONField(
+                        default=dict,
+                        help_text=(
+                            "Changed columns as [old, new] and spec_data key deltas"
+                        ),
+                    ),
+                ),
+                (
+                    "changed_at",
+                    models.DateTimeField(
+                        help_text="Time of the change (transaction start)"
+                    ),
+                ),
+                (
+                    "txid",
+                    models.BigIntegerField(
+                        help_text="Id of the writing transaction (pg_current_xact_id)"
+                    ),
+                ),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        help_text="Tag that changed",
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="history",
+                        to="core_engineering.tag",
+                    ),
+                ),
+                (
+                    "unit",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        db_index=False,
+                        help_text="Unit after the change (before it, for deletes)",
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="core_engineering.planthierarchy",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Tag Revision",
+                "verbose_name_plural": "Tag Revisions",
+                "ordering": ["-id"],
+                "indexes": [
+                    models.Index(
+                        fields=["tag", "id"], name="core_engine_tag_id_12fe87_idx"
+                    ),
+                    models.Index(
+                        fields=["unit", "id"], name="core_engine_unit_id_5aa9e1_idx"
+                    ),
+                    models.Index(
+                        fields=["changed_at", "id"],
+                        name="core_engine_changed_40e710_idx",
+                    ),
+                    models.Index(fields=["txid"], name="core_engine_txid_0192e8_idx"),
+                ],
+            },
+        ),
+        # Functions and triggers are created in each project schema (the first
+        # schema on the search_path while tenant migrations run).
+        migrations.RunSQL(
+            TAG_DELTA_SQL,
+            reverse_sql=(
+                "DROP FUNCTION IF EXISTS "
+                "core_engineering_tag_delta(core_engineering_tag, core_engineering_tag)"
+            ),
+        ),
+        migrations.RunSQL(TAG_HISTORY_SQL, reverse_sql=DROP_TAG_HISTORY_SQL),
+    ]
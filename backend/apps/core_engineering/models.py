@@ -7,14 +7,20 @@ Data integrity is critical for engineering applications.
 All models in this file are TENANT-SPECIFIC - they are stored in project schemas.
 """
 
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr, Upper
 from django.utils.translation import gettext_lazy as _
 from mptt.models import MPTTModel, TreeForeignKey
-import jsonschema
 
 from apps.core.models import TimeStampedModel
 
+from .naming import get_compiled_convention, invalidate_convention
+from .search import tag_search_vector
+from .validation import get_validator, invalidate_validator, run_validator
+
 
 # =============================================================================
 # Project Hierarchy Models (Tenant-specific)
@@ -207,6 +213,17 @@ class PlantHierarchy(MPTTModel, TimeStampedModel):
         default=True,
         help_text=_("Whether this node is active"),
     )
+    path = models.TextField(
+        blank=True,
+        editable=False,
+        db_index=True,
+        help_text=_(
+            "Materialized hierarchy path of codes (e.g., 'PLANT-001 / A-100 / U-110'). "
+            "Maintained automatically on save."
+        ),
+    )
+
+    PATH_SEPARATOR = " / "
 
     class MPTTMeta:
         order_insertion_by = ["code"]
@@ -253,13 +270,46 @@ class PlantHierarchy(MPTTModel, TimeStampedModel):
 
     def save(self, *args, **kwargs):
         self.full_clean()
+
+        old_path = None
+        if self.pk:
+            old_path = (
+                PlantHierarchy.objects.filter(pk=self.pk)
+                .values_list("path", flat=True)
+                .first()
+            )
+        self.path = self.build_path()
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = {*kwargs["update_fields"], "path"}
+
         super().save(*args, **kwargs)
 
+        # Code rename or move (MPTT's move_to() and TreeManager.move_node() save
+        # the node once its parent is set): rewrite the prefix of every
+        # descendant in one UPDATE
+        if old_path and old_path != self.path:
+            from .refcache import bump_generation_on_commit
+
+            self.get_descendants().update(
+                path=Concat(
+                    Value(self.path),
+                    Substr("path", len(old_path) + 1),
+                    output_field=models.TextField(),
+                )
+            )
+            # queryset.update() sends no signals
+            bump_generation_on_commit(PlantHierarchy)
+
+    def build_path(self):
+        """Compute the materialized path from the parent's stored path."""
+        if self.parent_id:
+            return f"{self.parent.path}{self.PATH_SEPARATOR}{self.code}"
+        return self.code
+
     @property
     def full_path(self):
         """Return the full hierarchy path as a string."""
-        ancestors = self.get_ancestors(include_self=True)
-        return " / ".join([node.code for node in ancestors])
+        return self.path
 
 
 class Loop(TimeStampedModel):
@@ -315,6 +365,13 @@ class Loop(TimeStampedModel):
         verbose_name = _("Loop")
         verbose_name_plural = _("Loops")
         ordering = ["loop_tag"]
+        indexes = [
+            # Trigram index for search (see search.py)
+            GinIndex(
+                OpClass(Upper("loop_tag"), name="gin_trgm_ops"),
+                name="loop_tag_trgm_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.loop_tag
@@ -392,21 +449,27 @@ class InstrumentType(TimeStampedModel):
     def __str__(self):
         return f"{self.code} - {self.name}"
 
-    def validate_spec_data(self, spec_data):
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        invalidate_validator(self.pk)
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        result = super().delete(*args, **kwargs)
+        invalidate_validator(pk)
+        return result
+
+    def validate_spec_data(self, spec_data, all_errors=False):
         """
         Validate spec_data against the schema_template.
+        Uses a per-process cache of compiled validators; with all_errors=True
+        every error is collected instead of only the most relevant one.
         Returns (is_valid, errors).
         """
         if not self.schema_template:
             return True, []
-        
-        try:
-            jsonschema.validate(instance=spec_data, schema=self.schema_template)
-            return True, []
-        except jsonschema.ValidationError as e:
-            return False, [str(e.message)]
-        except jsonschema.SchemaError as e:
-            return False, [f"Invalid schema: {e.message}"]
+
+        return run_validator(get_validator(self), spec_data, all_errors=all_errors)
 
 
 class Tag(TimeStampedModel):
@@ -484,10 +547,46 @@ class Tag(TimeStampedModel):
                 name="unique_tag_per_unit",
             ),
         ]
+        indexes = [
+            # Keyset pagination walks (ordering field, id)
+            models.Index(fields=["tag_number", "id"]),
+            models.Index(fields=["updated_at", "id"]),
+            # Full-text and trigram indexes for search (see search.py)
+            GinIndex(tag_search_vector(), name="tag_search_vector_idx"),
+            GinIndex(
+                OpClass(Upper("tag_number"), name="gin_trgm_ops"),
+                name="tag_number_trgm_idx",
+            ),
+            # Containment / jsonpath filters on spec_data (see filters.py)
+            GinIndex(
+                fields=["spec_data"],
+                opclasses=["jsonb_path_ops"],
+                name="tag_spec_data_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.tag_number
 
+    def clean_fields(self, exclude=None):
+        # Units and instrument types found in the reference data cache exist,
+        # so the queries of ForeignKey.validate() can be skipped once the
+        # cached copy passes the field's limit_choices_to
+        from .refcache import instrument_types, matches_filter, units
+
+        exclude = set(exclude or ())
+        for name, reference in (("unit", units), ("instrument_type", instrument_types)):
+            field = self._meta.get_field(name)
+            instance = reference().get(getattr(self, field.attname))
+            if instance is not None and matches_filter(
+                instance,
+                field.related_model._base_manager.complex_filter(
+                    field.get_limit_choices_to()
+                ),
+            ):
+                exclude.add(name)
+        super().clean_fields(exclude=exclude)
+
     def clean(self):
         """Validate tag data integrity."""
         super().clean()
@@ -533,7 +632,82 @@ class Tag(TimeStampedModel):
     @property
     def full_tag(self):
         """Return the full tag identifier including unit path."""
-        return f"{self.unit.full_path} / {self.tag_number}"
+        return f"{self.unit.path}{PlantHierarchy.PATH_SEPARATOR}{self.tag_number}"
+
+
+class TagRevision(models.Model):
+    """
+    TagRevision - append-only history of tag changes (see history.py).
+
+    Rows are written by statement-level triggers on the tag table, so every
+    write path is captured: Tag.save(), queryset updates, bulk updates and
+    imports. The id is a project-wide "global revision" that orders all
+    changes as they were written; txid is the writing transaction, which
+    places a revision before or after a snapshot in commit order (ids of
+    concurrent transactions interleave). changes holds only what changed, as
+    {column: [old, new]} plus
+    {"spec_data": {"-": {removed or old values}, "+": {added or new values}}}.
+    Tag and unit are kept without foreign key constraints so the history of
+    deleted tags survives.
+    """
+
+    class Action(models.TextChoices):
+        CREATE = "CREATE", _("Create")
+        UPDATE = "UPDATE", _("Update")
+        DELETE = "DELETE", _("Delete")
+
+    id = models.BigAutoField(primary_key=True)
+    tag = models.ForeignKey(
+        Tag,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name="history",
+        help_text=_("Tag that changed"),
+    )
+    tag_number = models.CharField(
+        max_length=50,
+        help_text=_("Tag number after the change (before it, for deletes)"),
+    )
+    unit = models.ForeignKey(
+        PlantHierarchy,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name="+",
+        help_text=_("Unit after the change (before it, for deletes)"),
+    )
+    revision = models.PositiveIntegerField(
+        help_text=_("Tag revision after the change"),
+    )
+    action = models.CharField(
+        max_length=10,
+        choices=Action.choices,
+    )
+    changes = models.JSONField(
+        default=dict,
+        help_text=_("Changed columns as [old, new] and spec_data key deltas"),
+    )
+    changed_at = models.DateTimeField(
+        help_text=_("Time of the change (transaction start)"),
+    )
+    txid = models.BigIntegerField(
+        help_text=_("Id of the writing transaction (pg_current_xact_id)"),
+    )
+
+    class Meta:
+        verbose_name = _("Tag Revision")
+        verbose_name_plural = _("Tag Revisions")
+        ordering = ["-id"]
+        indexes = [
+            models.Index(fields=["tag", "id"]),
+            models.Index(fields=["unit", "id"]),
+            models.Index(fields=["changed_at", "id"]),
+            models.Index(fields=["txid"]),
+        ]
+
+    def __str__(self):
+        return f"{self.tag_number} rev {self.revision} ({self.action})"
 
 
 # =============================================================================
@@ -607,15 +781,24 @@ class NamingConvention(TimeStampedModel):
     
     def validate_tag_number(self, tag_number: str) -> tuple[bool, str]:
         """Validate a tag number against this convention."""
-        import re
-        try:
-            pattern = re.compile(self.regex_pattern)
-            if pattern.match(tag_number):
-                return True, ""
-            else:
-                return False, f"Tag number '{tag_number}' does not match pattern: {self.regex_pattern}"
-        except re.error as e:
-            return False, f"Invalid regex pattern: {e}"
+        compiled = get_compiled_convention(self)
+        if compiled.error:
+            return False, f"Invalid regex pattern: {compiled.error}"
+        if compiled.match(tag_number):
+            return True, ""
+        return False, f"Tag number '{tag_number}' does not match pattern: {self.regex_pattern}"
+    
+    def validate_many(self, tag_numbers: list[str]) -> list[dict]:
+        """
+        Validate many tag numbers with the compiled pattern.
+        Returns one {"tag_number", "valid", "segments"} dict per tag number,
+        with segment values parsed according to segment_definitions.
+        """
+        return get_compiled_convention(self).validate_many(tag_numbers)
+    
+    def parse_tag_number(self, tag_number: str) -> dict | None:
+        """Split a tag number into its segment values (None if it doesn't parse)."""
+        return get_compiled_convention(self).parse(tag_number)
     
     def save(self, *args, **kwargs):
         # Ensure only one default convention
@@ -624,3 +807,64 @@ class NamingConvention(TimeStampedModel):
                 is_default=True
             ).exclude(pk=self.pk).update(is_default=False)
         super().save(*args, **kwargs)
+        invalidate_convention(self.pk)
+
+
+# =============================================================================
+# Typical Loops (Tenant-specific)
+# =============================================================================
+
+class TypicalLoop(TimeStampedModel):
+    """
+    TypicalLoop - template of a standard loop and its member tags
+    (e.g. FE, FT, FIC, FV for a flow control loop), instantiated in bulk
+    across units (see typicals.py).
+    """
+
+    name = models.CharField(
+        max_length=200,
+        unique=True,
+        help_text=_("Template name (e.g., 'Standard flow control loop')"),
+    )
+    function = models.CharField(
+        max_length=2,
+        choices=Loop.Function.choices,
+        help_text=_("Function of the loops created from this template"),
+    )
+    description = models.TextField(
+        blank=True,
+        help_text=_("Template description"),
+    )
+    template_data = models.JSONField(
+        default=dict,
+        help_text=_(
+            "Loop and member tag definitions. Example: "
+            "{'loop': {'function_code': 'FIC'}, 'tags': [{'function_code': 'FT', "
+            "'instrument_type': 'FT', 'service': '...', 'spec_data': {...}}, ...]}"
+        ),
+    )
+    is_active = models.BooleanField(
+        default=True,
+        help_text=_("Whether this template is active"),
+    )
+
+    class Meta:
+        verbose_name = _("Typical Loop")
+        verbose_name_plural = _("Typical Loops")
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        """Validate the template structure, instrument types and spec_data."""
+        super().clean()
+        from .typicals import template_errors
+
+        errors = template_errors(self.template_data)
+        if errors:
+            raise ValidationError({"template_data": errors})
+
+    def save(self, *args, **kwargs):
+        self.full_clean()
+        super().save(*args, **kwargs)
@@ -0,0 +1,231 @@
+"""
+Naming Convention Engine - compiled tag number patterns for NamingConvention.
+
+Compiled patterns are kept in a per-process registry keyed by tenant schema
+and convention id. Each entry remembers the convention's updated_at, so an
+edited convention is recompiled on its next use without explicit
+invalidation across worker processes.
+"""
+
+import re
+
+from django.db import connection
+
+# (schema_name, convention_id) -> (updated_at, CompiledConvention)
+_registry = {}
+
+# Segments of the predefined hierarchy formats, used to build tag numbers
+# when a convention has no segment_definitions
+HIERARCHY_FORMAT_SEGMENTS = {
+    "FULL": ("site", "plant", "area", "unit", "function", "sequence"),
+    "NO_SITE": ("plant", "area", "unit", "function", "sequence"),
+    "NO_SITE_PLANT": ("area", "unit", "function", "sequence"),
+    "UNIT_ONLY": ("unit", "function", "sequence"),
+    "FLEXIBLE_PREFIX": ("prefix", "unit", "function", "sequence"),
+}
+
+DEFAULT_SEQUENCE_PADDING = 3
+
+
+def _segment_list(segment_definitions):
+    """
+    Normalize segment_definitions to an ordered list of segment dicts.
+    Accepts a plain list or a {"segments": [...]} document.
+    """
+    if isinstance(segment_definitions, dict):
+        segments = segment_definitions.get("segments") or []
+    else:
+        segments = segment_definitions or []
+    segments = [segment for segment in segments if isinstance(segment, dict)]
+    return sorted(segments, key=lambda segment: segment.get("position", 0))
+
+
+class CompiledConvention:
+    """
+    A NamingConvention compiled for fast, repeated matching.
+
+    Segment values are extracted from named groups in regex_pattern when
+    present. Otherwise, if every segment definition carries its own
+    "pattern", a parsing regex is assembled from the segments joined by the
+    separator. As a last resort, unnamed capture groups are mapped to
+    segment names by position.
+    """
+
+    def __init__(self, regex_pattern, segment_definitions=None, hierarchy_format=None):
+        self.regex_pattern = regex_pattern
+        self.error = None
+        self.pattern = None
+        self.segment_pattern = None
+        self.segment_names = []
+
+        flags = 0
+        if isinstance(segment_definitions, dict):
+            separator = segment_definitions.get("separator", "-")
+            if segment_definitions.get("case_sensitive") is False:
+                flags = re.IGNORECASE
+        else:
+            separator = "-"
+        self.separator = separator
+
+        # Segments used to build tag numbers (see format)
+        self.format_segments = [
+            segment
+            for segment in _segment_list(segment_definitions)
+            if segment.get("name")
+        ] or [
+            {
+                "name": name,
+                "type": name if name in ("function", "sequence") else "hierarchy",
+            }
+            for name in HIERARCHY_FORMAT_SEGMENTS.get(hierarchy_format, ())
+        ]
+
+        try:
+            self.pattern = re.compile(regex_pattern, flags)
+        except re.error as e:
+            self.error = str(e)
+            return
+
+        segments = _segment_list(segment_definitions)
+        self.segment_names = [segment.get("name") for segment in segments]
+
+        if self.pattern.groupindex:
+            self.segment_pattern = self.pattern
+        elif segments and all(
+            segment.get("name") and segment.get("pattern") for segment in segments
+        ):
+            parts = [
+                f"(?P<{segment['name']}>{segment['pattern']})" for segment in segments
+            ]
+            try:
+                self.segment_pattern = re.compile(
+                    "^" + re.escape(separator).join(parts) + "$", flags
+                )
+            except re.error:
+                self.segment_pattern = None
+        elif segments and self.pattern.groups == len(segments):
+            self.segment_pattern = self.pattern
+
+    def match(self, tag_number):
+        """Return True if the tag number matches the convention."""
+        return self.pattern is not None and self.pattern.match(tag_number) is not None
+
+    def parse(self, tag_number):
+        """Return segment values for a tag number, or None if they can't be parsed."""
+        if self.segment_pattern is None:
+            return None
+        match = self.segment_pattern.match(tag_number)
+        if match is None:
+            return None
+        if self.segment_pattern.groupindex:
+            return match.groupdict()
+        return dict(zip(self.segment_names, match.groups()))
+
+    def format(self, values):
+        """
+        Build a tag number from segment values, e.g.
+        {"unit": "U01", "function": "FT", "sequence": 1} -> "U01-FT-001".
+
+        Segments are joined with the separator in position order. Sequence
+        values are zero-padded ("padding", default 3) and "case" is applied.
+        Optional segments without a value are left out. Raises ValueError
+        when a required segment has no value or no segments are defined.
+        The result is not checked against regex_pattern.
+        """
+        if not self.format_segments:
+            raise ValueError(
+                "The convention defines no segments to build tag numbers from."
+            )
+
+        parts = []
+        for segment in self.format_segments:
+            name = segment["name"]
+            value = values.get(name)
+            if value is None or value == "":
+                if segment.get("required", True):
+                    raise ValueError(f"No value for segment '{name}'.")
+                continue
+            if isinstance(value, int) and not isinstance(value, bool):
+                padding = segment.get("padding", DEFAULT_SEQUENCE_PADDING)
+                value = str(value).zfill(padding if isinstance(padding, int) else 0)
+            value = str(value)
+            if segment.get("case") == "upper":
+                value = value.upper()
+            elif segment.get("case") == "lower":
+                value = value.lower()
+            parts.append(value)
+        return self.separator.join(parts)
+
+    def validate_many(self, tag_numbers):
+        """
+        Validate a list of tag numbers.
+        Returns one {"tag_number", "valid", "segments"} dict per input, in order.
+        """
+        if self.error:
+            return [
+                {"tag_number": tag_number, "valid": False, "segments": None}
+                for tag_number in tag_numbers
+            ]
+
+        match = self.pattern.match
+        parse = self.parse
+        # When the main pattern carries the segment groups, reuse its match
+        reuse_match = self.segment_pattern is self.pattern
+        named = bool(self.pattern.groupindex)
+        names = self.segment_names
+
+        results = []
+        for tag_number in tag_numbers:
+            matched = match(tag_number)
+            if matched is None:
+                segments = None
+            elif not reuse_match:
+                segments = parse(tag_number)
+            elif named:
+                segments = matched.groupdict()
+            else:
+                segments = dict(zip(names, matched.groups()))
+            results.append(
+                {
+                    "tag_number": tag_number,
+                    "valid": matched is not None,
+                    "segments": segments,
+                }
+            )
+        return results
+
+
+def get_compiled_convention(convention):
+    """
+    Return the CompiledConvention for a NamingConvention.
+    Unsaved conventions are compiled but not registered.
+    """
+    if convention.pk is None:
+        return CompiledConvention(
+            convention.regex_pattern,
+            convention.segment_definitions,
+            convention.hierarchy_format,
+        )
+
+    key = (getattr(connection, "schema_name", None), convention.pk)
+    cached = _registry.get(key)
+    if cached is not None and cached[0] == convention.updated_at:
+        return cached[1]
+
+    compiled = CompiledConvention(
+        convention.regex_pattern,
+        convention.segment_definitions,
+        convention.hierarchy_format,
+    )
+    _registry[key] = (convention.updated_at, compiled)
+    return compiled
+
+
+def invalidate_convention(convention_id):
+    """Drop the compiled pattern of a convention in the current tenant."""
+    _registry.pop((getattr(connection, "schema_name", None), convention_id), None)
+
+
+def clear_convention_registry():
+    """Drop all compiled patterns."""
+    _registry.clear()
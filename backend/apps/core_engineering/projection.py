@@ -0,0 +1,299 @@
+"""
+Response Projection - sparse fieldsets for engineering endpoints.
+
+List and detail endpoints accept:
+- ?fields=id,tag_number,spec_data.range_min   return only these fields
+- ?exclude=spec_data,full_tag                  return everything else
+- ?expand=unit,instrument_type                 nest related objects
+
+The queryset is narrowed to match: only the columns the kept fields read
+are loaded (.only()), select_related is trimmed to the relations they use,
+and single spec_data keys are extracted by PostgreSQL instead of loading
+whole JSON documents.
+
+Serializers opt in with SparseFieldsetSerializerMixin and describe what
+can't be derived from field sources in their Meta:
+- projection_dependencies: field name -> lookups it reads (properties,
+  method fields); an empty list means the viewset annotates it
+- projected_json_fields: JSON fields whose keys can be selected with "."
+- expandable_fields: field name -> serializer class used by ?expand=
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.fields.json import KeyTransform
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import serializers
+
+JSON_KEY_SEPARATOR = "."
+
+PROJECTION_PARAMETERS = [
+    OpenApiParameter(
+        name="fields",
+        description=(
+            "Comma separated fields to return (spec_data.<key> selects single keys)"
+        ),
+        required=False,
+        type=str,
+    ),
+    OpenApiParameter(
+        name="exclude",
+        description="Comma separated fields to leave out",
+        required=False,
+        type=str,
+    ),
+    OpenApiParameter(
+        name="expand",
+        description="Comma separated related fields to return as nested objects",
+        required=False,
+        type=str,
+    ),
+]
+
+
+def parse_field_list(value):
+    """Split a comma separated query parameter; None when absent."""
+    if value is None:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _resolve_lookup(model, lookup):
+    """
+    Resolve a lookup path against model fields.
+    Returns (only_lookup, relations) or None if it isn't a chain of model
+    fields (e.g. a property or a reverse relation).
+    """
+    parts = lookup.split("__")
+    relations = []
+    for index, part in enumerate(parts):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete:
+            return None
+        if index == len(parts) - 1:
+            return lookup, relations
+        if not field.is_relation or field.many_to_many:
+            return None
+        relations.append("__".join(parts[: index + 1]))
+        model = field.related_model
+    return lookup, relations
+
+
+class ProjectedJSONField(serializers.Field):
+    """Read-only JSON object holding only the selected keys of a JSON field."""
+
+    def __init__(self, json_field, aliases, **kwargs):
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+        self.json_field = json_field
+        self.aliases = aliases
+
+    def to_representation(self, obj):
+        data = None
+        result = {}
+        for key, alias in self.aliases.items():
+            if hasattr(obj, alias):
+                result[key] = getattr(obj, alias)
+            else:
+                # Not annotated (e.g. a freshly saved instance)
+                if data is None:
+                    data = getattr(obj, self.json_field) or {}
+                result[key] = data.get(key)
+        return result
+
+
+class Projection:
+    """
+    The fields requested for one serializer, and how to load them.
+    Raises serializers.ValidationError for unknown field names.
+    """
+
+    def __init__(self, serializer_class, fields=None, exclude=None, expand=None):
+        meta = serializer_class.Meta
+        self.serializer_fields = serializer_class().fields
+        self.dependencies = getattr(meta, "projection_dependencies", {})
+        json_fields = getattr(meta, "projected_json_fields", ())
+        expandable = getattr(meta, "expandable_fields", {})
+
+        self.field_names = []
+        self.json_keys = {}
+        errors = []
+
+        if fields is None:
+            self.field_names = list(self.serializer_fields)
+        else:
+            for name in fields:
+                base, _, key = name.partition(JSON_KEY_SEPARATOR)
+                if key and base in json_fields and base in self.serializer_fields:
+                    self.json_keys.setdefault(base, [])
+                    if key not in self.json_keys[base]:
+                        self.json_keys[base].append(key)
+                elif name in self.serializer_fields:
+                    if name not in self.field_names:
+                        self.field_names.append(name)
+                else:
+                    errors.append(f"Unknown field '{name}'.")
+
+        for name in exclude or []:
+            if name not in self.serializer_fields:
+                errors.append(f"Unknown field '{name}'.")
+            elif name in self.field_names:
+                self.field_names.remove(name)
+
+        self.expand = []
+        for name in expand or []:
+            if name not in expandable:
+                errors.append(f"Field '{name}' can't be expanded.")
+            elif name not in self.expand:
+                self.expand.append(name)
+                if name not in self.field_names:
+                    self.field_names.append(name)
+        self.expandable = expandable
+
+        if errors:
+            raise serializers.ValidationError({"fields": errors})
+
+        # A whole JSON field wins over single keys of it
+        for name in list(self.json_keys):
+            if name in self.field_names:
+                del self.json_keys[name]
+
+        self.aliases = {
+            name: {key: f"_{name}_{index}" for index, key in enumerate(keys)}
+            for name, keys in self.json_keys.items()
+        }
+
+    def __contains__(self, name):
+        return name in self.field_names or name in self.json_keys
+
+    def shape_fields(self, fields):
+        """Reduce a serializer's fields to the projection (in place)."""
+        keep = set(self.field_names)
+        for name in list(fields):
+            if name not in keep:
+                fields.pop(name)
+        for name in self.expand:
+            fields[name] = self.expandable[name](read_only=True)
+        for name, aliases in self.aliases.items():
+            fields[name] = ProjectedJSONField(name, aliases)
+        return fields
+
+    def apply(self, queryset):
+        """Narrow a queryset to the columns and relations the projection reads."""
+        model = queryset.model
+        annotations = {
+            alias: KeyTransform(key, name)
+            for name, aliases in self.aliases.items()
+            for key, alias in aliases.items()
+        }
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+
+        only = {model._meta.pk.name}
+        relations = set()
+        lookups = []
+        for name in self.field_names:
+            if name in self.expand:
+                # Nested serializers read whole related rows
+                relations.add(name)
+                lookups.append(name)
+                continue
+            if name in self.dependencies:
+                lookups.extend(self.dependencies[name])
+                continue
+            source = self.serializer_fields[name].source
+            if source == "*":
+                # A method field without declared dependencies: load everything
+                return queryset
+            lookups.append(source.replace(".", "__"))
+
+        # Keyset pagination reads the ordering values from each row
+        for field in queryset.query.order_by or model._meta.ordering:
+            if isinstance(field, str) and field != "?":
+                lookups.append(field.lstrip("-"))
+
+        for lookup in lookups:
+            if lookup == "pk":
+                continue
+            resolved = _resolve_lookup(model, lookup)
+            if resolved is None:
+                return queryset
+            only_lookup, lookup_relations = resolved
+            relations.update(lookup_relations)
+            only.add(only_lookup)
+
+        # Expanded relations are loaded in full, so list just their FK in only()
+        only = {
+            lookup
+            for lookup in only
+            if not any(lookup.startswith(f"{name}__") for name in self.expand)
+        }
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*sorted(relations))
+        return queryset.only(*sorted(only))
+
+
+class SparseFieldsetSerializerMixin:
+    """Serializer mixin accepting a Projection through the 'projection' kwarg."""
+
+    def __init__(self, *args, projection=None, **kwargs):
+        self.projection = projection
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.projection is not None:
+            fields = self.projection.shape_fields(fields)
+        return fields
+
+
+class SparseFieldsetMixin:
+    """
+    ViewSet mixin applying ?fields= / ?exclude= / ?expand= to the list and
+    retrieve actions, both to the serializer and to the queryset.
+    """
+
+    projection_actions = ("list", "retrieve")
+
+    def projection_requested(self):
+        params = self.request.query_params
+        return self.action in self.projection_actions and any(
+            name in params for name in ("fields", "exclude", "expand")
+        )
+
+    def get_projection(self):
+        if not hasattr(self, "_projection"):
+            self._projection = None
+            if self.projection_requested():
+                params = self.request.query_params
+                self._projection = Projection(
+                    self.get_serializer_class(),
+                    fields=parse_field_list(params.get("fields")),
+                    exclude=parse_field_list(params.get("exclude")),
+                    expand=parse_field_list(params.get("expand")),
+                )
+        return self._projection
+
+    def wants_field(self, name):
+        """Whether a serializer field will be rendered for this request."""
+        projection = self.get_projection()
+        if projection is None:
+            return name in self.get_serializer_class().Meta.fields
+        return name in projection
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        projection = self.get_projection()
+        if projection is not None:
+            queryset = projection.apply(queryset)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        projection = self.get_projection()
+        if projection is not None:
+            kwargs.setdefault("projection", projection)
+        return super().get_serializer(*args, **kwargs)
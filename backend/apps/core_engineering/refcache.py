@@ -0,0 +1,320 @@
+"""
+Reference Data Cache - read-through cache for rarely changing tenant tables.
+
+Instrument types, naming conventions and the UNIT nodes of the plant
+hierarchy are read on nearly every tag operation but change rarely. Reads
+go through:
+
+1. An in-process dict - no network or database round trip.
+2. The shared Django cache (Redis) - shared between processes.
+3. The tenant schema tables, loaded once per change.
+
+Entries are keyed by tenant schema and a generation counter per table
+(stored in Redis), which signals.py bumps when a row of the table is saved
+or deleted. A bump makes every cached set of the table unreachable at once,
+in every process, without deleting keys; old generations expire with
+REFCACHE_TTL. The in-process tier re-reads a table's generation at most
+every REFCACHE_LOCAL_TTL seconds, which bounds how long another process
+can serve a superseded set (the process making the change sees it at once).
+
+On a miss only one loader runs: threads of a process wait on a lock, and
+processes race for a short-lived Redis lock, the losers polling for the
+winner's result (up to REFCACHE_LOCK_TIMEOUT) instead of all querying the
+database at once. If the cache is unreachable, sets are loaded from the
+database uncached.
+
+The generations also version the tenant's read endpoints:
+change_generations() reads them (with the time of the last bump) straight
+from Redis for the ETag / Last-Modified validators of conditional.py, so
+signals.py bumps the tag and loop tables as well.
+
+Writes that bypass model signals (queryset.update(), bulk_create(), raw
+SQL) must call bump_generation() themselves.
+"""
+
+import copy
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.expressions import Col
+from django.db.models.lookups import Exact
+from django.db.models.sql.where import AND
+
+from .models import InstrumentType, NamingConvention, PlantHierarchy
+
+logger = logging.getLogger(__name__)
+
+# Poll interval while another process loads a set, seconds
+LOCK_POLL_INTERVAL = 0.05
+
+# (schema, table) -> (checked at, generation)
+_generations = {}
+# (schema, set name) -> (generation, value)
+_local = {}
+# (schema, set name) -> threading.Lock serializing loads within the process
+_load_locks = {}
+_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _schema():
+    return getattr(connection, "schema_name", None)
+
+
+def _generation_key(schema, table):
+    return f"refcache:{schema}:{table}:generation"
+
+
+def _changed_at_key(schema, table):
+    return f"refcache:{schema}:{table}:changed_at"
+
+
+def _value_key(schema, name, generation):
+    return f"refcache:{schema}:{name}:{generation}"
+
+
+# =============================================================================
+# Generations
+# =============================================================================
+
+def _init_generation(schema, table):
+    """(generation, changed at) of a table without a counter in Redis yet."""
+    # Start from the clock, so a lost counter never revives old sets
+    keys = (_generation_key(schema, table), _changed_at_key(schema, table))
+    cache.add(keys[0], time.time_ns(), None)
+    cache.add(keys[1], time.time(), None)
+    values = cache.get_many(keys)
+    return values.get(keys[0]), values.get(keys[1])
+
+
+def _generation(schema, table):
+    """Current generation of a table, re-read from Redis every REFCACHE_LOCAL_TTL."""
+    now = time.monotonic()
+    with _lock:
+        entry = _generations.get((schema, table))
+    if entry is not None and now - entry[0] < _setting("REFCACHE_LOCAL_TTL", 1):
+        return entry[1]
+
+    generation = cache.get(_generation_key(schema, table))
+    if generation is None:
+        generation = _init_generation(schema, table)[0]
+    with _lock:
+        _generations[(schema, table)] = (now, generation)
+    return generation
+
+
+def bump_generation(model, schema=None):
+    """Invalidate every cached set of a model's table in a tenant schema."""
+    schema = schema or _schema()
+    table = model._meta.db_table
+    key = _generation_key(schema, table)
+    try:
+        try:
+            generation = cache.incr(key)
+        except ValueError:
+            generation = time.time_ns()
+            cache.set(key, generation, None)
+        cache.set(_changed_at_key(schema, table), time.time(), None)
+    except Exception:
+        logger.warning("Reference cache invalidation failed", exc_info=True)
+        generation = None
+    with _lock:
+        if generation is None:
+            _generations.pop((schema, table), None)
+        else:
+            _generations[(schema, table)] = (time.monotonic(), generation)
+
+
+def bump_generation_on_commit(model):
+    """bump_generation() once the current transaction commits."""
+    schema = _schema()
+    transaction.on_commit(lambda: bump_generation(model, schema))
+
+
+def change_generations(models, schema=None):
+    """
+    {model: (generation, changed at)} for the tables of models in a tenant
+    schema, read from Redis on every call: unlike the in-process tier, the
+    result never lags behind a change made by another process. changed_at
+    is a Unix timestamp. Raises if the cache is unreachable.
+    """
+    schema = schema or _schema()
+    keys = {
+        model: (_generation_key(schema, model._meta.db_table),
+                _changed_at_key(schema, model._meta.db_table))
+        for model in models
+    }
+    values = cache.get_many([key for pair in keys.values() for key in pair])
+    generations = {}
+    for model, (generation_key, changed_at_key) in keys.items():
+        entry = values.get(generation_key), values.get(changed_at_key)
+        if None in entry:
+            entry = _init_generation(schema, model._meta.db_table)
+        generations[model] = entry
+    return generations
+
+
+# =============================================================================
+# Read-through
+# =============================================================================
+
+def _load(schema, name, generation, loader):
+    """Load a set missing from both tiers; a single process queries the database."""
+    key = _value_key(schema, name, generation)
+    lock_key = f"{key}:lock"
+    lock_timeout = _setting("REFCACHE_LOCK_TIMEOUT", 10)
+    deadline = time.monotonic() + lock_timeout
+    while not cache.add(lock_key, 1, lock_timeout):
+        if time.monotonic() >= deadline:
+            # The loading process is stuck or gone; don't wait any longer
+            return loader()
+        time.sleep(LOCK_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+    try:
+        value = loader()
+        cache.set(key, value, _setting("REFCACHE_TTL", 3600))
+    finally:
+        cache.delete(lock_key)
+    return value
+
+
+def cached(name, model, loader):
+    """
+    Return the set loader() computes from a model's table, cached per tenant
+    schema until the table changes. Values are shared between threads and
+    requests: treat them as read-only.
+    """
+    schema = _schema()
+    table = model._meta.db_table
+    try:
+        generation = _generation(schema, table)
+    except Exception:
+        logger.warning("Reference cache read failed", exc_info=True)
+        return loader()
+
+    with _lock:
+        entry = _local.get((schema, name))
+        if entry is not None and entry[0] == generation:
+            return entry[1]
+        load_lock = _load_locks.setdefault((schema, name), threading.Lock())
+
+    with load_lock:
+        with _lock:
+            entry = _local.get((schema, name))
+        if entry is not None and entry[0] == generation:
+            return entry[1]
+        try:
+            value = cache.get(_value_key(schema, name, generation))
+            if value is None:
+                value = _load(schema, name, generation, loader)
+        except Exception:
+            logger.warning("Reference cache read failed", exc_info=True)
+            return loader()
+        with _lock:
+            _local[(schema, name)] = (generation, value)
+    return value
+
+
+def clear_local_reference_cache():
+    """Empty the in-process tier (e.g. between tests)."""
+    with _lock:
+        _generations.clear()
+        _local.clear()
+
+
+# =============================================================================
+# Reference sets
+# =============================================================================
+
+def instrument_types():
+    """All instrument types as {id: InstrumentType}, ordered by code."""
+    return cached(
+        "instrument_types",
+        InstrumentType,
+        lambda: {item.pk: item for item in InstrumentType.objects.order_by("code")},
+    )
+
+
+def naming_conventions():
+    """
+    Active naming conventions as {id: NamingConvention}, default first, then by
+    name.
+    """
+    return cached(
+        "naming_conventions",
+        NamingConvention,
+        lambda: {
+            item.pk: item
+            for item in NamingConvention.objects.filter(is_active=True).order_by(
+                "-is_default", "name"
+            )
+        },
+    )
+
+
+def units():
+    """All UNIT hierarchy nodes as {id: PlantHierarchy}, in tree order."""
+    return cached(
+        "units",
+        PlantHierarchy,
+        lambda: {
+            item.pk: item
+            for item in PlantHierarchy.objects.filter(
+                node_type=PlantHierarchy.NodeType.UNIT
+            ).order_by("tree_id", "lft")
+        },
+    )
+
+
+def get_reference(reference, pk):
+    """
+    One instance from a reference set (instrument_types, naming_conventions
+    or units) by id, or None. The instance is a copy, safe to modify.
+    """
+    instance = REFERENCE_SETS[reference]().get(pk)
+    return copy.copy(instance) if instance is not None else None
+
+
+def matches_filter(instance, queryset):
+    """
+    Whether a cached instance passes the filter of a queryset (e.g. a
+    serializer field's queryset or a ForeignKey's limit_choices_to), checked
+    without querying. Returns None if the filter is anything but exact
+    comparisons of the model's own columns with constants, ANDed.
+    """
+    query = queryset.query
+    where = query.where
+    if (
+        type(instance) is not queryset.model
+        or where.connector != AND
+        or where.negated
+        or query.is_sliced
+    ):
+        return None
+    for lookup in where.children:
+        if not (
+            isinstance(lookup, Exact)
+            and isinstance(lookup.lhs, Col)
+            and lookup.lhs.alias == query.base_table
+            and isinstance(lookup.rhs, (str, int, float))
+        ):
+            return None
+        if getattr(instance, lookup.lhs.target.attname) != lookup.rhs:
+            return False
+    return True
+
+
+REFERENCE_SETS = {
+    "instrument_types": instrument_types,
+    "naming_conventions": naming_conventions,
+    "units": units,
+}
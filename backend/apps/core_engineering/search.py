@@ -0,0 +1,186 @@
+"""
+Tag Search - ranked full-text and trigram search over instrument tags.
+
+Matching combines:
+- full-text search on tag_number, service and description (weighted A/B/C),
+  served by an expression GIN index so nothing has to be kept in sync on
+  writes (bulk imports and set-based updates included)
+- trigram similarity on UPPER(tag_number) and UPPER(loop_tag), which
+  catches near misses such as "FT101" for "FT-101"
+- prefix matching: a term ending in "*" (e.g. "FT-10*") matches as a
+  full-text prefix and as a LIKE prefix on the tag number
+
+Results are ordered by relevance and carry highlighted snippets. The
+expressions used here must stay identical to the index definitions in
+Tag.Meta / Loop.Meta, or PostgreSQL won't use the indexes.
+"""
+
+import re
+
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.functions import Upper
+
+SEARCH_CONFIG = "simple"
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+DEFAULT_SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 500
+
+# Characters kept in a search term; anything else separates terms
+_TERM_RE = re.compile(r"[\w\-./]+\*?")
+
+
+def tag_search_vector():
+    """The weighted tsvector expression indexed for Tag."""
+    return (
+        SearchVector("tag_number", weight="A", config=SEARCH_CONFIG)
+        + SearchVector("service", weight="B", config=SEARCH_CONFIG)
+        + SearchVector("description", weight="C", config=SEARCH_CONFIG)
+    )
+
+
+def parse_search_terms(text):
+    """
+    Split search text into (term, is_prefix) pairs.
+    A trailing "*" marks a prefix term; other punctuation is dropped.
+    """
+    terms = []
+    for token in _TERM_RE.findall(text or ""):
+        prefix = token.endswith("*")
+        term = token.rstrip("*").strip("-./")
+        if term:
+            terms.append((term, prefix))
+    return terms
+
+
+def build_search_query(terms):
+    """Build a tsquery matching every term (prefix terms with :*)."""
+    lexemes = [f"'{term.lower()}'{':*' if prefix else ''}" for term, prefix in terms]
+    return SearchQuery(" & ".join(lexemes), config=SEARCH_CONFIG, search_type="raw")
+
+
+def search_tags(text, queryset=None, limit=DEFAULT_SEARCH_LIMIT, highlight=True):
+    """
+    Return tags matching text, best match first, at most limit rows.
+
+    Each tag is annotated with rank and, when highlight is set, with
+    tag_number_highlight / service_highlight / description_highlight.
+    """
+    from .models import Loop, Tag
+
+    if queryset is None:
+        queryset = Tag.objects.select_related("unit", "loop", "instrument_type")
+    terms = parse_search_terms(text)
+    if not terms:
+        return queryset.none()
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+
+    query = build_search_query(terms)
+    phrase = " ".join(term for term, _prefix in terms).upper()
+
+    # Tag number prefix / fuzzy matches, served by the trigram index
+    tag_number_match = Q(tag_number_upper__trigram_similar=phrase)
+    for term, prefix in terms:
+        if prefix:
+            tag_number_match |= Q(tag_number__istartswith=term)
+    loop_ids = (
+        Loop.objects.annotate(loop_tag_upper=Upper("loop_tag"))
+        .filter(
+            Q(loop_tag_upper__trigram_similar=phrase) | Q(loop_tag__icontains=phrase)
+        )
+        .values("pk")
+    )
+
+    queryset = (
+        queryset.annotate(
+            search=tag_search_vector(),
+            tag_number_upper=Upper("tag_number"),
+        )
+        .filter(Q(search=query) | tag_number_match | Q(loop_id__in=loop_ids))
+        .annotate(
+            rank=SearchRank(F("search"), query)
+            + TrigramSimilarity("tag_number_upper", phrase)
+            + Case(
+                When(tag_number_upper=phrase, then=Value(1.0)),
+                default=Value(0.0),
+                output_field=FloatField(),
+            )
+        )
+    )
+    if highlight:
+        options = {
+            "config": SEARCH_CONFIG,
+            "start_sel": HIGHLIGHT_START,
+            "stop_sel": HIGHLIGHT_STOP,
+        }
+        # Computed after ORDER BY/LIMIT, so only for the returned rows
+        queryset = queryset.annotate(
+            tag_number_highlight=SearchHeadline("tag_number", query, **options),
+            service_highlight=SearchHeadline("service", query, **options),
+            description_highlight=SearchHeadline(
+                "description", query, max_fragments=2, **options
+            ),
+        )
+    return queryset.order_by("-rank", "tag_number", "pk")[:limit]
+
+
+# =============================================================================
+# Cross-project search
+# =============================================================================
+
+def search_projects(
+    tenants, text, limit=DEFAULT_SEARCH_LIMIT, highlight=True, timeout=None
+):
+    """
+    Search tags in several project schemas concurrently.
+
+    Hits are merged by rank and tagged with their project. Every project is
+    listed with its status (ok / timeout / error); partial is set when any
+    project didn't answer in time, in which case the other projects' hits
+    are still returned.
+    """
+    from apps.tenants.fanout import run_in_schemas
+
+    from .serializers import TagSearchResultSerializer
+
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+
+    def search_schema(tenant):
+        tags = search_tags(text, limit=limit, highlight=highlight)
+        return TagSearchResultSerializer(tags, many=True).data
+
+    results = []
+    projects = []
+    for outcome in run_in_schemas(tenants, search_schema, timeout=timeout):
+        tenant = outcome.tenant
+        project = {
+            "id": tenant.pk,
+            "name": tenant.name,
+            "project_no": tenant.project_no,
+        }
+        hits = outcome.value or []
+        projects.append(
+            {
+                **project,
+                "status": outcome.status,
+                "count": len(hits),
+                "elapsed_ms": outcome.elapsed_ms,
+            }
+        )
+        results.extend({**hit, "project": project} for hit in hits)
+
+    results.sort(
+        key=lambda hit: (-(hit["rank"] or 0), hit["project"]["name"], hit["tag_number"])
+    )
+    return {
+        "partial": any(project["status"] != "ok" for project in projects),
+        "projects": projects,
+        "results": results[:limit],
+    }
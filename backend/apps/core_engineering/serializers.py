@@ -6,14 +6,53 @@ from rest_framework import serializers
 from drf_spectacular.utils import extend_schema_field
 from drf_spectacular.types import OpenApiTypes
 
-from .models import Client, Site, Plant, PlantHierarchy, Loop, InstrumentType, Tag, NamingConvention
+from .models import (
+    Client,
+    Site,
+    Plant,
+    PlantHierarchy,
+    Loop,
+    InstrumentType,
+    Tag,
+    TagRevision,
+    NamingConvention,
+    TypicalLoop,
+)
+from .projection import SparseFieldsetSerializerMixin
+from .refcache import get_reference, matches_filter
+from .search import HIGHLIGHT_START, HIGHLIGHT_STOP
+from .typicals import MAX_INSTANCES, template_errors
+
+
+class ReferencePrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField resolving ids from a reference data cache set
+    (see refcache.py) instead of querying. The cached instance must pass the
+    field's queryset filter; ids missing from the set, or whose filter can't
+    be checked without the database, fall back to the queryset, which
+    produces the usual validation errors.
+    """
+
+    def __init__(self, reference, **kwargs):
+        self.reference = reference
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, bool):
+            try:
+                instance = get_reference(self.reference, int(data))
+            except (TypeError, ValueError):
+                instance = None
+            if instance is not None and matches_filter(instance, self.get_queryset()):
+                return instance
+        return super().to_internal_value(data)
 
 
 # =============================================================================
 # Client, Site, Plant Serializers (Tenant-specific)
 # =============================================================================
 
-class ClientSerializer(serializers.ModelSerializer):
+class ClientSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for Client model (tenant-specific)."""
     
     class Meta:
@@ -25,7 +64,7 @@ class ClientSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at", "updated_at"]
 
 
-class SiteSerializer(serializers.ModelSerializer):
+class SiteSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for Site model (tenant-specific)."""
     
     client_name = serializers.CharField(source="client.name", read_only=True)
@@ -39,7 +78,7 @@ class SiteSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at", "updated_at"]
 
 
-class PlantSerializer(serializers.ModelSerializer):
+class PlantSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for Plant model (tenant-specific)."""
     
     site_name = serializers.CharField(source="site.name", read_only=True)
@@ -54,7 +93,9 @@ class PlantSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at", "updated_at"]
 
 
-class NamingConventionSerializer(serializers.ModelSerializer):
+class NamingConventionSerializer(
+    SparseFieldsetSerializerMixin, serializers.ModelSerializer
+):
     """Serializer for NamingConvention model (tenant-specific)."""
     
     hierarchy_format_display = serializers.CharField(
@@ -69,13 +110,37 @@ class NamingConventionSerializer(serializers.ModelSerializer):
             "is_default", "is_active", "created_at", "updated_at"
         ]
         read_only_fields = ["id", "created_at", "updated_at"]
+        projection_dependencies = {"hierarchy_format_display": ["hierarchy_format"]}
+
+
+class TagNumberBatchSerializer(serializers.Serializer):
+    """Serializer for batch tag number validation against a naming convention."""
+
+    tag_numbers = serializers.ListField(
+        child=serializers.CharField(allow_blank=True, trim_whitespace=False),
+        help_text="Tag numbers to validate",
+    )
+    only_invalid = serializers.BooleanField(
+        default=False,
+        help_text="Return only the tag numbers that fail validation",
+    )
 
 
 # =============================================================================
 # PlantHierarchy Serializers
 # =============================================================================
 
-class PlantHierarchySerializer(serializers.ModelSerializer):
+class PlantHierarchyListSerializer(serializers.ModelSerializer):
+    """Lightweight serializer for PlantHierarchy nodes (expanded references)."""
+
+    class Meta:
+        model = PlantHierarchy
+        fields = ["id", "name", "code", "node_type", "path", "is_active"]
+
+
+class PlantHierarchySerializer(
+    SparseFieldsetSerializerMixin, serializers.ModelSerializer
+):
     """Serializer for PlantHierarchy model."""
 
     parent_name = serializers.CharField(source="parent.name", read_only=True)
@@ -100,16 +165,18 @@ class PlantHierarchySerializer(serializers.ModelSerializer):
             "updated_at",
         ]
         read_only_fields = ["id", "level", "created_at", "updated_at"]
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
         # Make parent not required for root nodes (PLANT type)
-        self.fields['parent'].required = False
-        self.fields['parent'].allow_null = True
+        extra_kwargs = {"parent": {"required": False, "allow_null": True}}
+        projection_dependencies = {"full_path": ["path"], "children_count": []}
+        expandable_fields = {"parent": PlantHierarchyListSerializer}
 
     @extend_schema_field(OpenApiTypes.INT)
     def get_children_count(self, obj):
-        return obj.get_children().count()
+        # Prefer the count annotated by the viewset queryset
+        count = getattr(obj, "children_count", None)
+        if count is None:
+            count = obj.get_children().count()
+        return count
 
 
 class PlantHierarchyTreeSerializer(serializers.ModelSerializer):
@@ -135,7 +202,7 @@ class PlantHierarchyTreeSerializer(serializers.ModelSerializer):
         return PlantHierarchyTreeSerializer(children, many=True).data
 
 
-class LoopSerializer(serializers.ModelSerializer):
+class LoopSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for Loop model."""
 
     unit_name = serializers.CharField(source="unit.name", read_only=True)
@@ -159,10 +226,16 @@ class LoopSerializer(serializers.ModelSerializer):
             "updated_at",
         ]
         read_only_fields = ["id", "created_at", "updated_at"]
+        projection_dependencies = {"tags_count": []}
+        expandable_fields = {"unit": PlantHierarchyListSerializer}
 
     @extend_schema_field(OpenApiTypes.INT)
     def get_tags_count(self, obj):
-        return obj.tags.count()
+        # Prefer the count annotated by the viewset queryset
+        count = getattr(obj, "tags_count", None)
+        if count is None:
+            count = obj.tags.count()
+        return count
 
     def validate_unit(self, value):
         """Ensure unit is of type UNIT."""
@@ -173,7 +246,17 @@ class LoopSerializer(serializers.ModelSerializer):
         return value
 
 
-class InstrumentTypeSerializer(serializers.ModelSerializer):
+class LoopListSerializer(serializers.ModelSerializer):
+    """Lightweight serializer for Loop references."""
+
+    class Meta:
+        model = Loop
+        fields = ["id", "loop_tag", "function", "suffix", "description", "is_active"]
+
+
+class InstrumentTypeSerializer(
+    SparseFieldsetSerializerMixin, serializers.ModelSerializer
+):
     """Serializer for InstrumentType model."""
 
     tags_count = serializers.SerializerMethodField()
@@ -194,13 +277,37 @@ class InstrumentTypeSerializer(serializers.ModelSerializer):
             "updated_at",
         ]
         read_only_fields = ["id", "created_at", "updated_at"]
+        projection_dependencies = {"tags_count": []}
 
     @extend_schema_field(OpenApiTypes.INT)
     def get_tags_count(self, obj):
-        return obj.tags.count()
+        # Prefer the count annotated by the viewset queryset
+        count = getattr(obj, "tags_count", None)
+        if count is None:
+            count = obj.tags.count()
+        return count
+
+
+class SpecValidationBatchSerializer(serializers.Serializer):
+    """Serializer for batch spec_data validation requests."""
+
+    rows = serializers.ListField(
+        child=serializers.JSONField(),
+        allow_empty=True,
+        help_text=(
+            "Rows to validate: "
+            "[{'instrument_type': <id or code>, 'spec_data': {...}}, ...]"
+        ),
+    )
+    all_errors = serializers.BooleanField(
+        default=False,
+        help_text="Report every validation error per row instead of the first",
+    )
 
 
-class InstrumentTypeListSerializer(serializers.ModelSerializer):
+class InstrumentTypeListSerializer(
+    SparseFieldsetSerializerMixin, serializers.ModelSerializer
+):
     """Lightweight serializer for InstrumentType listing."""
 
     class Meta:
@@ -208,9 +315,19 @@ class InstrumentTypeListSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "code", "category", "is_active"]
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Serializer for Tag model."""
 
+    unit = ReferencePrimaryKeyRelatedField(
+        "units",
+        queryset=PlantHierarchy.objects.filter(node_type=PlantHierarchy.NodeType.UNIT),
+        help_text="Unit this tag belongs to (required)",
+    )
+    instrument_type = ReferencePrimaryKeyRelatedField(
+        "instrument_types",
+        queryset=InstrumentType.objects.all(),
+        help_text="Type of instrument",
+    )
     unit_name = serializers.CharField(source="unit.name", read_only=True)
     unit_code = serializers.CharField(source="unit.code", read_only=True)
     loop_tag = serializers.CharField(source="loop.loop_tag", read_only=True)
@@ -245,6 +362,13 @@ class TagSerializer(serializers.ModelSerializer):
             "updated_at",
         ]
         read_only_fields = ["id", "revision", "created_at", "updated_at"]
+        projection_dependencies = {"full_tag": ["tag_number", "unit__path"]}
+        projected_json_fields = ["spec_data"]
+        expandable_fields = {
+            "unit": PlantHierarchyListSerializer,
+            "loop": LoopListSerializer,
+            "instrument_type": InstrumentTypeListSerializer,
+        }
 
     def validate_unit(self, value):
         """Ensure unit is of type UNIT."""
@@ -284,7 +408,7 @@ class TagSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class TagListSerializer(serializers.ModelSerializer):
+class TagListSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     """Lightweight serializer for Tag listing (grid view)."""
 
     unit_code = serializers.CharField(source="unit.code", read_only=True)
@@ -307,11 +431,47 @@ class TagListSerializer(serializers.ModelSerializer):
         ]
 
 
+class TagSearchResultSerializer(TagListSerializer):
+    """Tag search hit with relevance rank and highlighted snippets."""
+
+    rank = serializers.FloatField(read_only=True, allow_null=True)
+    highlights = serializers.SerializerMethodField()
+
+    class Meta(TagListSerializer.Meta):
+        fields = TagListSerializer.Meta.fields + ["rank", "highlights"]
+
+    @extend_schema_field(serializers.DictField(child=serializers.CharField()))
+    def get_highlights(self, obj):
+        # Only fields where the query actually matched
+        highlights = {}
+        for field in ("tag_number", "service", "description"):
+            snippet = getattr(obj, f"{field}_highlight", None)
+            if snippet and HIGHLIGHT_START in snippet:
+                # "FT-101" is indexed as two tokens; join their marks
+                highlights[field] = snippet.replace(
+                    HIGHLIGHT_STOP + HIGHLIGHT_START, ""
+                )
+        return highlights
+
+
+class TagRevisionSerializer(serializers.ModelSerializer):
+    """Serializer for TagRevision history rows."""
+
+    class Meta:
+        model = TagRevision
+        fields = [
+            "id", "tag", "tag_number", "unit", "revision",
+            "action", "changes", "changed_at",
+        ]
+        read_only_fields = fields
+
+
 class TagBulkUpdateSerializer(serializers.Serializer):
     """Serializer for bulk updating tags."""
 
     ids = serializers.ListField(
         child=serializers.IntegerField(),
+        allow_empty=False,
         help_text="List of tag IDs to update",
     )
     status = serializers.ChoiceField(
@@ -325,3 +485,99 @@ class TagBulkUpdateSerializer(serializers.Serializer):
         allow_null=True,
         help_text="New loop for all selected tags",
     )
+    unit = ReferencePrimaryKeyRelatedField(
+        "units",
+        queryset=PlantHierarchy.objects.filter(node_type=PlantHierarchy.NodeType.UNIT),
+        required=False,
+        help_text="New unit for all selected tags",
+    )
+    instrument_type = ReferencePrimaryKeyRelatedField(
+        "instrument_types",
+        queryset=InstrumentType.objects.all(),
+        required=False,
+        help_text="New instrument type for all selected tags",
+    )
+    service = serializers.CharField(
+        max_length=500,
+        required=False,
+        allow_blank=True,
+        help_text="New service description for all selected tags",
+    )
+    description = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="New description for all selected tags",
+    )
+    spec_data = serializers.DictField(
+        required=False,
+        help_text=(
+            "JSON Merge Patch applied to spec_data of all selected tags "
+            "(null removes a key)"
+        ),
+    )
+
+
+class TypicalLoopSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
+    """Serializer for TypicalLoop templates."""
+
+    class Meta:
+        model = TypicalLoop
+        fields = [
+            "id",
+            "name",
+            "function",
+            "description",
+            "template_data",
+            "is_active",
+            "created_at",
+            "updated_at",
+        ]
+        read_only_fields = ["id", "created_at", "updated_at"]
+        projected_json_fields = ["template_data"]
+
+    def validate_template_data(self, value):
+        """Check the loop/tag structure, instrument types and spec_data."""
+        errors = template_errors(value)
+        if errors:
+            raise serializers.ValidationError(errors)
+        return value
+
+
+class TypicalLoopInstantiateSerializer(serializers.Serializer):
+    """Serializer for creating loops from a typical."""
+
+    units = ReferencePrimaryKeyRelatedField(
+        "units",
+        queryset=PlantHierarchy.objects.filter(node_type=PlantHierarchy.NodeType.UNIT),
+        many=True,
+        allow_empty=False,
+        help_text="Units to create the loops in",
+    )
+    count = serializers.IntegerField(
+        min_value=1,
+        max_value=MAX_INSTANCES,
+        default=1,
+        help_text="Number of loops to create per unit",
+    )
+    start_sequence = serializers.IntegerField(
+        min_value=0,
+        required=False,
+        help_text="First sequence number (default: after the highest one in use)",
+    )
+    naming_convention = ReferencePrimaryKeyRelatedField(
+        "naming_conventions",
+        queryset=NamingConvention.objects.filter(is_active=True),
+        required=False,
+        help_text="Naming convention (default: the active default convention)",
+    )
+    segment_values = serializers.DictField(
+        child=serializers.CharField(),
+        required=False,
+        help_text=(
+            "Values for segments not taken from the hierarchy (e.g. site, prefix)"
+        ),
+    )
+    dry_run = serializers.BooleanField(
+        default=False,
+        help_text="Only report the loop tags and tag numbers that would be created",
+    )
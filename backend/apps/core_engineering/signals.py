@@ -0,0 +1,48 @@
+"""
+Core Engineering Signals - bump table generations on model changes, keeping
+the reference data cache and the ETags of conditional GETs in sync.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import (
+    Client,
+    InstrumentType,
+    Loop,
+    NamingConvention,
+    Plant,
+    PlantHierarchy,
+    Site,
+    Tag,
+    TypicalLoop,
+)
+from .refcache import bump_generation_on_commit
+
+
+@receiver(post_save, sender=InstrumentType)
+@receiver(post_delete, sender=InstrumentType)
+@receiver(post_save, sender=NamingConvention)
+@receiver(post_delete, sender=NamingConvention)
+@receiver(post_save, sender=PlantHierarchy)
+@receiver(post_delete, sender=PlantHierarchy)
+def invalidate_reference_sets(sender, **kwargs):
+    """A saved or deleted row supersedes every cached set of its table."""
+    bump_generation_on_commit(sender)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Loop)
+@receiver(post_delete, sender=Loop)
+@receiver(post_save, sender=TypicalLoop)
+@receiver(post_delete, sender=TypicalLoop)
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+@receiver(post_save, sender=Plant)
+@receiver(post_delete, sender=Plant)
+def bump_conditional_generations(sender, **kwargs):
+    """A saved or deleted row changes the ETag of the endpoints reading its table."""
+    bump_generation_on_commit(sender)
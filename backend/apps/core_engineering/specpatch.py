@@ -0,0 +1,369 @@
+"""
+Spec Data Patches - JSON Merge Patch / JSON Patch applied in the database.
+
+A patch is compiled into a list of operations that can be applied two ways
+with identical results:
+- apply_operations() runs them on a Python document; it is used to check
+  preconditions (paths exist, "test" ops) and to validate the patched
+  document against the instrument type schema
+- operations_expression() turns them into a jsonb expression (jsonb_set,
+  jsonb_insert, #-, ||) so a single UPDATE patches every selected tag
+  without reading spec_data into Python. Each operation wraps the
+  expression of the previous ones; operations reading the document more
+  than once bind it in a scalar subquery (Bind), so the SQL grows linearly
+  with the number of operations instead of doubling at each of them.
+
+Supported formats:
+- JSON Merge Patch (RFC 7396), given as an object: keys are merged
+  recursively and null removes a key
+- JSON Patch (RFC 6902), given as an array of add / remove / replace /
+  move / copy / test operations. A path segment that is an integer or "-"
+  addresses an array element, any other segment an object key. Merge patch
+  keys are always object keys, "2" included.
+
+"test" operations are only checked by apply_operations(), not in the SQL:
+callers must lock the rows before reading the documents they check, so
+the documents can't change before the UPDATE (TagBulkUpdater selects the
+tags FOR UPDATE first).
+"""
+
+import copy
+
+from django.contrib.postgres.fields import ArrayField
+from django.db.models import Case, CharField, F, Func, JSONField, TextField, Value, When
+from django.db.models.lookups import Exact
+
+JSON_PATCH_OPS = ("add", "remove", "replace", "move", "copy", "test")
+
+_MISSING = object()
+
+
+class _Append(str):
+    """The "-" segment of a JSON Patch path: the end of an array."""
+
+
+# Compiled paths hold object keys as str, array indexes as int and APPEND
+APPEND = _Append("-")
+
+
+class SpecPatchError(Exception):
+    """Raised for a malformed patch or one that can't be applied to a document."""
+
+
+# =============================================================================
+# Compiling patches
+# =============================================================================
+
+def parse_pointer(pointer):
+    """Split a JSON Pointer (RFC 6901) into unescaped path segments."""
+    if not isinstance(pointer, str) or (pointer and not pointer.startswith("/")):
+        raise SpecPatchError(f"Invalid JSON pointer: {pointer!r}")
+    if not pointer:
+        raise SpecPatchError("Patching the whole spec_data document isn't supported.")
+    return tuple(
+        segment.replace("~1", "/").replace("~0", "~")
+        for segment in pointer[1:].split("/")
+    )
+
+
+def _is_index(segment):
+    return isinstance(segment, (int, _Append))
+
+
+def _array_path(path):
+    """Mark the segments of a JSON Patch path that address array elements."""
+    return tuple(
+        APPEND if segment == "-" else int(segment) if segment.isdigit() else segment
+        for segment in path
+    )
+
+
+def merge_patch_operations(patch, path=()):
+    """Compile a JSON Merge Patch object into operations."""
+    operations = []
+    for key, value in patch.items():
+        key_path = path + (str(key),)
+        if value is None:
+            operations.append(("remove", key_path, False))
+        elif isinstance(value, dict):
+            operations.append(("ensure_object", key_path))
+            operations.extend(merge_patch_operations(value, key_path))
+        else:
+            operations.append(("add", key_path, value))
+    return operations
+
+
+def json_patch_operations(patch):
+    """Compile a JSON Patch operation list into operations."""
+    operations = []
+    for index, operation in enumerate(patch):
+        if not isinstance(operation, dict) or operation.get("op") not in JSON_PATCH_OPS:
+            raise SpecPatchError(
+                f"Operation {index}: op must be one of {', '.join(JSON_PATCH_OPS)}."
+            )
+        op = operation["op"]
+        path = _array_path(parse_pointer(operation.get("path")))
+        if op in ("add", "replace", "test"):
+            if "value" not in operation:
+                raise SpecPatchError(f"Operation {index}: '{op}' requires a value.")
+            operations.append((op, path, operation["value"]))
+        elif op == "remove":
+            operations.append(("remove", path, True))
+        else:
+            source = _array_path(parse_pointer(operation.get("from")))
+            if op == "move" and path[: len(source)] == source:
+                raise SpecPatchError(
+                    f"Operation {index}: can't move a value into one of its children."
+                )
+            operations.append((op, path, source))
+    return operations
+
+
+def spec_patch_operations(patch):
+    """Compile a merge patch (object) or JSON Patch (array) into operations."""
+    if isinstance(patch, dict):
+        return merge_patch_operations(patch)
+    if isinstance(patch, list):
+        return json_patch_operations(patch)
+    raise SpecPatchError(
+        "A patch must be an object (merge patch) or an array (JSON Patch)."
+    )
+
+
+# =============================================================================
+# Applying operations in Python
+# =============================================================================
+
+def _pointer(path):
+    return "/" + "/".join(
+        str(segment).replace("~", "~0").replace("/", "~1") for segment in path
+    )
+
+
+def _resolve(document, path):
+    for segment in path:
+        if isinstance(document, dict):
+            document = document.get(str(segment), _MISSING)
+        elif (
+            isinstance(document, list)
+            and type(segment) is int
+            and segment < len(document)
+        ):
+            document = document[segment]
+        else:
+            return _MISSING
+        if document is _MISSING:
+            return _MISSING
+    return document
+
+
+def _container(document, path):
+    parent = _resolve(document, path[:-1])
+    if _is_index(path[-1]):
+        if not isinstance(parent, list):
+            raise SpecPatchError(f"{_pointer(path[:-1]) or '/'} is not an array.")
+    elif not isinstance(parent, dict):
+        raise SpecPatchError(f"{_pointer(path[:-1]) or '/'} is not an object.")
+    return parent
+
+
+def _add(document, path, value):
+    parent = _container(document, path)
+    segment = path[-1]
+    if isinstance(parent, dict):
+        parent[segment] = value
+    elif segment is APPEND:
+        parent.append(value)
+    elif segment <= len(parent):
+        parent.insert(segment, value)
+    else:
+        raise SpecPatchError(f"{_pointer(path)} is out of range.")
+
+
+def _remove(document, path, strict=True):
+    parent = _container(document, path)
+    segment = path[-1]
+    if isinstance(parent, dict):
+        if segment in parent:
+            del parent[segment]
+            return
+    elif segment is not APPEND and segment < len(parent):
+        del parent[segment]
+        return
+    if strict:
+        raise SpecPatchError(f"{_pointer(path)} does not exist.")
+
+
+def apply_operations(document, operations):
+    """Return a patched copy of document. Raises SpecPatchError."""
+    document = copy.deepcopy(document) if document is not None else {}
+    for operation in operations:
+        op, path = operation[0], operation[1]
+        if op == "ensure_object":
+            parent = _container(document, path)
+            if not isinstance(parent.get(path[-1]), dict):
+                parent[path[-1]] = {}
+        elif op == "add":
+            _add(document, path, copy.deepcopy(operation[2]))
+        elif op == "remove":
+            _remove(document, path, strict=operation[2])
+        elif op == "replace":
+            if path[-1] is APPEND or _resolve(document, path) is _MISSING:
+                raise SpecPatchError(f"{_pointer(path)} does not exist.")
+            _remove(document, path)
+            _add(document, path, copy.deepcopy(operation[2]))
+        elif op == "test":
+            if _resolve(document, path) != operation[2]:
+                raise SpecPatchError(f"Test failed at {_pointer(path)}.")
+        else:  # copy / move
+            value = _resolve(document, operation[2])
+            if value is _MISSING:
+                raise SpecPatchError(f"{_pointer(operation[2])} does not exist.")
+            if op == "move":
+                _remove(document, operation[2])
+            _add(document, path, copy.deepcopy(value))
+    return document
+
+
+# =============================================================================
+# Building the SQL expression
+# =============================================================================
+
+def _path_value(path):
+    return Value(
+        [str(segment) for segment in path], output_field=ArrayField(TextField())
+    )
+
+
+def _json_value(value):
+    return Value(value, output_field=JSONField())
+
+
+class JSONExtractPath(Func):
+    """jsonb #> text[]"""
+
+    template = "(%(expressions)s)"
+    arg_joiner = " #> "
+    output_field = JSONField()
+
+
+class JSONRemovePath(Func):
+    """jsonb #- text[]"""
+
+    template = "(%(expressions)s)"
+    arg_joiner = " #- "
+    output_field = JSONField()
+
+
+class JSONConcat(Func):
+    """jsonb || jsonb"""
+
+    template = "(%(expressions)s)"
+    arg_joiner = " || "
+    output_field = JSONField()
+
+
+class Document(Func):
+    """The document bound by the enclosing Bind."""
+
+    template = "_doc.d"
+    output_field = JSONField()
+
+
+class Bind(Func):
+    """
+    (SELECT step FROM (SELECT document AS d) _doc): document is evaluated
+    once, however often step reads it (as Document()).
+    """
+
+    output_field = JSONField()
+
+    def __init__(self, document, step):
+        super().__init__(document, step)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        document, step = self.get_source_expressions()
+        document_sql, document_params = compiler.compile(document)
+        step_sql, step_params = compiler.compile(step)
+        return (
+            f"(SELECT {step_sql} FROM (SELECT {document_sql} AS d) AS _doc)",
+            (*step_params, *document_params),
+        )
+
+
+def _jsonb_set(target, path, value, create_missing=True):
+    return Func(
+        target,
+        _path_value(path),
+        value,
+        Value(create_missing),
+        function="jsonb_set",
+        output_field=JSONField(),
+    )
+
+
+def _add_expression(target, path, value):
+    """Add value at path of target, which appending ("-") reads twice."""
+    if path[-1] is APPEND:
+        parent = _path_value(path[:-1])
+        appended = JSONConcat(JSONExtractPath(target, parent), _array(value))
+        return _jsonb_set(target, path[:-1], appended) if path[:-1] else appended
+    if _is_index(path[-1]):
+        return Func(
+            target,
+            _path_value(path),
+            value,
+            function="jsonb_insert",
+            output_field=JSONField(),
+        )
+    return _jsonb_set(target, path, value)
+
+
+def _array(value):
+    return Func(value, function="jsonb_build_array", output_field=JSONField())
+
+
+def operations_expression(operations, base=None):
+    """
+    Build the jsonb expression applying operations to spec_data.
+
+    The documents must have been checked with apply_operations() first, on
+    locked rows: the SQL functions silently skip paths that don't exist,
+    where the Python implementation raises, and "test" operations aren't
+    part of the expression.
+    """
+    expression = F("spec_data") if base is None else base
+    for operation in operations:
+        op, path = operation[0], operation[1]
+        if op == "ensure_object":
+            current = JSONExtractPath(Document(), _path_value(path))
+            is_object = Exact(
+                Func(current, function="jsonb_typeof", output_field=CharField()),
+                "object",
+            )
+            expression = Bind(
+                expression,
+                _jsonb_set(
+                    Document(),
+                    path,
+                    Case(When(is_object, then=current), default=_json_value({})),
+                ),
+            )
+        elif op == "add":
+            value = _json_value(operation[2])
+            if path[-1] is APPEND:
+                expression = Bind(expression, _add_expression(Document(), path, value))
+            else:
+                expression = _add_expression(expression, path, value)
+        elif op == "remove":
+            expression = JSONRemovePath(expression, _path_value(path))
+        elif op == "replace":
+            expression = _jsonb_set(expression, path, _json_value(operation[2]), False)
+        elif op in ("copy", "move"):
+            value = JSONExtractPath(Document(), _path_value(operation[2]))
+            target = Document()
+            if op == "move":
+                target = JSONRemovePath(target, _path_value(operation[2]))
+            expression = Bind(expression, _add_expression(target, path, value))
+        # "test" is a precondition, checked by apply_operations()
+    return expression
@@ -0,0 +1,936 @@
+import io
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.test import override_settings
+from django.utils.http import http_date
+from django_tenants.test.cases import TenantTestCase
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from apps.administration.models import User
+
+from . import bulk, fastpath, refcache, validation
+from .bulk import TagBulkUpdateError, TagBulkUpdater
+from .fastpath import dumps, get_row_serializer
+from .hierarchy import build_hierarchy_tree
+from .history import changes_between, current_point, parse_point
+from .importers import TagImporter, read_csv_rows
+from .models import InstrumentType, Loop, PlantHierarchy, Tag
+from .refcache import clear_local_reference_cache, get_reference, units
+from .search import parse_search_terms, search_tags
+from .serializers import ReferencePrimaryKeyRelatedField, TagBulkUpdateSerializer
+from .specpatch import SpecPatchError, apply_operations, spec_patch_operations
+from .validation import get_validator, iter_validate_spec_batch, run_validator
+
+NodeType = PlantHierarchy.NodeType
+
+
+class EngineeringTestCase(TenantTestCase):
+    """Runs against a throwaway project schema."""
+
+    @classmethod
+    def setup_tenant(cls, tenant):
+        tenant.name = "Engineering tests"
+        tenant.project_no = "TEST-ENG"
+        tenant.organization_id = 1
+
+    def setUp(self):
+        # Generations are bumped on commit, which never happens in a test
+        cache.clear()
+        clear_local_reference_cache()
+
+    @staticmethod
+    def create_node(code, node_type, parent=None, **kwargs):
+        return PlantHierarchy.objects.create(
+            name=kwargs.pop("name", code),
+            code=code,
+            node_type=node_type,
+            parent=parent,
+            **kwargs,
+        )
+
+    def api_client(self):
+        """An authenticated client sending this project's X-Project-ID header."""
+        client = APIClient(HTTP_X_PROJECT_ID=str(self.tenant.pk))
+        user, _created = User.objects.get_or_create(username="engineer")
+        client.force_authenticate(user)
+        return client
+
+    def create_unit(self, code="U1"):
+        plant = self.create_node("P1", NodeType.PLANT)
+        area = self.create_node("A1", NodeType.AREA, parent=plant)
+        return self.create_node(code, NodeType.UNIT, parent=area)
+
+
+# =============================================================================
+# Plant hierarchy tree
+# =============================================================================
+
+def _shape(nodes):
+    return [(node["code"], _shape(node["children"])) for node in nodes]
+
+
+class HierarchyTreeTests(EngineeringTestCase):
+    def setUp(self):
+        super().setUp()
+        plant = self.create_node("P1", NodeType.PLANT)
+        self.create_node("A1", NodeType.AREA, parent=plant)
+        inactive_area = self.create_node(
+            "A2", NodeType.AREA, parent=plant, is_active=False
+        )
+        self.create_node("U1", NodeType.UNIT, parent=inactive_area)
+        self.create_node("P2", NodeType.PLANT, is_active=False)
+        self.plant = plant
+
+    def test_tree_is_built_with_one_query(self):
+        with self.assertNumQueries(1):
+            tree = build_hierarchy_tree()
+
+        # Only the top level is filtered on is_active
+        self.assertEqual(
+            _shape(tree), [("P1", [("A1", []), ("A2", [("U1", [])])])]
+        )
+        self.assertEqual(
+            set(tree[0]),
+            {"id", "name", "code", "node_type", "description", "is_active", "children"},
+        )
+
+    def test_include_inactive_adds_inactive_top_level_nodes(self):
+        tree = build_hierarchy_tree(include_inactive=True)
+
+        self.assertEqual([node["code"] for node in tree], ["P1", "P2"])
+
+    def test_prune_inactive_drops_inactive_subtrees(self):
+        tree = build_hierarchy_tree(prune_inactive=True)
+
+        self.assertEqual(_shape(tree), [("P1", [("A1", [])])])
+
+    def test_root_and_max_depth(self):
+        tree = build_hierarchy_tree(root=self.plant, max_depth=1)
+
+        self.assertEqual(_shape(tree), [("P1", [("A1", []), ("A2", [])])])
+
+
+# =============================================================================
+# Bulk updates
+# =============================================================================
+
+class TagBulkUpdaterSpecDataTests(EngineeringTestCase):
+    def setUp(self):
+        super().setUp()
+        unit = self.create_unit()
+        instrument_type = InstrumentType.objects.create(
+            name="Flow Transmitter",
+            code="FT",
+            category=InstrumentType.Category.TRANSMITTER,
+            schema_template={
+                "type": "object",
+                "properties": {"range_max": {"type": "number"}},
+            },
+        )
+        self.ids = [
+            Tag.objects.create(
+                tag_number=f"FT-10{n}",
+                unit=unit,
+                instrument_type=instrument_type,
+                spec_data={"range_max": 100},
+            ).pk
+            for n in range(1, 6)
+        ]
+
+    def test_identical_documents_are_validated_once(self):
+        updater = TagBulkUpdater(self.ids, spec_patch={"range_max": "bad"})
+        with mock.patch.object(bulk, "run_validator", wraps=bulk.run_validator) as run:
+            with self.assertRaises(TagBulkUpdateError) as raised:
+                updater.run()
+
+        self.assertEqual(run.call_count, 1)
+        self.assertEqual(
+            raised.exception.errors["spec_data"],
+            [
+                "'bad' is not of type 'number' "
+                "(FT: FT-101, FT-102, FT-103, FT-104, FT-105)"
+            ],
+        )
+
+    def test_failed_test_operation_is_reported_once(self):
+        updater = TagBulkUpdater(
+            self.ids, spec_patch=[{"op": "test", "path": "/range_max", "value": 5}]
+        )
+        with self.assertRaises(TagBulkUpdateError) as raised:
+            updater.run()
+
+        self.assertEqual(len(raised.exception.errors["spec_data"]), 1)
+
+
+# =============================================================================
+# Materialized hierarchy path
+# =============================================================================
+
+class HierarchyPathTests(EngineeringTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plant = self.create_node("P1", NodeType.PLANT)
+        self.area = self.create_node("A1", NodeType.AREA, parent=self.plant)
+        self.unit = self.create_node("U1", NodeType.UNIT, parent=self.area)
+        self.other_plant = self.create_node("P2", NodeType.PLANT)
+        self.other_area = self.create_node("A2", NodeType.AREA, parent=self.other_plant)
+
+    @staticmethod
+    def paths():
+        return dict(PlantHierarchy.objects.values_list("code", "path"))
+
+    def test_rename_rewrites_descendant_paths(self):
+        self.plant.code = "P9"
+        self.plant.save()
+
+        self.assertEqual(self.paths(), {
+            "P9": "P9",
+            "A1": "P9 / A1",
+            "U1": "P9 / A1 / U1",
+            "P2": "P2",
+            "A2": "P2 / A2",
+        })
+
+    def test_move_to_rewrites_paths(self):
+        self.area.move_to(self.other_plant, "last-child")
+
+        self.assertEqual(self.paths(), {
+            "P1": "P1",
+            "A1": "P2 / A1",
+            "U1": "P2 / A1 / U1",
+            "P2": "P2",
+            "A2": "P2 / A2",
+        })
+
+    def test_move_node_rewrites_paths(self):
+        unit = PlantHierarchy.objects.get(pk=self.unit.pk)
+        PlantHierarchy.objects.move_node(unit, self.other_area, "first-child")
+
+        self.assertEqual(
+            PlantHierarchy.objects.get(pk=self.unit.pk).path, "P2 / A2 / U1"
+        )
+
+    def test_move_next_to_a_node_rewrites_paths(self):
+        area = PlantHierarchy.objects.get(pk=self.area.pk)
+        area.move_to(self.other_area, "right")
+
+        self.assertEqual(
+            PlantHierarchy.objects.get(pk=self.unit.pk).path, "P2 / A1 / U1"
+        )
+
+
+# =============================================================================
+# Spec data validation
+# =============================================================================
+
+class ValidatorCacheTests(EngineeringTestCase):
+    def setUp(self):
+        super().setUp()
+        validation.clear_validator_cache()
+        self.instrument_type = InstrumentType.objects.create(
+            name="Flow Transmitter",
+            code="FT",
+            category=InstrumentType.Category.TRANSMITTER,
+            schema_template={
+                "type": "object",
+                "properties": {"range_max": {"type": "number"}},
+            },
+        )
+
+    def is_valid(self, instrument_type, spec_data):
+        return run_validator(get_validator(instrument_type), spec_data)[0]
+
+    def test_validator_is_compiled_once_per_schema(self):
+        with mock.patch.object(
+            validation, "compile_validator", wraps=validation.compile_validator
+        ) as compile_validator:
+            self.is_valid(self.instrument_type, {})
+            # Same schema, different key order
+            instrument_type = InstrumentType.objects.get(pk=self.instrument_type.pk)
+            instrument_type.schema_template = dict(
+                reversed(instrument_type.schema_template.items())
+            )
+            self.is_valid(instrument_type, {})
+
+        self.assertEqual(compile_validator.call_count, 1)
+
+    def test_queryset_update_recompiles(self):
+        spec_data = {"range_max": "high"}
+        self.assertFalse(self.is_valid(self.instrument_type, spec_data))
+
+        InstrumentType.objects.filter(pk=self.instrument_type.pk).update(
+            schema_template={"type": "object"}
+        )
+        instrument_type = InstrumentType.objects.get(pk=self.instrument_type.pk)
+
+        self.assertTrue(self.is_valid(instrument_type, spec_data))
+
+    def test_unsaved_edit_is_validated_against_its_schema(self):
+        self.assertTrue(self.is_valid(self.instrument_type, {"range_max": 1}))
+
+        self.instrument_type.schema_template["properties"]["range_max"] = {
+            "type": "string"
+        }
+
+        self.assertFalse(self.is_valid(self.instrument_type, {"range_max": 1}))
+
+    def test_batch_rejects_booleans_as_instrument_type(self):
+        rows = [
+            {"instrument_type": True, "spec_data": {}},
+            {"instrument_type": self.instrument_type.pk, "spec_data": {}},
+        ]
+
+        results = list(iter_validate_spec_batch(rows))
+
+        self.assertFalse(results[0]["valid"])
+        self.assertEqual(
+            results[0]["errors"], ["instrument_type is required (id or code)."]
+        )
+        self.assertTrue(results[1]["valid"])
+
+
+# =============================================================================
+# Bulk import
+# =============================================================================
+
+class TagImporterTests(EngineeringTestCase):
+    def setUp(self):
+        super().setUp()
+        self.unit = self.create_unit()
+        self.other_unit = self.create_node(
+            "U2", NodeType.UNIT, parent=self.unit.parent
+        )
+        InstrumentType.objects.create(
+            name="Flow Transmitter",
+            code="FT",
+            category=InstrumentType.Category.TRANSMITTER,
+        )
+        Loop.objects.create(
+            loop_tag="FIC-201",
+            function=Loop.Function.FLOW,
+            unit=self.other_unit,
+        )
+
+    def run_import(self, csv_text, **kwargs):
+        return TagImporter(**kwargs).run(read_csv_rows(io.StringIO(csv_text)))
+
+    def test_created_and_invalid_rows(self):
+        report = self.run_import(
+            "tag,unit,loop,type\n"
+            "FT-101,U1,,FT\n"
+            "FT-102,P1 / A1 / U1,,FT\n"
+            "FT-103,A1,,FT\n"
+            "FT-104,U1,FIC-201,FT\n"
+        )
+
+        self.assertEqual(
+            {key: report[key] for key in ("total", "created", "invalid")},
+            {"total": 4, "created": 2, "invalid": 2},
+        )
+        self.assertEqual(
+            [(error["row"], error["errors"]) for error in report["errors"]],
+            [
+                (4, {"unit": "Tag must be assigned to a UNIT, not a PLANT or AREA."}),
+                (5, {"loop": "Loop must belong to the same unit as the tag."}),
+            ],
+        )
+        self.assertEqual(
+            sorted(Tag.objects.values_list("tag_number", flat=True)),
+            ["FT-101", "FT-102"],
+        )
+
+    def test_updated_and_unchanged_rows(self):
+        self.run_import(
+            "tag,unit,type,service\nFT-101,U1,FT,Feed\nFT-102,U1,FT,Feed\n"
+        )
+
+        report = self.run_import(
+            "tag,unit,type,service\nFT-101,U1,FT,Reflux\nFT-102,U1,FT,Feed\n"
+        )
+
+        self.assertEqual(
+            (report["updated"], report["unchanged"], report["skipped"]), (1, 1, 0)
+        )
+        self.assertEqual(Tag.objects.get(tag_number="FT-101").service, "Reflux")
+
+    def test_existing_rows_are_skipped_without_update(self):
+        self.run_import("tag,unit,type,service\nFT-101,U1,FT,Feed\n")
+
+        report = self.run_import(
+            "tag,unit,type,service\nFT-101,U1,FT,Reflux\nFT-102,U1,FT,Feed\n",
+            update_existing=False,
+        )
+
+        counts = ("created", "updated", "unchanged", "skipped")
+        self.assertEqual([report[key] for key in counts], [1, 0, 0, 1])
+        self.assertEqual(Tag.objects.get(tag_number="FT-101").service, "Feed")
+
+
+# =============================================================================
+# Pagination
+# =============================================================================
+
+class LoopPaginationTests(EngineeringTestCase):
+    def setUp(self):
+        super().setUp()
+        unit = self.create_unit()
+        Loop.objects.bulk_create(
+            Loop(loop_tag=f"FIC-{n}", function=Loop.Function.FLOW, unit=unit)
+            for n in range(101, 106)
+        )
+        self.client = self.api_client()
+
+    def get(self, **params):
+        response = self.client.get("/api/engineering/loops/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def loop_tags(self, data):
+        return [loop["loop_tag"] for loop in data["results"]]
+
+    def test_page_numbers_by_default(self):
+        data = self.get(page=2, page_size=2)
+
+        self.assertEqual(set(data), {"count", "next", "previous", "results"})
+        self.assertEqual(data["count"], 5)
+        self.assertEqual(self.loop_tags(data), ["FIC-103", "FIC-104"])
+        self.assertIn("page=3", data["next"])
+
+    def test_cursor_pages(self):
+        data = self.get(cursor="", page_size=2)
+
+        self.assertIsNone(data["count"])
+        self.assertIsNone(data["previous"])
+        seen = self.loop_tags(data)
+        while data["next"]:
+            data = self.client.get(data["next"]).json()
+            seen += self.loop_tags(data)
+        self.assertEqual(seen, [f"FIC-{n}" for n in range(101, 106)])
+
+        data = self.client.get(data["previous"]).json()
+        self.assertEqual(self.loop_tags(data), ["FIC-103", "FIC-104"])
+
+    def test_cursor_exact_count(self):
+        data = self.get(cursor="", include_count="exact")
+
+        self.assertEqual(data["count"], 5)
+        self.assertIsInstance(data["approximate_count"], int)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/engineering/loops/", {"cursor": "bogus"})
+
+        self.assertEqual(response.status_code, 404)
+
+
+# =============================================================================
+# Fast read path
+# =============================================================================
+
+class TagRowSerializer(serializers.ModelSerializer):
+    unit_code = serializers.CharField(source="unit.code", read_only=True)
+    loop_tag = serializers.CharField(source="loop.loop_tag", read_only=True)
+    weight = serializers.DecimalField(
+        source="revision", max_digits=6, decimal_places=2, read_only=True
+    )
+
+    class Meta:
+        model = Tag
+        fields = [
+            "id",
+            "tag_number",
+            "unit_code",
+            "loop_tag",
+            "instrument_type",
+            "service",
+            "status",
+            "revision",
+            "weight",
+            "spec_data",
+            "created_at",
+            "updated_at",
+        ]
+
+
+class FastReadTests(EngineeringTestCase):
+    def setUp(self):
+        super().setUp()
+        unit = self.create_unit()
+        loop = Loop.objects.create(
+            loop_tag="FIC-101", function=Loop.Function.FLOW, unit=unit
+        )
+        instrument_type = InstrumentType.objects.create(
+            name="Flow Transmitter",
+            code="FT",
+            category=InstrumentType.Category.TRANSMITTER,
+        )
+        Tag.objects.create(
+            tag_number="FT-101",
+            unit=unit,
+            loop=loop,
+            instrument_type=instrument_type,
+            service="Feed flow",
+            spec_data={
+                "range": {"min": 0, "max": 1.5, "unit": "m3/h"},
+                "signals": ["4-20mA", None, True],
+                "note": None,
+            },
+        )
+        Tag.objects.create(
+            tag_number="FT-102", unit=unit, instrument_type=instrument_type
+        )
+
+    def test_rows_render_like_the_serializer(self):
+        queryset = Tag.objects.order_by("tag_number")
+        row_serializer = get_row_serializer(TagRowSerializer)
+
+        fast = dumps(row_serializer.to_representation(row_serializer.values(queryset)))
+        regular = JSONRenderer().render(TagRowSerializer(queryset, many=True).data)
+
+        self.assertEqual(fast, regular)
+
+    def test_list_is_unchanged_by_the_fast_path(self):
+        client = self.api_client()
+        bodies = []
+        for enabled in (False, True):
+            with override_settings(FAST_READ_ENABLED=enabled):
+                for params in ({}, {"cursor": ""}):
+                    response = client.get("/api/engineering/tags/", params)
+                    self.assertEqual(response.status_code, 200)
+                    bodies.append(response.content)
+
+        self.assertEqual(bodies[:2], bodies[2:])
+
+    def test_fast_path_follows_the_setting(self):
+        client = self.api_client()
+        for enabled in (False, True):
+            with override_settings(FAST_READ_ENABLED=enabled), mock.patch.object(
+                fastpath, "get_row_serializer", wraps=fastpath.get_row_serializer
+            ) as get_row_serializer:
+                client.get("/api/engineering/tags/")
+
+            self.assertEqual(get_row_serializer.called, enabled)
+
+
+# =============================================================================
+# Search
+# =============================================================================
+
+class TagSearchTests(EngineeringTestCase):
+    def setUp(self):
+        super().setUp()
+        unit = self.create_unit()
+        instrument_type = InstrumentType.objects.create(
+            name="Flow Transmitter",
+            code="FT",
+            category=InstrumentType.Category.TRANSMITTER,
+        )
+        for tag_number, service in (("FT-101", "Feed flow"), ("FT-102", "Reflux")):
+            Tag.objects.create(
+                tag_number=tag_number,
+                unit=unit,
+                instrument_type=instrument_type,
+                service=service,
+            )
+
+    def test_tsquery_operators_are_dropped(self):
+        self.assertEqual(
+            parse_search_terms("FT-10* & (feed | !flow):* 'x'"),
+            [("FT-10", True), ("feed", False), ("flow", False), ("x", False)],
+        )
+        self.assertEqual(parse_search_terms("&|!():*'"), [])
+
+    def test_search_with_tsquery_operators(self):
+        tags = search_tags("!feed | (flow):*'")
+
+        self.assertEqual([tag.tag_number for tag in tags], ["FT-101"])
+
+    def test_prefix_search(self):
+        tags = search_tags("ft-10*", highlight=False)
+
+        self.assertEqual(
+            sorted(tag.tag_number for tag in tags), ["FT-101", "FT-102"]
+        )
+
+    def test_operators_only(self):
+        self.assertEqual(list(search_tags("&|!():*'")), [])
+
+
+# =============================================================================
+# spec_data filters
+# =============================================================================
+
+class SpecDataFilterTests(EngineeringTestCase):
+    def setUp(self):
+        super().setUp()
+        unit = self.create_unit()
+        instrument_type = InstrumentType.objects.create(
+            name="Flow Transmitter",
+            code="FT",
+            category=InstrumentType.Category.TRANSMITTER,
+        )
+        for tag_number, spec_data in (
+            ("FT-101", {"range_max": 100, "output_signal": "HART"}),
+            ("FT-102", {"range_max": 250.5, "output_signal": "4-20mA"}),
+            ("FT-103", {"range_max": "100"}),
+        ):
+            Tag.objects.create(
+                tag_number=tag_number,
+                unit=unit,
+                instrument_type=instrument_type,
+                spec_data=spec_data,
+            )
+        self.client = self.api_client()
+
+    def tag_numbers(self, **params):
+        response = self.client.get("/api/engineering/tags/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return [tag["tag_number"] for tag in response.json()["results"]]
+
+    def test_exact_matches_numbers_and_strings(self):
+        self.assertEqual(
+            self.tag_numbers(spec__range_max="100"), ["FT-101", "FT-103"]
+        )
+        self.assertEqual(
+            self.tag_numbers(spec__output_signal__in="HART,4-20mA"),
+            ["FT-101", "FT-102"],
+        )
+
+    def test_range_compares_values_of_the_same_type(self):
+        self.assertEqual(self.tag_numbers(spec__range_max__gt="100"), ["FT-102"])
+        self.assertEqual(
+            self.tag_numbers(spec__range_max__gte="100"), ["FT-101", "FT-102"]
+        )
+
+    def test_exists(self):
+        self.assertEqual(
+            self.tag_numbers(spec__output_signal__exists="false"), ["FT-103"]
+        )
+
+    def test_non_finite_numbers_are_rejected(self):
+        for name, value in (
+            ("spec__range_max", "NaN"),
+            ("spec__range_max__in", "1,Infinity"),
+            ("spec__range_max__gt", "-Infinity"),
+            ("spec__range_max__lt", "1e999"),
+        ):
+            with self.subTest(name=name, value=value):
+                response = self.client.get("/api/engineering/tags/", {name: value})
+
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {name: ["Numbers must be finite."]})
+
+    def test_unknown_lookup(self):
+        response = self.client.get("/api/engineering/tags/", {"spec__x__like": "1"})
+
+        self.assertEqual(response.status_code, 400)
+
+
+# =============================================================================
+# spec_data patches
+# =============================================================================
+
+class SpecPatchTests(EngineeringTestCase):
+    spec_data = {
+        "range": {"1": "low"},
+        "signals": ["4-20mA", "HART"],
+        "material": "316SS",
+    }
+
+    def setUp(self):
+        super().setUp()
+        instrument_type = InstrumentType.objects.create(
+            name="Flow Transmitter",
+            code="FT",
+            category=InstrumentType.Category.TRANSMITTER,
+        )
+        self.tag = Tag.objects.create(
+            tag_number="FT-101",
+            unit=self.create_unit(),
+            instrument_type=instrument_type,
+            spec_data=self.spec_data,
+        )
+
+    def check_patch(self, patch, expected):
+        """The Python and SQL implementations agree on the patched document."""
+        self.assertEqual(
+            apply_operations(self.spec_data, spec_patch_operations(patch)), expected
+        )
+        TagBulkUpdater([self.tag.pk], spec_patch=patch).run()
+        self.tag.refresh_from_db()
+        self.assertEqual(self.tag.spec_data, expected)
+
+    def test_merge_patch_digit_keys_are_object_keys(self):
+        self.check_patch(
+            {"range": {"2": "high"}, "signals": {"0": "HART"}, "material": None},
+            {"range": {"1": "low", "2": "high"}, "signals": {"0": "HART"}},
+        )
+
+    def test_json_patch_array_operations(self):
+        self.check_patch(
+            [
+                {"op": "test", "path": "/signals/1", "value": "HART"},
+                {"op": "add", "path": "/signals/1", "value": "FF"},
+                {"op": "add", "path": "/signals/-", "value": "PA"},
+                {"op": "replace", "path": "/signals/0", "value": "1-5V"},
+                {"op": "remove", "path": "/signals/2"},
+                {"op": "copy", "from": "/signals/0", "path": "/range/min"},
+                {"op": "move", "from": "/material", "path": "/signals/0"},
+            ],
+            {
+                "range": {"1": "low", "min": "1-5V"},
+                "signals": ["316SS", "1-5V", "FF", "PA"],
+            },
+        )
+
+    def test_json_patch_index_on_an_object(self):
+        with self.assertRaisesMessage(SpecPatchError, "/range is not an array."):
+            apply_operations(
+                self.spec_data,
+                spec_patch_operations(
+                    [{"op": "add", "path": "/range/2", "value": "high"}]
+                ),
+            )
+
+
+# =============================================================================
+# Tag history
+# =============================================================================
+
+class HistoryPointTests(EngineeringTestCase):
+    """Writes from other connections, which commit (tests run in a transaction)."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Created outside the test transaction, so other connections see them;
+        # audit records are written inline, not by the writer thread
+        with override_settings(AUDIT_LOG_MODE="sync"):
+            plant = cls.create_node("P1", NodeType.PLANT)
+            area = cls.create_node("A1", NodeType.AREA, parent=plant)
+            unit = cls.create_node("U1", NodeType.UNIT, parent=area)
+            instrument_type = InstrumentType.objects.create(
+                name="Flow Transmitter",
+                code="FT",
+                category=InstrumentType.Category.TRANSMITTER,
+            )
+            cls.tags = [
+                Tag.objects.create(
+                    tag_number=tag_number, unit=unit, instrument_type=instrument_type
+                )
+                for tag_number in ("FT-101", "FT-102")
+            ]
+
+    def open_transaction(self):
+        conn = connections.create_connection("default")
+        self.addCleanup(conn.close)
+        conn.set_tenant(self.tenant)
+        conn.set_autocommit(False)
+        return conn
+
+    @staticmethod
+    def update_service(conn, tag, service):
+        with conn.cursor() as cursor:
+            cursor.execute(
+                "UPDATE core_engineering_tag SET service = %s WHERE id = %s",
+                [service, tag.pk],
+            )
+
+    def test_snapshot_points_are_commit_ordered(self):
+        first, second = self.tags
+        since = current_point()
+
+        slow, fast = self.open_transaction(), self.open_transaction()
+        self.update_service(slow, first, "Slow")
+        self.update_service(fast, second, "Fast")
+        fast.commit()
+        # The slow transaction's revision has the lower id but isn't committed
+        until = current_point()
+        slow.commit()
+
+        self.assertEqual(
+            [change["tag_number"] for change in changes_between(since, until)],
+            ["FT-102"],
+        )
+        self.assertEqual(
+            [change["tag_number"] for change in changes_between(until)], ["FT-101"]
+        )
+        self.assertEqual(parse_point(str(until)), until)
+
+    def test_changes_report_returns_the_next_since(self):
+        since = current_point()
+        conn = self.open_transaction()
+        self.update_service(conn, self.tags[0], "Report")
+        conn.commit()
+
+        response = self.api_client().get(
+            "/api/engineering/tags/changes/", {"since": str(since)}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [change["tag_number"] for change in response.data["results"]], ["FT-101"]
+        )
+        self.assertEqual(changes_between(parse_point(response.data["revision"])), [])
+
+
+# =============================================================================
+# Reference data cache
+# =============================================================================
+
+class ReferenceCacheTests(EngineeringTestCase):
+    def setUp(self):
+        super().setUp()
+        self.unit = self.create_unit()
+        self.area = self.unit.parent
+
+    def test_cached_instance_must_pass_the_queryset(self):
+        units()
+        field = ReferencePrimaryKeyRelatedField(
+            "units",
+            queryset=PlantHierarchy.objects.filter(node_type=NodeType.UNIT),
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(field.run_validation(self.unit.pk), self.unit)
+
+        field = ReferencePrimaryKeyRelatedField(
+            "units", queryset=PlantHierarchy.objects.filter(code="U2")
+        )
+        with self.assertRaises(serializers.ValidationError):
+            field.run_validation(self.unit.pk)
+
+    def test_bulk_update_rejects_non_unit_nodes(self):
+        serializer = TagBulkUpdateSerializer(data={"ids": [1], "unit": self.area.pk})
+
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("unit", serializer.errors)
+
+    def test_tag_clean_applies_limit_choices_to_on_a_cache_hit(self):
+        tag = Tag(tag_number="FT-101", unit=self.area)
+        # A set that (wrongly) holds the area: the cached copy is still checked
+        cached_units = {self.area.pk: self.area}
+        with mock.patch.object(refcache, "units", return_value=cached_units):
+            with self.assertRaises(ValidationError) as raised:
+                tag.clean_fields(exclude={"instrument_type"})
+
+        self.assertIn("unit", raised.exception.message_dict)
+
+    def test_saving_a_node_invalidates_the_set(self):
+        self.assertEqual(list(units()), [self.unit.pk])
+
+        # Without audit, whose writer thread would hold a connection
+        with override_settings(AUDIT_LOG_MODE="off"), self.captureOnCommitCallbacks(
+            execute=True
+        ):
+            unit = self.create_node("U2", NodeType.UNIT, parent=self.area)
+
+        self.assertEqual(list(units()), [self.unit.pk, unit.pk])
+        self.assertEqual(get_reference("units", unit.pk).code, "U2")
+
+    def test_one_thread_loads_a_missing_set(self):
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"loaded": True}
+
+        results = []
+
+        def read():
+            results.append(refcache.cached("test_set", InstrumentType, loader))
+
+        threads = [threading.Thread(target=read) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{"loaded": True}] * 8)
+
+    def test_waits_for_the_loading_process(self):
+        schema, generation = self.tenant.schema_name, 1
+        key = refcache._value_key(schema, "test_set", generation)
+        # Another process holds the lock and stores its result shortly
+        cache.add(f"{key}:lock", 1)
+        timer = threading.Timer(0.1, cache.set, [key, {"loaded": "elsewhere"}])
+        timer.start()
+        loader = mock.Mock(return_value={"loaded": "here"})
+
+        value = refcache._load(schema, "test_set", generation, loader)
+        timer.join()
+
+        self.assertEqual(value, {"loaded": "elsewhere"})
+        loader.assert_not_called()
+
+
+# =============================================================================
+# Conditional GET
+# =============================================================================
+
+class ConditionalGetTests(EngineeringTestCase):
+    url = "/api/engineering/hierarchy/"
+
+    def setUp(self):
+        super().setUp()
+        self.unit = self.create_unit()
+        self.client = self.api_client()
+
+    def set_changed_at(self, changed_at):
+        key = refcache._changed_at_key(
+            self.tenant.schema_name, PlantHierarchy._meta.db_table
+        )
+        cache.set(key, changed_at, None)
+
+    def test_if_none_match(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_changes_with_the_data(self):
+        etag = self.client.get(self.url)["ETag"]
+
+        with override_settings(AUDIT_LOG_MODE="off"), self.captureOnCommitCallbacks(
+            execute=True
+        ):
+            self.create_node("U2", NodeType.UNIT, parent=self.unit.parent)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_if_match_failure(self):
+        response = self.client.get(self.url, HTTP_IF_MATCH='"stale"')
+
+        self.assertEqual(response.status_code, 412)
+
+    def test_if_modified_since_within_the_second(self):
+        self.set_changed_at(1700000000.0)
+        since = http_date(1700000000)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 304)
+
+        # Last-Modified would still name the same second
+        self.set_changed_at(1700000000.5)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=since)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Last-Modified"], since)
+
+    def test_descendant_path_rewrite_bumps_the_generation(self):
+        area = self.unit.parent
+        area.code = "A9"
+        with mock.patch.object(refcache, "bump_generation_on_commit") as bump:
+            area.save()
+
+        bump.assert_called_once_with(PlantHierarchy)
+        self.unit.refresh_from_db()
+        self.assertEqual(self.unit.path, "P1 / A9 / U1")
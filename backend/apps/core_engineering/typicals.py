@@ -0,0 +1,415 @@
+"""
+Typical Loops - stamp out standard loops from a TypicalLoop template.
+
+A typical stores one loop and its member tags (function code, instrument
+type, service texts and spec_data overrides) in template_data:
+
+    {
+        "loop": {"function_code": "FIC", "description": "{unit_name} flow control"},
+        "tags": [
+            {"function_code": "FT", "instrument_type": "FT",
+             "service": "Flow transmitter", "spec_data": {"output_signal": "HART"}},
+            {"function_code": "FV", "instrument_type": "FV"}
+        ]
+    }
+
+TypicalLoopInstantiator creates N copies per unit. Loop tags and tag numbers
+are built with the active NamingConvention from the unit's hierarchy codes,
+the function code and a sequence number. Everything is checked up front in
+a few set-based queries (naming pattern, existing loop tags and tag numbers,
+spec_data once per template tag), then loops and tags are written with
+batched INSERTs in one transaction, bypassing the per-row full_clean().
+Texts may use the placeholders {loop_tag}, {tag_number}, {sequence},
+{unit}, {unit_name}, {area} and {plant}.
+"""
+
+import copy
+import re
+
+import jsonschema
+from django.db import IntegrityError, transaction
+
+from apps.administration.audit import audit_created, audit_tag_revisions
+
+from .history import current_revision
+from .models import Loop, PlantHierarchy, Tag
+from .naming import get_compiled_convention
+from .refcache import bump_generation_on_commit, naming_conventions
+from .validation import get_validator, resolve_instrument_types, run_validator
+
+TEMPLATE_SCHEMA = {
+    "type": "object",
+    "required": ["loop", "tags"],
+    "properties": {
+        "loop": {
+            "type": "object",
+            "required": ["function_code"],
+            "properties": {
+                "function_code": {"type": "string", "minLength": 1},
+                "description": {"type": "string"},
+            },
+        },
+        "tags": {
+            "type": "array",
+            "minItems": 1,
+            "items": {
+                "type": "object",
+                "required": ["function_code", "instrument_type"],
+                "properties": {
+                    "function_code": {"type": "string", "minLength": 1},
+                    "instrument_type": {"type": "string", "minLength": 1},
+                    "service": {"type": "string"},
+                    "description": {"type": "string"},
+                    "status": {"enum": list(Tag.Status.values)},
+                    "spec_data": {"type": "object"},
+                },
+            },
+        },
+    },
+}
+
+MAX_INSTANCES = 5000
+BATCH_SIZE = 1000
+
+# Errors listed per report
+MAX_REPORTED_ERRORS = 50
+
+_template_validator = jsonschema.Draft7Validator(TEMPLATE_SCHEMA)
+_DIGITS_RE = re.compile(r"\d+")
+
+
+class TypicalLoopError(Exception):
+    """Raised when a typical can't be instantiated; nothing is written."""
+
+    def __init__(self, errors):
+        super().__init__("Typical loop could not be instantiated")
+        self.errors = errors
+
+
+class _FormatValues(dict):
+    """Leave unknown placeholders in template texts untouched."""
+
+    def __missing__(self, key):
+        return "{" + key + "}"
+
+
+def _render(text, values):
+    try:
+        return (text or "").format_map(values)
+    except (ValueError, IndexError):
+        return text or ""
+
+
+def template_errors(template_data):
+    """
+    Check a template_data document.
+    Returns a list of error messages (empty when the template is valid).
+    """
+    errors = [
+        f"{'/'.join(map(str, error.path)) or 'template_data'}: {error.message}"
+        for error in _template_validator.iter_errors(template_data)
+    ]
+    if errors:
+        return errors
+
+    tags = template_data["tags"]
+    instrument_types = resolve_instrument_types(
+        {tag["instrument_type"] for tag in tags}
+    )
+    for index, tag in enumerate(tags):
+        instrument_type = instrument_types.get(tag["instrument_type"])
+        if instrument_type is None:
+            errors.append(
+                f"tags/{index}: instrument type '{tag['instrument_type']}' not found."
+            )
+            continue
+        spec_data = {**instrument_type.default_spec_data, **tag.get("spec_data", {})}
+        if spec_data and instrument_type.schema_template:
+            is_valid, spec_errors = run_validator(
+                get_validator(instrument_type), spec_data
+            )
+            if not is_valid:
+                errors.append(f"tags/{index}/spec_data: {'; '.join(spec_errors)}")
+    return errors
+
+
+def hierarchy_values(unit):
+    """Segment values taken from a unit's hierarchy path (plant / area / unit codes)."""
+    codes = unit.path.split(PlantHierarchy.PATH_SEPARATOR)
+    values = dict(zip(("plant", "area", "unit"), codes[-3:]))
+    values["unit"] = unit.code
+    return values
+
+
+def get_active_convention():
+    """
+    The naming convention used when none is given: the default, else the first
+    active one.
+    """
+    convention = next(iter(naming_conventions().values()), None)
+    return copy.copy(convention)
+
+
+class TypicalLoopInstantiator:
+    """
+    Create copies of a TypicalLoop in the current tenant schema.
+
+    Usage:
+        instantiator = TypicalLoopInstantiator(typical, units, count=10)
+        report = instantiator.run()
+
+    Sequence numbers start at start_sequence, or after the highest sequence
+    already used (per unit when the convention has a unit segment, across
+    the project otherwise). segment_values supplies segments that don't
+    come from the hierarchy, such as "site" or "prefix".
+    """
+
+    def __init__(
+        self,
+        typical,
+        units,
+        count=1,
+        start_sequence=None,
+        convention=None,
+        segment_values=None,
+        dry_run=False,
+    ):
+        self.typical = typical
+        self.units = list({unit.pk: unit for unit in units}.values())
+        self.count = count
+        self.start_sequence = start_sequence
+        self.convention = convention
+        self.segment_values = dict(segment_values or {})
+        self.dry_run = dry_run
+
+    def run(self):
+        """
+        Validate and create the loops. Returns a report dict; raises
+        TypicalLoopError.
+        """
+        errors = template_errors(self.typical.template_data)
+        if len(self.units) * self.count > MAX_INSTANCES:
+            errors.append(f"At most {MAX_INSTANCES} loops can be created at once.")
+        for unit in self.units:
+            if unit.node_type != PlantHierarchy.NodeType.UNIT:
+                errors.append(f"{unit.code} is a {unit.node_type}, not a UNIT.")
+
+        self.convention = self.convention or get_active_convention()
+        if self.convention is None:
+            errors.append("No active naming convention to build tag numbers with.")
+        else:
+            self.compiled = get_compiled_convention(self.convention)
+            if self.compiled.error:
+                errors.append(
+                    "Naming convention has an invalid pattern: "
+                    f"{self.compiled.error}"
+                )
+        if errors:
+            raise TypicalLoopError(errors)
+
+        try:
+            with transaction.atomic():
+                plan = self._plan()
+                self._check(plan)
+                if not self.dry_run:
+                    self._create(plan)
+        except IntegrityError:
+            # Another request took one of the generated names in the meantime
+            raise TypicalLoopError(
+                ["Loop tags or tag numbers were taken concurrently; retry."]
+            )
+
+        return {
+            "typical": self.typical.name,
+            "naming_convention": self.convention.name,
+            "dry_run": self.dry_run,
+            "loops": len(plan),
+            "tags": sum(len(instance["tags"]) for instance in plan),
+            "results": [
+                {
+                    "unit": instance["unit"].pk,
+                    "loop_tag": instance["loop_tag"],
+                    "loop": instance["loop"].pk if instance.get("loop") else None,
+                    "tag_numbers": [tag["tag_number"] for tag in instance["tags"]],
+                }
+                for instance in plan
+            ],
+        }
+
+    # -------------------------------------------------------------------------
+    # Planning
+    # -------------------------------------------------------------------------
+
+    def _sequence_of(self, name):
+        segments = self.compiled.parse(name) or {}
+        match = _DIGITS_RE.match(segments.get("sequence") or "")
+        return int(match.group()) if match else 0
+
+    def _next_sequences(self):
+        """Next free sequence per unit id (or under the key None when shared)."""
+        per_unit = any(
+            segment["name"] == "unit" for segment in self.compiled.format_segments
+        )
+        if self.start_sequence is not None:
+            return per_unit, {}
+
+        loops = Loop.objects.all()
+        tags = Tag.objects.all()
+        if per_unit:
+            loops = loops.filter(unit__in=self.units)
+            tags = tags.filter(unit__in=self.units)
+        highest = {}
+        for queryset, field in ((loops, "loop_tag"), (tags, "tag_number")):
+            for unit_id, name in queryset.values_list("unit_id", field).iterator():
+                key = unit_id if per_unit else None
+                highest[key] = max(highest.get(key, 0), self._sequence_of(name))
+        return per_unit, {key: value + 1 for key, value in highest.items()}
+
+    def _plan(self):
+        template = self.typical.template_data
+        loop_template = template["loop"]
+        tag_templates = template["tags"]
+        instrument_types = resolve_instrument_types(
+            {tag["instrument_type"] for tag in tag_templates}
+        )
+        sequence_segment = next(
+            (s for s in self.compiled.format_segments if s["name"] == "sequence"), {}
+        )
+        padding = sequence_segment.get("padding", 3)
+
+        per_unit, next_sequence = self._next_sequences()
+        plan = []
+        for unit in self.units:
+            key = unit.pk if per_unit else None
+            first = self.start_sequence if self.start_sequence is not None else 1
+            sequence = next_sequence.get(key, first)
+            base = {**hierarchy_values(unit), **self.segment_values}
+            for _ in range(self.count):
+                values = {**base, "sequence": sequence}
+                texts = _FormatValues(
+                    sequence=str(sequence).zfill(
+                        padding if isinstance(padding, int) else 0
+                    ),
+                    unit=unit.code,
+                    unit_name=unit.name,
+                    area=base.get("area", ""),
+                    plant=base.get("plant", ""),
+                )
+                try:
+                    texts["loop_tag"] = self.compiled.format(
+                        {**values, "function": loop_template["function_code"]}
+                    )
+                    tags = []
+                    for tag in tag_templates:
+                        tag_number = self.compiled.format(
+                            {**values, "function": tag["function_code"]}
+                        )
+                        instrument_type = instrument_types[tag["instrument_type"]]
+                        tag_texts = _FormatValues(texts, tag_number=tag_number)
+                        tags.append({
+                            "tag_number": tag_number,
+                            "instrument_type": instrument_type,
+                            "service": _render(tag.get("service"), tag_texts),
+                            "description": _render(tag.get("description"), tag_texts),
+                            "status": tag.get("status", Tag.Status.ACTIVE),
+                            "spec_data": {
+                                **instrument_type.default_spec_data,
+                                **tag.get("spec_data", {}),
+                            },
+                        })
+                except ValueError as e:
+                    raise TypicalLoopError([str(e)])
+                plan.append({
+                    "unit": unit,
+                    "sequence": sequence,
+                    "suffix": texts["sequence"],
+                    "loop_tag": texts["loop_tag"],
+                    "description": _render(loop_template.get("description"), texts),
+                    "tags": tags,
+                })
+                sequence += 1
+            next_sequence[key] = sequence
+        return plan
+
+    # -------------------------------------------------------------------------
+    # Checks
+    # -------------------------------------------------------------------------
+
+    def _check(self, plan):
+        errors = []
+        loop_tags = [instance["loop_tag"] for instance in plan]
+        tag_keys = [
+            (instance["unit"].pk, tag["tag_number"])
+            for instance in plan
+            for tag in instance["tags"]
+        ]
+
+        # Naming pattern, one pass over every generated name
+        names = loop_tags + [tag_number for _unit, tag_number in tag_keys]
+        for result in self.compiled.validate_many(names):
+            if not result["valid"]:
+                errors.append(
+                    f"'{result['tag_number']}' does not match naming convention "
+                    f"'{self.convention.name}'."
+                )
+
+        # Duplicates within the batch
+        if len(set(loop_tags)) != len(loop_tags):
+            errors.append(
+                "Generated loop tags are not unique "
+                "(does the convention have a sequence segment?)."
+            )
+        if len(set(tag_keys)) != len(tag_keys):
+            errors.append("Generated tag numbers are not unique within a unit.")
+
+        # Existing loops and tags, one query each
+        taken_loops = Loop.objects.filter(loop_tag__in=loop_tags).values_list(
+            "loop_tag", flat=True
+        )
+        errors.extend(
+            f"Loop {loop_tag} already exists."
+            for loop_tag in taken_loops[:MAX_REPORTED_ERRORS]
+        )
+        wanted = set(tag_keys)
+        taken_tags = Tag.objects.filter(
+            unit__in=self.units,
+            tag_number__in={tag_number for _unit, tag_number in tag_keys},
+        ).values_list("unit_id", "tag_number")
+        errors.extend(
+            f"Tag {tag_number} already exists in unit {unit_id}."
+            for unit_id, tag_number in taken_tags.iterator()
+            if (unit_id, tag_number) in wanted
+        )
+
+        if errors:
+            raise TypicalLoopError(errors[:MAX_REPORTED_ERRORS])
+
+    # -------------------------------------------------------------------------
+    # Writing
+    # -------------------------------------------------------------------------
+
+    def _create(self, plan):
+        loops = [
+            Loop(
+                loop_tag=instance["loop_tag"],
+                function=self.typical.function,
+                suffix=instance["suffix"],
+                unit=instance["unit"],
+                description=instance["description"],
+            )
+            for instance in plan
+        ]
+        Loop.objects.bulk_create(loops, batch_size=BATCH_SIZE)
+        audit_created(loops)
+
+        tags = []
+        for instance, loop in zip(plan, loops):
+            instance["loop"] = loop
+            tags.extend(
+                Tag(unit=instance["unit"], loop=loop, **tag) for tag in instance["tags"]
+            )
+        since = current_revision()
+        Tag.objects.bulk_create(tags, batch_size=BATCH_SIZE)
+        audit_tag_revisions(since)
+        bump_generation_on_commit(Loop)
+        bump_generation_on_commit(Tag)
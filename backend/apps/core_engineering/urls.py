@@ -14,6 +14,7 @@ from .views import (
     LoopViewSet,
     InstrumentTypeViewSet,
     TagViewSet,
+    TypicalLoopViewSet,
 )
 
 app_name = "core_engineering"
@@ -29,6 +30,7 @@ router.register(r"hierarchy", PlantHierarchyViewSet, basename="hierarchy")
 router.register(r"loops", LoopViewSet, basename="loop")
 router.register(r"instrument-types", InstrumentTypeViewSet, basename="instrument-type")
 router.register(r"tags", TagViewSet, basename="tag")
+router.register(r"typical-loops", TypicalLoopViewSet, basename="typical-loop")
 
 urlpatterns = [
     path("", include(router.urls)),
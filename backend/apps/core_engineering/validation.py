@@ -0,0 +1,212 @@
+"""
+Spec Data Validation - compiled JSON Schema validators for InstrumentType.
+
+Building a jsonschema validator means re-checking the schema against its
+meta-schema and resolving the validator class, which is far more expensive
+than validating a small spec_data document. Validators are therefore
+compiled once per process and cached by tenant schema and instrument type
+id (ids repeat across tenants). Each entry remembers a digest of the
+canonical schema_template JSON, so an edited schema is recompiled on its
+next use without explicit invalidation across worker processes - including
+queryset updates, which don't touch updated_at, and edited unsaved instances.
+"""
+
+import hashlib
+import json
+
+import jsonschema
+from django.db import connection
+from jsonschema.exceptions import best_match
+
+# (schema_name, instrument_type_id) -> (schema digest, validator or error message)
+_validator_cache = {}
+
+
+def _cache_key(instrument_type_id):
+    return (getattr(connection, "schema_name", None), instrument_type_id)
+
+
+def schema_digest(schema):
+    """Digest of the canonical JSON of a schema (key order doesn't matter)."""
+    canonical = json.dumps(schema, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def compile_validator(schema):
+    """
+    Check a schema and build a validator for it.
+    Returns a validator instance, or an error message if the schema is invalid.
+    """
+    validator_class = jsonschema.validators.validator_for(schema)
+    try:
+        validator_class.check_schema(schema)
+    except jsonschema.SchemaError as e:
+        return f"Invalid schema: {e.message}"
+    return validator_class(schema)
+
+
+def get_validator(instrument_type):
+    """
+    Return the compiled validator (or schema error message) for an instrument type.
+    Unsaved instrument types are compiled but not cached.
+    """
+    schema = instrument_type.schema_template
+    if instrument_type.pk is None:
+        return compile_validator(schema)
+
+    key = _cache_key(instrument_type.pk)
+    digest = schema_digest(schema)
+    cached = _validator_cache.get(key)
+    if cached is not None and cached[0] == digest:
+        return cached[1]
+
+    validator = compile_validator(schema)
+    _validator_cache[key] = (digest, validator)
+    return validator
+
+
+def run_validator(validator, spec_data, all_errors=False):
+    """
+    Validate spec_data with a compiled validator.
+
+    By default only the most relevant error is reported, matching
+    jsonschema.validate(). With all_errors=True every error is collected
+    in a single pass.
+    Returns (is_valid, errors).
+    """
+    if isinstance(validator, str):
+        return False, [validator]
+
+    if all_errors:
+        errors = [error.message for error in validator.iter_errors(spec_data)]
+        return not errors, errors
+
+    error = best_match(validator.iter_errors(spec_data))
+    if error is None:
+        return True, []
+    return False, [str(error.message)]
+
+
+def invalidate_validator(instrument_type_id):
+    """Drop the cached validator of an instrument type in the current tenant."""
+    _validator_cache.pop(_cache_key(instrument_type_id), None)
+
+
+def clear_validator_cache():
+    """Drop all cached validators."""
+    _validator_cache.clear()
+
+
+# =============================================================================
+# Batch validation
+# =============================================================================
+
+def _is_type_ref(value):
+    # bool is an int subclass: True must not resolve instrument type 1
+    return isinstance(value, (int, str)) and not isinstance(value, bool)
+
+
+def resolve_instrument_types(type_refs):
+    """
+    Look up instrument types referenced by id (int) or code (str) in the
+    reference data cache (see refcache.py).
+    Returns a dict mapping each found reference to its InstrumentType.
+    """
+    from .refcache import instrument_types
+
+    ids = {
+        ref for ref in type_refs if isinstance(ref, int) and not isinstance(ref, bool)
+    }
+    codes = {ref for ref in type_refs if isinstance(ref, str)}
+    if not ids and not codes:
+        return {}
+
+    resolved = {}
+    for instrument_type in instrument_types().values():
+        if instrument_type.pk in ids:
+            resolved[instrument_type.pk] = instrument_type
+        if instrument_type.code in codes:
+            resolved[instrument_type.code] = instrument_type
+    return resolved
+
+
+def iter_validate_spec_batch(rows, all_errors=False):
+    """
+    Validate many (instrument_type, spec_data) rows, yielding one result per row.
+
+    Each row is a dict with "instrument_type" (id or code) and "spec_data".
+    Rows are grouped by instrument type: every distinct type is loaded and
+    compiled once, then its validator is reused for all rows of that type.
+    Results are yielded in input order, so arbitrarily large inputs can be
+    streamed:
+
+        {"index": 0, "instrument_type": "FT", "valid": False, "errors": [...]}
+    """
+    if isinstance(rows, (list, tuple)):
+        instrument_types = resolve_instrument_types(
+            {
+                row.get("instrument_type")
+                for row in rows
+                if isinstance(row, dict) and _is_type_ref(row.get("instrument_type"))
+            }
+        )
+    else:
+        instrument_types = {}
+
+    # type reference -> compiled validator, None (no schema) or error message
+    validators = {}
+
+    for index, row in enumerate(rows):
+        result = {"index": index, "instrument_type": None, "valid": False, "errors": []}
+        if not isinstance(row, dict):
+            result["errors"] = ["Row must be an object."]
+            yield result
+            continue
+
+        type_ref = row.get("instrument_type")
+        spec_data = row.get("spec_data") or {}
+        result["instrument_type"] = type_ref
+
+        if not _is_type_ref(type_ref):
+            result["errors"] = ["instrument_type is required (id or code)."]
+            yield result
+            continue
+        if not isinstance(spec_data, dict):
+            result["errors"] = ["spec_data must be an object."]
+            yield result
+            continue
+
+        if type_ref not in validators:
+            if type_ref not in instrument_types:
+                instrument_types.update(resolve_instrument_types({type_ref}))
+            instrument_type = instrument_types.get(type_ref)
+            if instrument_type is None:
+                validators[type_ref] = f"Instrument type '{type_ref}' not found."
+            elif not instrument_type.schema_template:
+                validators[type_ref] = None
+            else:
+                validators[type_ref] = get_validator(instrument_type)
+
+        validator = validators[type_ref]
+        if validator is None:
+            result["valid"] = True
+        else:
+            result["valid"], result["errors"] = run_validator(
+                validator, spec_data, all_errors=all_errors
+            )
+        yield result
+
+
+def validate_spec_batch(rows, all_errors=False):
+    """
+    Validate many rows at once.
+    Returns a summary dict with total/valid/invalid counts and per-row results.
+    """
+    results = list(iter_validate_spec_batch(rows, all_errors=all_errors))
+    invalid = sum(1 for result in results if not result["valid"])
+    return {
+        "total": len(results),
+        "valid": len(results) - invalid,
+        "invalid": invalid,
+        "results": results,
+    }
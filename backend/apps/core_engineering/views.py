@@ -2,15 +2,61 @@
 Core Engineering Views - DRF ViewSets for all models
 """
 
-from django.db.models import Q
+import json
+
+from django.db.models import Count
+from django.http import FileResponse, StreamingHttpResponse
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django_filters.rest_framework import DjangoFilterBackend
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
 
-from .models import Client, Site, Plant, PlantHierarchy, Loop, InstrumentType, Tag, NamingConvention
+from apps.core.pagination import KeysetPagination
+from apps.core.params import query_flag
+
+from .bulk import TagBulkUpdateError, TagBulkUpdater
+from .conditional import ConditionalGetMixin
+from .exporters import (
+    EXPORT_FORMATS,
+    ExportError,
+    iter_export_rows,
+    resolve_columns,
+    stream_csv,
+    stream_ndjson,
+    write_xlsx,
+)
+from .fastpath import FastReadMixin
+from .filters import SPEC_FILTER_PREFIX, PlantHierarchyFilter, TagFilter
+from .hierarchy import build_hierarchy_tree
+from .history import (
+    HistoryError,
+    changes_between,
+    current_point,
+    parse_point,
+    revisions_between,
+    state_as_dict,
+    states_as_of,
+    units_under,
+)
+from .importers import TagImporter, TagImportError, read_rows
+from .models import (
+    Client,
+    Site,
+    Plant,
+    PlantHierarchy,
+    Loop,
+    InstrumentType,
+    Tag,
+    NamingConvention,
+    TypicalLoop,
+)
+from .projection import PROJECTION_PARAMETERS, SparseFieldsetMixin
+from .refcache import cached
+from .search import DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT, search_tags
 from .serializers import (
     ClientSerializer,
     SiteSerializer,
@@ -21,58 +67,157 @@ from .serializers import (
     LoopSerializer,
     InstrumentTypeSerializer,
     InstrumentTypeListSerializer,
+    SpecValidationBatchSerializer,
     TagSerializer,
     TagListSerializer,
+    TagSearchResultSerializer,
     TagBulkUpdateSerializer,
+    TagNumberBatchSerializer,
+    TagRevisionSerializer,
+    TypicalLoopSerializer,
+    TypicalLoopInstantiateSerializer,
 )
+from .typicals import TypicalLoopError, TypicalLoopInstantiator
+from .validation import iter_validate_spec_batch, validate_spec_batch
+
+
+class MergePatchParser(JSONParser):
+    """JSON Merge Patch (RFC 7396) request bodies."""
+
+    media_type = "application/merge-patch+json"
+
+
+class JSONPatchParser(JSONParser):
+    """JSON Patch (RFC 6902) request bodies."""
+
+    media_type = "application/json-patch+json"
 
 
 @extend_schema_view(
-    list=extend_schema(summary="List all plant hierarchy nodes"),
-    retrieve=extend_schema(summary="Get a specific hierarchy node"),
+    list=extend_schema(
+        summary="List all plant hierarchy nodes", parameters=PROJECTION_PARAMETERS
+    ),
+    retrieve=extend_schema(
+        summary="Get a specific hierarchy node", parameters=PROJECTION_PARAMETERS
+    ),
     create=extend_schema(summary="Create a new hierarchy node"),
     update=extend_schema(summary="Update a hierarchy node"),
     partial_update=extend_schema(summary="Partially update a hierarchy node"),
     destroy=extend_schema(summary="Delete a hierarchy node"),
 )
-class PlantHierarchyViewSet(viewsets.ModelViewSet):
+class PlantHierarchyViewSet(
+    ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet
+):
     """
     ViewSet for PlantHierarchy model.
     Provides CRUD operations and tree structure endpoints.
     """
 
-    queryset = PlantHierarchy.objects.all()
+    queryset = PlantHierarchy.objects.select_related("parent")
     serializer_class = PlantHierarchySerializer
     permission_classes = [AllowAny]  # TODO: Change to IsAuthenticated in production
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ["node_type", "is_active", "parent"]
+    filterset_class = PlantHierarchyFilter
     search_fields = ["name", "code", "description"]
-    ordering_fields = ["code", "name", "created_at"]
+    ordering_fields = ["code", "name", "path", "created_at"]
     ordering = ["tree_id", "lft"]
+    conditional_actions = ("list", "retrieve", "tree", "units", "children")
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.wants_field("children_count"):
+            queryset = queryset.annotate(children_count=Count("children"))
+        return queryset
 
     @extend_schema(
         summary="Get plant hierarchy as tree",
-        description="Returns the entire plant hierarchy as a nested tree structure",
+        description=(
+            "Returns the plant hierarchy as a nested tree structure. "
+            "The whole forest (or subtree) is loaded with a single query."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="root",
+                description="Return only the subtree of this node ID",
+                required=False,
+                type=int,
+            ),
+            OpenApiParameter(
+                name="max_depth",
+                description="Number of levels below the top node(s) to include",
+                required=False,
+                type=int,
+            ),
+            OpenApiParameter(
+                name="include_inactive",
+                description="Include inactive top-level nodes",
+                required=False,
+                type=bool,
+            ),
+            OpenApiParameter(
+                name="prune_inactive",
+                description=(
+                    "Drop inactive nodes below the top level with their subtree"
+                ),
+                required=False,
+                type=bool,
+            ),
+        ],
+        responses={200: PlantHierarchyTreeSerializer(many=True)},
     )
     @action(detail=False, methods=["get"])
     def tree(self, request):
         """Return the hierarchy as a nested tree structure."""
-        roots = PlantHierarchy.objects.root_nodes().filter(is_active=True)
-        serializer = PlantHierarchyTreeSerializer(roots, many=True)
-        return Response(serializer.data)
+        root = None
+        root_id = request.query_params.get("root")
+        if root_id:
+            try:
+                root = PlantHierarchy.objects.get(pk=int(root_id))
+            except (ValueError, PlantHierarchy.DoesNotExist):
+                return Response(
+                    {"error": f"Hierarchy node {root_id} not found"},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+
+        max_depth = request.query_params.get("max_depth")
+        if max_depth is not None:
+            try:
+                max_depth = int(max_depth)
+                if max_depth < 0:
+                    raise ValueError
+            except ValueError:
+                return Response(
+                    {"error": "max_depth must be a non-negative integer"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        return Response(
+            build_hierarchy_tree(
+                root=root,
+                max_depth=max_depth,
+                include_inactive=query_flag(request, "include_inactive"),
+                prune_inactive=query_flag(request, "prune_inactive"),
+            )
+        )
 
     @extend_schema(
         summary="Get all units",
-        description="Returns all UNIT type nodes (for dropdowns)",
+        description=(
+            "Returns all active UNIT type nodes (for dropdowns), served from the "
+            "reference data cache until the hierarchy changes"
+        ),
+        responses={200: PlantHierarchySerializer(many=True)},
     )
     @action(detail=False, methods=["get"])
     def units(self, request):
         """Return all UNIT nodes for selection dropdowns."""
-        units = PlantHierarchy.objects.filter(
-            node_type=PlantHierarchy.NodeType.UNIT, is_active=True
-        )
-        serializer = PlantHierarchySerializer(units, many=True)
-        return Response(serializer.data)
+        def load():
+            units = PlantHierarchy.objects.select_related("parent").annotate(
+                children_count=Count("children")
+            ).filter(node_type=PlantHierarchy.NodeType.UNIT, is_active=True)
+            return list(PlantHierarchySerializer(units, many=True).data)
+
+        return Response(cached("unit_choices", PlantHierarchy, load))
 
     @extend_schema(
         summary="Get children of a node",
@@ -82,33 +227,47 @@ class PlantHierarchyViewSet(viewsets.ModelViewSet):
     def children(self, request, pk=None):
         """Return direct children of a node."""
         node = self.get_object()
-        children = node.get_children()
+        children = node.get_children().annotate(children_count=Count("children"))
         serializer = PlantHierarchySerializer(children, many=True)
         return Response(serializer.data)
 
 
 @extend_schema_view(
-    list=extend_schema(summary="List all loops"),
-    retrieve=extend_schema(summary="Get a specific loop"),
+    list=extend_schema(summary="List all loops", parameters=PROJECTION_PARAMETERS),
+    retrieve=extend_schema(
+        summary="Get a specific loop", parameters=PROJECTION_PARAMETERS
+    ),
     create=extend_schema(summary="Create a new loop"),
     update=extend_schema(summary="Update a loop"),
     partial_update=extend_schema(summary="Partially update a loop"),
     destroy=extend_schema(summary="Delete a loop"),
 )
-class LoopViewSet(viewsets.ModelViewSet):
+class LoopViewSet(
+    ConditionalGetMixin, FastReadMixin, SparseFieldsetMixin, viewsets.ModelViewSet
+):
     """
     ViewSet for Loop model.
     Provides CRUD operations for control loops.
     """
 
-    queryset = Loop.objects.select_related("unit").all()
+    queryset = Loop.objects.select_related("unit")
     serializer_class = LoopSerializer
     permission_classes = [AllowAny]  # TODO: Change to IsAuthenticated in production
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ["function", "is_active", "unit"]
+    pagination_class = KeysetPagination
     search_fields = ["loop_tag", "description"]
     ordering_fields = ["loop_tag", "function", "created_at"]
     ordering = ["loop_tag"]
+    fast_read_actions = ("tags",)
+    conditional_actions = ("list", "retrieve", "tags")
+    conditional_models = (PlantHierarchy, Tag, InstrumentType)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.wants_field("tags_count"):
+            queryset = queryset.annotate(tags_count=Count("tags"))
+        return queryset
 
     @extend_schema(
         summary="Get tags in this loop",
@@ -119,19 +278,27 @@ class LoopViewSet(viewsets.ModelViewSet):
         """Return all tags in this loop."""
         loop = self.get_object()
         tags = loop.tags.select_related("unit", "instrument_type").all()
+        if self.fast_read_enabled():
+            return self.fast_read_response(tags, TagListSerializer, paginate=False)
         serializer = TagListSerializer(tags, many=True)
         return Response(serializer.data)
 
 
 @extend_schema_view(
-    list=extend_schema(summary="List all instrument types"),
-    retrieve=extend_schema(summary="Get a specific instrument type"),
+    list=extend_schema(
+        summary="List all instrument types", parameters=PROJECTION_PARAMETERS
+    ),
+    retrieve=extend_schema(
+        summary="Get a specific instrument type", parameters=PROJECTION_PARAMETERS
+    ),
     create=extend_schema(summary="Create a new instrument type"),
     update=extend_schema(summary="Update an instrument type"),
     partial_update=extend_schema(summary="Partially update an instrument type"),
     destroy=extend_schema(summary="Delete an instrument type"),
 )
-class InstrumentTypeViewSet(viewsets.ModelViewSet):
+class InstrumentTypeViewSet(
+    ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet
+):
     """
     ViewSet for InstrumentType model.
     Provides CRUD operations for instrument type definitions.
@@ -144,15 +311,52 @@ class InstrumentTypeViewSet(viewsets.ModelViewSet):
     search_fields = ["name", "code", "description"]
     ordering_fields = ["code", "name", "category", "created_at"]
     ordering = ["code"]
+    conditional_actions = ("list", "retrieve", "choices")
+    conditional_models = (Tag,)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Skip the GROUP BY when tags_count isn't rendered
+        if self.wants_field("tags_count"):
+            queryset = queryset.annotate(tags_count=Count("tags"))
+        return queryset
 
     def get_serializer_class(self):
-        if self.action == "list":
+        # A sparse fieldset may pick any field, so it starts from the full serializer
+        if self.action == "list" and not self.projection_requested():
             return InstrumentTypeListSerializer
         return InstrumentTypeSerializer
 
+    @extend_schema(
+        summary="Get instrument types for selection",
+        description=(
+            "Returns all active instrument types ordered by code (for dropdowns), "
+            "served from the reference data cache until an instrument type changes"
+        ),
+        responses={200: InstrumentTypeListSerializer(many=True)},
+    )
+    @action(detail=False, methods=["get"])
+    def choices(self, request):
+        """Return active instrument types for selection dropdowns."""
+        def load():
+            instrument_types = InstrumentType.objects.filter(
+                is_active=True
+            ).order_by("code")
+            return list(InstrumentTypeListSerializer(instrument_types, many=True).data)
+
+        return Response(cached("instrument_type_choices", InstrumentType, load))
+
     @extend_schema(
         summary="Validate spec data against schema",
         description="Validates provided spec_data against this instrument type's schema_template",
+        parameters=[
+            OpenApiParameter(
+                name="all_errors",
+                description="Report every validation error instead of the first",
+                required=False,
+                type=bool,
+            ),
+        ],
         request={"application/json": {"type": "object"}},
         responses={200: {"type": "object", "properties": {"valid": {"type": "boolean"}, "errors": {"type": "array"}}}},
     )
@@ -161,20 +365,68 @@ class InstrumentTypeViewSet(viewsets.ModelViewSet):
         """Validate spec_data against the instrument type's schema."""
         instrument_type = self.get_object()
         spec_data = request.data
-        
-        is_valid, errors = instrument_type.validate_spec_data(spec_data)
+        all_errors = query_flag(request, "all_errors")
+
+        is_valid, errors = instrument_type.validate_spec_data(
+            spec_data, all_errors=all_errors
+        )
         return Response({"valid": is_valid, "errors": errors})
 
+    @extend_schema(
+        summary="Validate spec data in batch",
+        description=(
+            "Validates many (instrument_type, spec_data) rows in one request. "
+            "Rows are grouped by instrument type and each type's compiled schema "
+            "validator is reused. Pass ?stream=true to receive results as "
+            "NDJSON lines instead of a single JSON document."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="stream",
+                description="Stream per-row results as NDJSON",
+                required=False,
+                type=bool,
+            ),
+        ],
+        request=SpecValidationBatchSerializer,
+        responses={200: {"type": "object", "properties": {
+            "total": {"type": "integer"},
+            "valid": {"type": "integer"},
+            "invalid": {"type": "integer"},
+            "results": {"type": "array"},
+        }}},
+    )
+    @action(detail=False, methods=["post"])
+    def validate_batch(self, request):
+        """Validate spec_data for many rows at once."""
+        serializer = SpecValidationBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        rows = serializer.validated_data["rows"]
+        all_errors = serializer.validated_data["all_errors"]
+
+        if query_flag(request, "stream"):
+            results = iter_validate_spec_batch(rows, all_errors=all_errors)
+            return StreamingHttpResponse(
+                (json.dumps(result) + "\n" for result in results),
+                content_type="application/x-ndjson",
+            )
+
+        return Response(validate_spec_batch(rows, all_errors=all_errors))
+
 
 @extend_schema_view(
-    list=extend_schema(summary="List all tags"),
-    retrieve=extend_schema(summary="Get a specific tag"),
+    list=extend_schema(summary="List all tags", parameters=PROJECTION_PARAMETERS),
+    retrieve=extend_schema(
+        summary="Get a specific tag", parameters=PROJECTION_PARAMETERS
+    ),
     create=extend_schema(summary="Create a new tag"),
     update=extend_schema(summary="Update a tag"),
     partial_update=extend_schema(summary="Partially update a tag"),
     destroy=extend_schema(summary="Delete a tag"),
 )
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(
+    ConditionalGetMixin, FastReadMixin, SparseFieldsetMixin, viewsets.ModelViewSet
+):
     """
     ViewSet for Tag model.
     Provides CRUD operations for instrument tags.
@@ -183,19 +435,35 @@ class TagViewSet(viewsets.ModelViewSet):
     queryset = Tag.objects.select_related("unit", "loop", "instrument_type").all()
     permission_classes = [AllowAny]  # TODO: Change to IsAuthenticated in production
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ["status", "unit", "loop", "instrument_type"]
+    filterset_class = TagFilter
+    pagination_class = KeysetPagination
     search_fields = ["tag_number", "service", "description"]
     ordering_fields = ["tag_number", "status", "revision", "created_at", "updated_at"]
     ordering = ["tag_number"]
+    fast_read_actions = ("list", "by_unit")
+    conditional_actions = ("list", "retrieve", "by_unit")
+    conditional_models = (PlantHierarchy, Loop, InstrumentType)
 
     def get_serializer_class(self):
-        if self.action == "list":
+        # A sparse fieldset may pick any field, so it starts from the full serializer
+        if self.action == "list" and not self.projection_requested():
             return TagListSerializer
         return TagSerializer
 
+    def list(self, request, *args, **kwargs):
+        if self.fast_read_enabled():
+            queryset = self.filter_queryset(self.get_queryset())
+            return self.fast_read_response(queryset, TagListSerializer)
+        return super().list(request, *args, **kwargs)
+
     @extend_schema(
         summary="Bulk update tags",
-        description="Update multiple tags at once (status, loop assignment)",
+        description=(
+            "Set status, unit, loop, instrument type, service, description and/or "
+            "spec_data keys on many tags at once. The changes are validated like "
+            "Tag.save() (loop/unit consistency, unique tag numbers, spec_data schema) "
+            "and applied in one transaction; each tag's revision is incremented."
+        ),
         request=TagBulkUpdateSerializer,
         responses={200: {"type": "object", "properties": {"updated": {"type": "integer"}}}},
     )
@@ -204,46 +472,320 @@ class TagViewSet(viewsets.ModelViewSet):
         """Bulk update multiple tags."""
         serializer = TagBulkUpdateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        
-        ids = serializer.validated_data["ids"]
-        update_fields = {}
-        
-        if "status" in serializer.validated_data:
-            update_fields["status"] = serializer.validated_data["status"]
-        if "loop" in serializer.validated_data:
-            update_fields["loop"] = serializer.validated_data["loop"]
-        
-        if not update_fields:
+
+        changes = dict(serializer.validated_data)
+        ids = changes.pop("ids")
+        spec_patch = changes.pop("spec_data", None)
+        if not changes and not spec_patch:
             return Response(
                 {"error": "No fields to update"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        
-        updated = Tag.objects.filter(id__in=ids).update(**update_fields)
+
+        try:
+            updated = TagBulkUpdater(ids, changes, spec_patch=spec_patch).run()
+        except TagBulkUpdateError as e:
+            return Response(
+                {"error": str(e), "errors": e.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response({"updated": updated})
+
+    @extend_schema(
+        summary="Patch a tag's spec_data",
+        description=(
+            "Apply a JSON Merge Patch (object, application/merge-patch+json) or a "
+            "JSON Patch (array, application/json-patch+json) to spec_data in the "
+            "database. The result is validated against the instrument type schema "
+            "and the revision is incremented."
+        ),
+        request={
+            "application/merge-patch+json": {"type": "object"},
+            "application/json-patch+json": {
+                "type": "array",
+                "items": {"type": "object"},
+            },
+        },
+        responses={200: {"type": "object", "properties": {
+            "id": {"type": "integer"},
+            "revision": {"type": "integer"},
+            "spec_data": {"type": "object"},
+        }}},
+    )
+    @action(
+        detail=True,
+        methods=["patch"],
+        url_path="spec_data",
+        parser_classes=[JSONParser, MergePatchParser, JSONPatchParser],
+    )
+    def patch_spec_data(self, request, pk=None):
+        """Patch one tag's spec_data."""
+        tag = self.get_object()
+        _updated, error = self._apply_spec_patch(request, [tag.pk])
+        if error is not None:
+            return error
+        return Response(
+            Tag.objects.filter(pk=tag.pk).values("id", "revision", "spec_data").get()
+        )
+
+    @extend_schema(
+        summary="Patch spec_data of all filtered tags",
+        description=(
+            "Apply a JSON Merge Patch or JSON Patch to spec_data of every tag "
+            "matching the query filters (e.g. ?instrument_type=3&unit=12) in one "
+            "UPDATE. Only the affected instrument types' schemas are checked; "
+            "nothing is written if any tag would become invalid. At least one "
+            "filter is required."
+        ),
+        request={
+            "application/merge-patch+json": {"type": "object"},
+            "application/json-patch+json": {
+                "type": "array",
+                "items": {"type": "object"},
+            },
+        },
+        responses={
+            200: {"type": "object", "properties": {"updated": {"type": "integer"}}}
+        },
+    )
+    @action(
+        detail=False,
+        methods=["patch"],
+        url_path="spec_data",
+        parser_classes=[JSONParser, MergePatchParser, JSONPatchParser],
+    )
+    def bulk_patch_spec_data(self, request):
+        """Patch spec_data of the filtered tags."""
+        filters_given = any(
+            name in TagFilter.base_filters
+            or name.startswith(SPEC_FILTER_PREFIX)
+            or name == "search"
+            for name in request.query_params
+        )
+        if not filters_given:
+            return Response(
+                {"error": "At least one filter is required to patch tags in bulk"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        ids = list(queryset.values_list("pk", flat=True))
+        updated, error = self._apply_spec_patch(request, ids)
+        if error is not None:
+            return error
         return Response({"updated": updated})
 
+    def _apply_spec_patch(self, request, ids):
+        """Run a spec_data patch; returns (updated, error Response or None)."""
+        patch = request.data
+        content_type = request.content_type
+        if content_type.startswith(JSONPatchParser.media_type) and not isinstance(
+            patch, list
+        ):
+            return 0, Response(
+                {"error": "A JSON Patch must be an array of operations"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if content_type.startswith(MergePatchParser.media_type) and not isinstance(
+            patch, dict
+        ):
+            return 0, Response(
+                {"error": "A merge patch must be an object"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not patch:
+            return 0, Response(
+                {"error": "The patch is empty"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            return TagBulkUpdater(ids, spec_patch=patch).run(), None
+        except TagBulkUpdateError as e:
+            return 0, Response(
+                {"error": str(e), "errors": e.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+    @extend_schema(
+        summary="Import tags from CSV/XLSX",
+        description=(
+            "Bulk-loads tags from an uploaded spreadsheet. Units are referenced by "
+            "path or unique code, loops by loop tag and instrument types by code; "
+            "spec_data comes from a JSON 'spec_data' column and/or 'spec_data.<key>' "
+            "columns. Valid rows are loaded in one transaction; invalid rows are "
+            "reported with their row number and errors."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="update_existing",
+                description="Update tags that already exist (default true)",
+                required=False,
+                type=bool,
+            ),
+            OpenApiParameter(
+                name="dry_run",
+                description="Validate only, don't write anything",
+                required=False,
+                type=bool,
+            ),
+        ],
+        request={
+            "multipart/form-data": {
+                "type": "object",
+                "properties": {"file": {"type": "string", "format": "binary"}},
+            }
+        },
+        responses={200: {"type": "object", "properties": {
+            "total": {"type": "integer"},
+            "created": {"type": "integer"},
+            "updated": {"type": "integer"},
+            "unchanged": {"type": "integer"},
+            "skipped": {"type": "integer"},
+            "invalid": {"type": "integer"},
+            "dry_run": {"type": "boolean"},
+            "errors": {"type": "array"},
+        }}},
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        parser_classes=[MultiPartParser, FormParser],
+    )
+    def import_file(self, request):
+        """Bulk import tags from a CSV or XLSX file."""
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response(
+                {"error": "A 'file' upload is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        importer = TagImporter(
+            update_existing=query_flag(request, "update_existing", default=True),
+            dry_run=query_flag(request, "dry_run"),
+        )
+        try:
+            report = importer.run(read_rows(upload, upload.name))
+        except TagImportError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(report)
+
+    @extend_schema(
+        summary="Export the instrument index",
+        description=(
+            "Streams all tags matching the list filters as CSV, XLSX or NDJSON. "
+            "Rows are read with a server-side cursor, so memory use stays flat "
+            "regardless of the number of tags. Columns are selectable and include "
+            "flattened 'spec_data.<key>' values; 'spec_data.*' expands to every "
+            "spec key of the exported instrument types."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="file_format",
+                description="csv (default), xlsx or ndjson",
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="columns",
+                description="Comma-separated column names",
+                required=False,
+                type=str,
+            ),
+        ],
+        responses={(200, "text/csv"): OpenApiTypes.BINARY},
+    )
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Stream the instrument index in the requested file format."""
+        file_format = request.query_params.get("file_format", "csv").lower()
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {
+                    "error": f"Unsupported file_format '{file_format}'. "
+                    "Use csv, xlsx or ndjson."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        requested = request.query_params.get("columns")
+        try:
+            columns = resolve_columns(
+                requested.split(",") if requested else None, queryset
+            )
+            rows = iter_export_rows(queryset, columns)
+            content_type, extension = EXPORT_FORMATS[file_format]
+            if file_format == "xlsx":
+                response = FileResponse(
+                    write_xlsx(rows, columns), content_type=content_type
+                )
+            elif file_format == "ndjson":
+                response = StreamingHttpResponse(
+                    stream_ndjson(rows, columns), content_type=content_type
+                )
+            else:
+                response = StreamingHttpResponse(
+                    stream_csv(rows, columns), content_type=content_type
+                )
+        except ExportError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        response["Content-Disposition"] = (
+            f'attachment; filename="instrument-index.{extension}"'
+        )
+        return response
+
     @extend_schema(
         summary="Search tags",
-        description="Advanced search across multiple fields",
+        description=(
+            "Relevance-ranked full-text and trigram search across tag number, "
+            "service, description and loop tag. Terms ending in '*' match as "
+            "prefixes (e.g. 'FT-10*'). Matches are highlighted with <mark>."
+        ),
         parameters=[
             OpenApiParameter(name="q", description="Search query", required=True, type=str),
+            OpenApiParameter(
+                name="limit",
+                description=(
+                    f"Maximum results (default {DEFAULT_SEARCH_LIMIT}, "
+                    f"max {MAX_SEARCH_LIMIT})"
+                ),
+                required=False,
+                type=int,
+            ),
+            OpenApiParameter(
+                name="highlight",
+                description="Include highlighted snippets (default true)",
+                required=False,
+                type=bool,
+            ),
         ],
+        responses={200: TagSearchResultSerializer(many=True)},
     )
     @action(detail=False, methods=["get"])
     def search(self, request):
-        """Advanced search for tags."""
+        """Ranked search for tags."""
         query = request.query_params.get("q", "")
         if not query:
             return Response({"error": "Query parameter 'q' is required"}, status=400)
-        
-        tags = Tag.objects.filter(
-            Q(tag_number__icontains=query)
-            | Q(service__icontains=query)
-            | Q(description__icontains=query)
-            | Q(loop__loop_tag__icontains=query)
-        ).select_related("unit", "loop", "instrument_type")[:50]
-        
-        serializer = TagListSerializer(tags, many=True)
+
+        try:
+            limit = int(request.query_params.get("limit", DEFAULT_SEARCH_LIMIT))
+        except ValueError:
+            return Response(
+                {"error": "limit must be an integer"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        tags = search_tags(
+            query,
+            queryset=self.filter_queryset(self.get_queryset()),
+            limit=limit,
+            highlight=query_flag(request, "highlight", default=True),
+        )
+        serializer = TagSearchResultSerializer(tags, many=True)
         return Response(serializer.data)
 
     @extend_schema(
@@ -266,15 +808,261 @@ class TagViewSet(viewsets.ModelViewSet):
         tags = Tag.objects.filter(unit_id=unit_id).select_related(
             "unit", "loop", "instrument_type"
         )
+        if self.fast_read_enabled():
+            return self.fast_read_response(tags, TagListSerializer, paginate=False)
         serializer = TagListSerializer(tags, many=True)
         return Response(serializer.data)
 
+    # -------------------------------------------------------------------------
+    # Revision history (see history.py)
+    # -------------------------------------------------------------------------
+
+    def _history_points(self, request, required=(), optional=()):
+        """Parse points in history from query params; returns (points, error)."""
+        points = {}
+        for name in required + optional:
+            value = request.query_params.get(name)
+            if not value:
+                if name in required:
+                    return None, Response(
+                        {"error": f"Query parameter '{name}' is required"},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                points[name] = None
+                continue
+            try:
+                points[name] = parse_point(value)
+            except HistoryError as e:
+                return None, Response(
+                    {"error": str(e)}, status=status.HTTP_400_BAD_REQUEST
+                )
+        return points, None
+
+    def _history_units(self, request, required=False):
+        """
+        Units at or below the 'unit' hierarchy node; returns (unit ids or None,
+        error Response).
+        """
+        node_id = request.query_params.get("unit")
+        if not node_id:
+            if required:
+                return None, Response(
+                    {"error": "Query parameter 'unit' is required"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return None, None
+        node = None
+        if node_id.isdigit():
+            node = PlantHierarchy.objects.filter(pk=node_id).first()
+        if node is None:
+            return None, Response(
+                {"error": f"Hierarchy node {node_id} not found"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return units_under(node), None
+
+    @extend_schema(
+        summary="Get a tag's revision history",
+        description=(
+            "Field-level changes of one tag, newest first, including tags that have "
+            "since been deleted. Each row's id is the project-wide global revision."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="since",
+                description=(
+                    "Only changes after this snapshot token, revision or date/time"
+                ),
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="until",
+                description=(
+                    "Only changes up to this snapshot token, revision or date/time"
+                ),
+                required=False,
+                type=str,
+            ),
+        ],
+        responses={200: TagRevisionSerializer(many=True)},
+    )
+    @action(detail=True, methods=["get"])
+    def history(self, request, pk=None):
+        """Revision history of one tag."""
+        points, error = self._history_points(request, optional=("since", "until"))
+        if error is not None:
+            return error
+        if not str(pk).isdigit():
+            return Response(
+                {"error": "Tag not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        revisions = revisions_between(points["since"], points["until"]).filter(
+            tag_id=pk
+        )
+        page = self.paginate_queryset(revisions.order_by("-id"))
+        return self.get_paginated_response(TagRevisionSerializer(page, many=True).data)
+
+    @extend_schema(
+        summary="Get a tag as of a point in history",
+        description=(
+            "Reconstructs the tag as it was at a global revision or date/time by "
+            "reverting the changes recorded since."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="as_of",
+                description="Revision number or ISO 8601 date/time",
+                required=True,
+                type=str,
+            ),
+        ],
+    )
+    @action(detail=True, methods=["get"], url_path="as_of")
+    def tag_as_of(self, request, pk=None):
+        """One tag as of a point in history."""
+        points, error = self._history_points(request, required=("as_of",))
+        if error is not None:
+            return error
+        if not str(pk).isdigit():
+            return Response(
+                {"error": "Tag not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        state = states_as_of(points["as_of"], tag_ids=[int(pk)]).get(int(pk))
+        if state is None:
+            return Response(
+                {"error": "The tag did not exist at that point"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(state_as_dict(int(pk), state))
+
+    @extend_schema(
+        summary="Get the tags of a unit as of a point in history",
+        operation_id="engineering_tags_as_of_list",
+        description=(
+            "Reconstructs every tag that was in the unit (or in the units below a "
+            "plant / area node) at a global revision or date/time, including tags "
+            "moved or deleted since."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="as_of",
+                description="Revision number or ISO 8601 date/time",
+                required=True,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="unit",
+                description="Hierarchy node ID",
+                required=True,
+                type=int,
+            ),
+        ],
+    )
+    @action(detail=False, methods=["get"])
+    def as_of(self, request):
+        """Tags of a unit as of a point in history."""
+        points, error = self._history_points(request, required=("as_of",))
+        if error is None:
+            units, error = self._history_units(request, required=True)
+        if error is not None:
+            return error
+
+        states = states_as_of(points["as_of"], units=units)
+        results = sorted(
+            (state_as_dict(tag_id, state) for tag_id, state in states.items()),
+            key=lambda tag: (tag["tag_number"], tag["id"]),
+        )
+        return Response({
+            "as_of": request.query_params["as_of"],
+            "count": len(results),
+            "results": results,
+        })
+
+    @extend_schema(
+        summary="Report tag changes between two points in history",
+        description=(
+            "Net field-level and spec_data key changes of each tag between two "
+            "points in history (e.g. since the last document issue). Revision "
+            "numbers and dates are assigned before commit, so a slow transaction "
+            "can land behind them; 'revision' in the response is a snapshot token "
+            "that is commit-ordered, to be used as 'since' for the next report."
+        ),
+        parameters=[
+            OpenApiParameter(
+                name="since",
+                description=(
+                    "Snapshot token, revision number or ISO 8601 date/time (excluded)"
+                ),
+                required=True,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="until",
+                description=(
+                    "Snapshot token, revision number or ISO 8601 date/time "
+                    "(default: now)"
+                ),
+                required=False,
+                type=str,
+            ),
+            OpenApiParameter(
+                name="unit",
+                description="Hierarchy node ID",
+                required=False,
+                type=int,
+            ),
+            OpenApiParameter(
+                name="tags",
+                description="Comma-separated tag IDs",
+                required=False,
+                type=str,
+            ),
+        ],
+    )
+    @action(detail=False, methods=["get"])
+    def changes(self, request):
+        """Tag changes between two points in history."""
+        points, error = self._history_points(
+            request, required=("since",), optional=("until",)
+        )
+        if error is None:
+            units, error = self._history_units(request)
+        if error is not None:
+            return error
+        try:
+            tag_ids = [
+                int(tag_id)
+                for tag_id in request.query_params.get("tags", "").split(",")
+                if tag_id.strip()
+            ] or None
+        except ValueError:
+            return Response(
+                {"error": "tags must be comma-separated integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Taken before reading: changes committing after it show up next time
+        point = current_point()
+        results = changes_between(
+            points["since"], points["until"] or point, tag_ids=tag_ids, units=units
+        )
+        return Response({
+            "since": request.query_params["since"],
+            "until": request.query_params.get("until"),
+            "revision": str(point),
+            "count": len(results),
+            "results": results,
+        })
+
 
 # =============================================================================
 # Client, Site, Plant ViewSets (Tenant-specific)
 # =============================================================================
 
-class ClientViewSet(viewsets.ModelViewSet):
+class ClientViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for Client model (tenant-specific data)."""
     
     queryset = Client.objects.all()
@@ -285,7 +1073,7 @@ class ClientViewSet(viewsets.ModelViewSet):
     ordering = ["name"]
 
 
-class SiteViewSet(viewsets.ModelViewSet):
+class SiteViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for Site model (tenant-specific data)."""
     
     queryset = Site.objects.select_related("client").all()
@@ -295,9 +1083,10 @@ class SiteViewSet(viewsets.ModelViewSet):
     filterset_fields = ["client"]
     search_fields = ["code", "name", "location"]
     ordering = ["code"]
+    conditional_models = (Client,)
 
 
-class PlantViewSet(viewsets.ModelViewSet):
+class PlantViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     """ViewSet for Plant model (tenant-specific data)."""
     
     queryset = Plant.objects.select_related("site").all()
@@ -307,9 +1096,12 @@ class PlantViewSet(viewsets.ModelViewSet):
     filterset_fields = ["site", "is_active"]
     search_fields = ["code", "name"]
     ordering = ["code"]
+    conditional_models = (Site,)
 
 
-class NamingConventionViewSet(viewsets.ModelViewSet):
+class NamingConventionViewSet(
+    ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet
+):
     """ViewSet for NamingConvention model (tenant-specific data)."""
     
     queryset = NamingConvention.objects.all()
@@ -329,3 +1121,114 @@ class NamingConventionViewSet(viewsets.ModelViewSet):
         convention.is_default = True
         convention.save()
         return Response({"status": "Set as default."})
+
+    @extend_schema(
+        summary="Validate tag numbers in batch",
+        description=(
+            "Validates a list of tag numbers against this convention's compiled "
+            "pattern and returns per-tag results with parsed segment values."
+        ),
+        request=TagNumberBatchSerializer,
+        responses={200: {"type": "object", "properties": {
+            "total": {"type": "integer"},
+            "valid": {"type": "integer"},
+            "invalid": {"type": "integer"},
+            "results": {"type": "array"},
+        }}},
+    )
+    @action(detail=True, methods=["post"])
+    def validate_many(self, request, pk=None):
+        """Validate many tag numbers against this naming convention."""
+        convention = self.get_object()
+        serializer = TagNumberBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        results = convention.validate_many(serializer.validated_data["tag_numbers"])
+        total = len(results)
+        valid = sum(1 for result in results if result["valid"])
+        if serializer.validated_data["only_invalid"]:
+            results = [result for result in results if not result["valid"]]
+
+        return Response({
+            "total": total,
+            "valid": valid,
+            "invalid": total - valid,
+            "results": results,
+        })
+
+
+@extend_schema_view(
+    list=extend_schema(summary="List typical loops", parameters=PROJECTION_PARAMETERS),
+    retrieve=extend_schema(
+        summary="Get a typical loop", parameters=PROJECTION_PARAMETERS
+    ),
+    create=extend_schema(summary="Create a typical loop"),
+    update=extend_schema(summary="Update a typical loop"),
+    partial_update=extend_schema(summary="Partially update a typical loop"),
+    destroy=extend_schema(summary="Delete a typical loop"),
+)
+class TypicalLoopViewSet(
+    ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet
+):
+    """
+    ViewSet for TypicalLoop templates.
+    A typical is instantiated into loops and tags with the instantiate action.
+    """
+
+    queryset = TypicalLoop.objects.all()
+    serializer_class = TypicalLoopSerializer
+    permission_classes = [AllowAny]  # TODO: Change to IsAuthenticated in production
+    filter_backends = [
+        DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter
+    ]
+    filterset_fields = ["function", "is_active"]
+    search_fields = ["name", "description"]
+    ordering = ["name"]
+
+    @extend_schema(
+        summary="Create loops from a typical",
+        description=(
+            "Creates count copies of the typical's loop and tags in each unit. "
+            "Loop tags and tag numbers are built with the naming convention from "
+            "the unit's hierarchy codes, function codes and sequence numbers. "
+            "All names are checked before anything is written, and loops and tags "
+            "are inserted in batches in one transaction."
+        ),
+        request=TypicalLoopInstantiateSerializer,
+        responses={201: {"type": "object", "properties": {
+            "typical": {"type": "string"},
+            "naming_convention": {"type": "string"},
+            "dry_run": {"type": "boolean"},
+            "loops": {"type": "integer"},
+            "tags": {"type": "integer"},
+            "results": {"type": "array"},
+        }}},
+    )
+    @action(detail=True, methods=["post"])
+    def instantiate(self, request, pk=None):
+        """Create loops and tags from this typical."""
+        typical = self.get_object()
+        serializer = TypicalLoopInstantiateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        instantiator = TypicalLoopInstantiator(
+            typical,
+            data["units"],
+            count=data["count"],
+            start_sequence=data.get("start_sequence"),
+            convention=data.get("naming_convention"),
+            segment_values=data.get("segment_values"),
+            dry_run=data["dry_run"],
+        )
+        try:
+            report = instantiator.run()
+        except TypicalLoopError as e:
+            return Response(
+                {"error": str(e), "errors": e.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(
+            report,
+            status=status.HTTP_200_OK if data["dry_run"] else status.HTTP_201_CREATED,
+        )
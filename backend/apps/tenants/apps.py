@@ -5,3 +5,6 @@ class TenantsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.tenants'
     verbose_name = 'Tenants'
+
+    def ready(self):
+        from . import signals  # noqa: F401
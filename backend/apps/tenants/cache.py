@@ -0,0 +1,175 @@
+"""
+Tenant Cache - two-tier cache for resolving ProjectTenant by project id.
+
+Every API request carrying X-Project-ID needs its ProjectTenant to switch the
+database schema. Lookups go through:
+
+1. An in-process LRU (short TTL) - no network or database round trip.
+2. The shared Django cache (Redis) - survives worker restarts and is shared
+   between processes.
+3. The public-schema database table, as a last resort.
+
+Unknown ids are cached too (negative caching) so a bad header can't force
+a query per request. Entries are invalidated on ProjectTenant save/delete
+(see signals.py); other processes pick up changes once their local entry
+expires, so TENANT_CACHE_LOCAL_TTL bounds cross-process staleness.
+"""
+
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import ProjectTenant
+
+logger = logging.getLogger(__name__)
+
+# Marker stored for project ids that don't exist
+MISSING = "__missing__"
+
+_local = OrderedDict()
+_lock = threading.Lock()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cache_key(project_id):
+    return f"tenants:project:{project_id}"
+
+
+def _remember_locally(project_id, value, ttl):
+    maxsize = _setting("TENANT_CACHE_SIZE", 1024)
+    with _lock:
+        _local[project_id] = (time.monotonic() + ttl, value)
+        _local.move_to_end(project_id)
+        while len(_local) > maxsize:
+            _local.popitem(last=False)
+
+
+def _lookup_locally(project_id):
+    with _lock:
+        entry = _local.get(project_id)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= time.monotonic():
+            del _local[project_id]
+            return None
+        _local.move_to_end(project_id)
+        return value
+
+
+def get_tenant(project_id):
+    """
+    Return the ProjectTenant for a project id, or None if it doesn't exist.
+    The returned instance is a copy, safe to attach to the request.
+    """
+    try:
+        project_id = int(project_id)
+    except (TypeError, ValueError):
+        return None
+
+    value = _lookup_locally(project_id)
+    if value is None:
+        try:
+            value = cache.get(_cache_key(project_id))
+        except Exception:
+            logger.warning("Tenant cache read failed", exc_info=True)
+            value = None
+
+        if value is None:
+            tenant = ProjectTenant.objects.filter(pk=project_id).first()
+            value = tenant if tenant is not None else MISSING
+            ttl = (
+                _setting("TENANT_CACHE_TTL", 300)
+                if tenant is not None
+                else _setting("TENANT_CACHE_NEGATIVE_TTL", 30)
+            )
+            try:
+                cache.set(_cache_key(project_id), value, ttl)
+            except Exception:
+                logger.warning("Tenant cache write failed", exc_info=True)
+
+        local_ttl = _setting("TENANT_CACHE_LOCAL_TTL", 30)
+        if value == MISSING:
+            local_ttl = min(local_ttl, _setting("TENANT_CACHE_NEGATIVE_TTL", 30))
+        _remember_locally(project_id, value, local_ttl)
+
+    if isinstance(value, str) and value == MISSING:
+        return None
+    return copy.copy(value)
+
+
+def invalidate_tenant(project_id):
+    """Drop a project from both cache tiers."""
+    with _lock:
+        _local.pop(project_id, None)
+    try:
+        cache.delete(_cache_key(project_id))
+    except Exception:
+        logger.warning("Tenant cache invalidation failed", exc_info=True)
+
+
+def clear_local_tenant_cache():
+    """Empty the in-process tier (e.g. between tests)."""
+    with _lock:
+        _local.clear()
+
+
+# =============================================================================
+# Available projects per user
+# =============================================================================
+
+def _available_projects_key(user_id):
+    return f"tenants:available_projects:{user_id}"
+
+
+def get_available_project_ids(user):
+    """
+    Return the ids of projects a user can access: every project of the user's
+    organization. Cached per user until the user or a project changes.
+    """
+    key = _available_projects_key(user.pk)
+    try:
+        project_ids = cache.get(key)
+    except Exception:
+        logger.warning("Available projects cache read failed", exc_info=True)
+        project_ids = None
+
+    if project_ids is None:
+        project_ids = []
+        if getattr(user, "organization_id", None):
+            project_ids = list(
+                ProjectTenant.objects.filter(
+                    organization_id=user.organization_id
+                ).values_list("id", flat=True)
+            )
+        try:
+            cache.set(key, project_ids, _setting("TENANT_AVAILABLE_PROJECTS_TTL", 300))
+        except Exception:
+            logger.warning("Available projects cache write failed", exc_info=True)
+
+    return project_ids
+
+
+def get_available_projects(user):
+    """Return a ProjectTenant queryset of the projects a user can access."""
+    if user is None or not user.is_authenticated:
+        return ProjectTenant.objects.none()
+    return ProjectTenant.objects.filter(pk__in=get_available_project_ids(user))
+
+
+def invalidate_available_projects(*user_ids):
+    """Drop the cached project lists of the given users."""
+    if not user_ids:
+        return
+    try:
+        cache.delete_many([_available_projects_key(user_id) for user_id in user_ids])
+    except Exception:
+        logger.warning("Available projects cache invalidation failed", exc_info=True)
@@ -0,0 +1,158 @@
+"""
+Tenant Fan-out - run a function in many project schemas concurrently.
+
+Each schema is handled by a worker thread with its own database connection
+(Django connections are per thread), switched to the tenant and bounded by
+a statement_timeout. The caller waits for each schema at most the timeout
+plus a small grace period, counted from when a worker picks the schema up
+(schemas queued behind busy workers get their full time), so one slow
+schema yields a partial result instead of stalling the whole request.
+"""
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any
+
+from django.conf import settings
+from django.db import DatabaseError, connection, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+# Extra wall-clock time allowed for connecting and switching schemas
+FANOUT_GRACE_SECONDS = 0.5
+
+# Longest sleep while waiting, so newly started schemas get their deadline
+FANOUT_POLL_SECONDS = 0.05
+
+# PostgreSQL "query_canceled" (raised when statement_timeout fires)
+QUERY_CANCELED = "57014"
+
+
+@dataclass
+class FanoutResult:
+    """Outcome of running a function in one tenant schema."""
+
+    tenant: Any
+    status: str = "ok"  # ok | timeout | error
+    value: Any = None
+    elapsed_ms: int = 0
+    error: str = ""
+
+
+def _is_query_canceled(exc):
+    cause = exc.__cause__
+    return getattr(cause, "sqlstate", None) == QUERY_CANCELED
+
+
+def _run_in_schema(tenant, func, timeout):
+    started = time.monotonic()
+    result = FanoutResult(tenant=tenant)
+    try:
+        connection.set_tenant(tenant)
+        with transaction.atomic():
+            if timeout and connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SET LOCAL statement_timeout = %s", [int(timeout * 1000)]
+                    )
+            result.value = func(tenant)
+    except Exception as e:
+        if isinstance(e, DatabaseError) and _is_query_canceled(e):
+            result.status = "timeout"
+        else:
+            logger.warning(
+                "Fan-out call failed in %s", tenant.schema_name, exc_info=True
+            )
+            result.status = "error"
+            result.error = "Query failed"
+    finally:
+        # Worker threads don't go through request_finished; close explicitly
+        connections.close_all()
+    result.elapsed_ms = int((time.monotonic() - started) * 1000)
+    return result
+
+
+def _wait_per_schema(futures, started, budget, deadline):
+    """
+    Wait until every future is done or has run for budget seconds since it
+    started (started maps future index -> start time). Nothing is waited
+    for past deadline.
+    """
+    pending = set(range(len(futures)))
+    while True:
+        now = time.monotonic()
+        pending = {
+            index
+            for index in pending
+            if not futures[index].done()
+            and (index not in started or now < started[index] + budget)
+        }
+        if not pending or now >= deadline:
+            return
+        next_deadline = min(
+            [started[index] + budget for index in pending if index in started]
+            + [now + FANOUT_POLL_SECONDS, deadline]
+        )
+        wait(
+            [futures[index] for index in pending],
+            timeout=next_deadline - now,
+            return_when=FIRST_COMPLETED,
+        )
+
+
+def run_in_schemas(tenants, func, timeout=None, max_workers=None):
+    """
+    Call func(tenant) inside each tenant's schema concurrently.
+
+    Returns one FanoutResult per tenant, in input order. Tenants that don't
+    finish within timeout (seconds) of being started are reported with
+    status "timeout"; their queries are cancelled by PostgreSQL's
+    statement_timeout.
+    """
+    tenants = list(tenants)
+    if not tenants:
+        return []
+    if timeout is None:
+        timeout = getattr(settings, "TENANT_FANOUT_TIMEOUT", 5.0)
+    if max_workers is None:
+        max_workers = getattr(settings, "TENANT_FANOUT_WORKERS", 8)
+
+    max_workers = max(1, min(max_workers, len(tenants)))
+    started = {}
+
+    def run(index, tenant):
+        started[index] = time.monotonic()
+        return _run_in_schema(tenant, func, timeout)
+
+    executor = ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="tenant-fanout"
+    )
+    futures = [
+        executor.submit(run, index, tenant) for index, tenant in enumerate(tenants)
+    ]
+    if timeout:
+        # Each schema gets its own budget once started; a worker stuck
+        # outside the database can't hold the queued schemas forever
+        budget = timeout + FANOUT_GRACE_SECONDS
+        rounds = -(-len(tenants) // max_workers)
+        _wait_per_schema(futures, started, budget, time.monotonic() + rounds * budget)
+    else:
+        wait(futures)
+    # Don't block on stragglers; statement_timeout ends their queries
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    results = []
+    for tenant, future in zip(tenants, futures):
+        if future.done() and not future.cancelled():
+            results.append(future.result())
+        else:
+            results.append(
+                FanoutResult(
+                    tenant=tenant,
+                    status="timeout",
+                    elapsed_ms=int(timeout * 1000) if timeout else 0,
+                )
+            )
+    return results
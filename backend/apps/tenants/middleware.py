@@ -7,10 +7,11 @@ This is more suitable for SPA applications with a single domain.
 
 from django.db import connection
 from django.http import JsonResponse
+from django.utils.functional import SimpleLazyObject
 from django_tenants.middleware import TenantMainMiddleware
 from django_tenants.utils import get_public_schema_name
 
-from .models import ProjectTenant
+from .cache import get_available_projects, get_tenant
 
 
 class HeaderBasedTenantMiddleware(TenantMainMiddleware):
@@ -39,14 +40,15 @@ class HeaderBasedTenantMiddleware(TenantMainMiddleware):
         
         if project_id:
             try:
-                tenant = ProjectTenant.objects.get(pk=project_id)
+                # Served from the tenant cache; no query on the hot path
+                tenant = get_tenant(project_id)
+                if tenant is None:
+                    return JsonResponse(
+                        {'error': f'Project with ID {project_id} not found'},
+                        status=404
+                    )
                 connection.set_tenant(tenant)
                 request.tenant = tenant
-            except ProjectTenant.DoesNotExist:
-                return JsonResponse(
-                    {'error': f'Project with ID {project_id} not found'},
-                    status=404
-                )
             except Exception as e:
                 return JsonResponse(
                     {'error': f'Error switching to project: {str(e)}'},
@@ -65,6 +67,11 @@ class TenantContextMiddleware:
     This middleware runs after authentication and adds:
     - request.current_project: The current ProjectTenant (if any)
     - request.available_projects: Projects the user has access to
+    
+    available_projects is lazy: request.user is not touched (so no
+    authentication is forced) until a view actually reads it. When DRF
+    authenticates a request it sets request.user on the underlying
+    HttpRequest, so JWT-authenticated users are picked up as well.
     """
     
     def __init__(self, get_response):
@@ -74,18 +81,10 @@ class TenantContextMiddleware:
         # Add current project from tenant
         request.current_project = getattr(request, 'tenant', None)
         
-        # Add available projects for authenticated users
-        if hasattr(request, 'user') and request.user.is_authenticated:
-            # For now, return all projects the user's organization has access to
-            # This can be refined based on ProjectMembership
-            if hasattr(request.user, 'organization_id') and request.user.organization_id:
-                request.available_projects = ProjectTenant.objects.filter(
-                    organization_id=request.user.organization_id
-                )
-            else:
-                request.available_projects = ProjectTenant.objects.none()
-        else:
-            request.available_projects = ProjectTenant.objects.none()
+        # Resolved on first access, from the per-user cache
+        request.available_projects = SimpleLazyObject(
+            lambda: get_available_projects(getattr(request, 'user', None))
+        )
         
         response = self.get_response(request)
         return response
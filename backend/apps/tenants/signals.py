@@ -0,0 +1,35 @@
+"""
+Tenant Signals - keep the tenant caches in sync with model changes.
+"""
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import invalidate_available_projects, invalidate_tenant
+from .models import ProjectTenant
+
+
+@receiver(post_save, sender=ProjectTenant)
+@receiver(post_delete, sender=ProjectTenant)
+def invalidate_project_tenant(sender, instance, **kwargs):
+    """Drop the cached tenant (or negative entry) when a project changes."""
+    invalidate_tenant(instance.pk)
+
+    # Users of the organization may gain or lose access
+    from django.contrib.auth import get_user_model
+
+    invalidate_available_projects(
+        *get_user_model().objects.filter(
+            organization_id=instance.organization_id
+        ).values_list("id", flat=True)
+    )
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_projects(sender, instance, update_fields=None, **kwargs):
+    """The user's organization decides which projects are available."""
+    fields = {"organization", "organization_id"}
+    if update_fields is not None and not fields & set(update_fields):
+        return
+    invalidate_available_projects(instance.pk)
@@ -0,0 +1,144 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django_tenants.test.cases import TenantTestCase
+from rest_framework.test import APIClient
+
+from apps.administration.models import Organization, ProjectMembership, Role, User
+
+from . import fanout
+from .cache import get_available_project_ids
+from .fanout import run_in_schemas
+from .models import ProjectTenant
+
+
+def create_projects(*organizations):
+    # bulk_create skips save(), so no project schema is created
+    return ProjectTenant.objects.bulk_create(
+        ProjectTenant(
+            schema_name=f"proj_test_{n}",
+            name=f"Project {n}",
+            project_no=f"TEST-{n}",
+            organization_id=organization.pk,
+        )
+        for n, organization in enumerate(organizations, 1)
+    )
+
+
+class AvailableProjectsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.acme = Organization.objects.create(name="Acme", code="ACME")
+        self.other = Organization.objects.create(name="Other", code="OTHER")
+        self.acme_project, self.other_project = create_projects(self.acme, self.other)
+        self.user = User.objects.create(username="engineer", organization=self.acme)
+
+    def test_only_organization_projects_are_available(self):
+        role = Role.objects.create(organization=self.other, name="Guest", code="GUEST")
+        ProjectMembership.objects.create(
+            user=self.user, project_id=self.other_project.pk, role=role
+        )
+
+        self.assertEqual(get_available_project_ids(self.user), [self.acme_project.pk])
+
+    def test_user_without_organization_has_no_projects(self):
+        user = User.objects.create(username="visitor")
+
+        self.assertEqual(get_available_project_ids(user), [])
+
+    def test_organization_change_invalidates_cached_projects(self):
+        self.assertEqual(get_available_project_ids(self.user), [self.acme_project.pk])
+
+        self.user.organization = self.other
+        self.user.save(update_fields=["organization_id"])
+
+        self.assertEqual(get_available_project_ids(self.user), [self.other_project.pk])
+
+    def test_unrelated_user_update_keeps_cached_projects(self):
+        get_available_project_ids(self.user)
+        ProjectTenant.objects.filter(pk=self.other_project.pk).update(
+            organization_id=self.acme.pk
+        )
+
+        self.user.save(update_fields=["last_login"])
+
+        self.assertEqual(get_available_project_ids(self.user), [self.acme_project.pk])
+
+
+# =============================================================================
+# Fan-out
+# =============================================================================
+
+class FanoutTests(TenantTestCase):
+    @classmethod
+    def setup_tenant(cls, tenant):
+        tenant.name = "Fan-out tests"
+        tenant.project_no = "TEST-FANOUT"
+        tenant.organization_id = 1
+
+    @mock.patch.object(fanout, "FANOUT_GRACE_SECONDS", 0.1)
+    def test_timeout_starts_when_a_worker_picks_the_schema_up(self):
+        def slow(tenant):
+            time.sleep(0.2)
+            return connection.schema_name
+
+        # One worker: the last schema starts 0.4s in, past a shared deadline
+        results = run_in_schemas([self.tenant] * 3, slow, timeout=0.3, max_workers=1)
+
+        self.assertEqual([result.status for result in results], ["ok"] * 3)
+        self.assertEqual(
+            [result.value for result in results], [self.tenant.schema_name] * 3
+        )
+
+    @mock.patch.object(fanout, "FANOUT_GRACE_SECONDS", 0.1)
+    def test_slow_query_times_out(self):
+        def sleep_in_database(tenant):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_sleep(2)")
+
+        started = time.monotonic()
+        (result,) = run_in_schemas([self.tenant], sleep_in_database, timeout=0.2)
+
+        self.assertEqual(result.status, "timeout")
+        self.assertLess(time.monotonic() - started, 1)
+
+
+def search_projects(tenants, text, **options):
+    return {"partial": False, "projects": [], "results": [text, options]}
+
+
+@override_settings(TENANT_SEARCH_FUNCTION="apps.tenants.tests.search_projects")
+class ProjectSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create(username="admin", is_superuser=True)
+        )
+
+    def test_search_calls_the_configured_function(self):
+        response = self.client.get(
+            "/api/tenants/projects/search/", {"q": "FT-101", "limit": 5}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["results"], ["FT-101", {"limit": 5, "highlight": True}]
+        )
+
+    def test_highlight_flag(self):
+        for value, highlight in (("false", False), ("", True), ("YES", True)):
+            response = self.client.get(
+                "/api/tenants/projects/search/", {"q": "FT-101", "highlight": value}
+            )
+
+            self.assertEqual(response.json()["results"][1]["highlight"], highlight)
+
+    def test_invalid_limit(self):
+        response = self.client.get(
+            "/api/tenants/projects/search/", {"q": "FT-101", "limit": "many"}
+        )
+
+        self.assertEqual(response.status_code, 400)
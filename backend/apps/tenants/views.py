@@ -6,8 +6,14 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
 from django.db import connection
+from django.utils.module_loading import import_string
+from django_tenants.utils import get_public_schema_name
 
+from apps.core.params import query_flag
+
+from .cache import get_available_projects
 from .models import ProjectTenant, ProjectDomain
 from .serializers import (
     ProjectTenantSerializer,
@@ -81,6 +87,54 @@ class ProjectTenantViewSet(viewsets.ModelViewSet):
             'message': 'No project selected (using public schema)',
         })
 
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Search tags across every project the user can access.
+
+        Query params: q (required), limit, projects (comma separated ids),
+        highlight. Projects are searched concurrently; a project that times
+        out is reported in "projects" and the response is marked partial.
+        """
+        query = request.query_params.get('q', '')
+        if not query:
+            return Response(
+                {'error': "Query parameter 'q' is required"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        options = {}
+        try:
+            if 'limit' in request.query_params:
+                options['limit'] = int(request.query_params['limit'])
+            project_ids = [
+                int(project_id)
+                for project_id in request.query_params.get('projects', '').split(',')
+                if project_id.strip()
+            ]
+        except ValueError:
+            return Response(
+                {'error': 'limit and projects must be integers'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        user = request.user
+        tenants = (
+            ProjectTenant.objects.all() if user.is_superuser
+            else get_available_projects(user)
+        )
+        tenants = tenants.exclude(schema_name=get_public_schema_name()).order_by('name')
+        if project_ids:
+            tenants = tenants.filter(pk__in=project_ids)
+
+        options['highlight'] = query_flag(request, 'highlight', default=True)
+        # Provided by the app owning the tags (TENANT_SEARCH_FUNCTION)
+        search_projects = import_string(settings.TENANT_SEARCH_FUNCTION)
+        return Response({
+            'query': query,
+            **search_projects(tenants, query, **options),
+        })
+
 
 class ProjectDomainViewSet(viewsets.ModelViewSet):
     """ViewSet for managing ProjectDomains."""
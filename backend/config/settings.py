@@ -40,6 +40,7 @@ SHARED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     # Third-party apps
     "rest_framework",
     "rest_framework_simplejwt",
@@ -73,6 +74,56 @@ PUBLIC_SCHEMA_NAME = "public"
 # Show tenant info in admin
 SHOW_PUBLIC_IF_NO_TENANT_FOUND = True
 
+# Tenant resolution cache (see apps.tenants.cache)
+TENANT_CACHE_TTL = int(os.getenv("TENANT_CACHE_TTL", "300"))  # Redis tier, seconds
+# In-process tier: TTL in seconds and LRU size
+TENANT_CACHE_LOCAL_TTL = int(os.getenv("TENANT_CACHE_LOCAL_TTL", "30"))
+TENANT_CACHE_SIZE = int(os.getenv("TENANT_CACHE_SIZE", "1024"))
+# Unknown project ids
+TENANT_CACHE_NEGATIVE_TTL = int(os.getenv("TENANT_CACHE_NEGATIVE_TTL", "30"))
+TENANT_AVAILABLE_PROJECTS_TTL = int(os.getenv("TENANT_AVAILABLE_PROJECTS_TTL", "300"))
+
+# Cross-project fan-out (see apps.tenants.fanout)
+# Seconds per schema, and number of schemas queried concurrently
+TENANT_FANOUT_TIMEOUT = float(os.getenv("TENANT_FANOUT_TIMEOUT", "5"))
+TENANT_FANOUT_WORKERS = int(os.getenv("TENANT_FANOUT_WORKERS", "8"))
+# Cross-project tag search: search_projects(tenants, text, limit=..., highlight=...)
+TENANT_SEARCH_FUNCTION = "apps.core_engineering.search.search_projects"
+
+# Reference data cache (see apps.core_engineering.refcache)
+# Seconds: Redis tier TTL per generation, generation re-check interval, and
+# max wait for another process's load
+REFCACHE_TTL = int(os.getenv("REFCACHE_TTL", "3600"))
+REFCACHE_LOCAL_TTL = float(os.getenv("REFCACHE_LOCAL_TTL", "1"))
+REFCACHE_LOCK_TIMEOUT = float(os.getenv("REFCACHE_LOCK_TIMEOUT", "10"))
+
+# Serializer-free rendering of large tag lists (see apps.core_engineering.fastpath)
+FAST_READ_ENABLED = os.getenv("FAST_READ_ENABLED", "False").lower() in (
+    "true", "1", "yes"
+)
+
+# Audit log writer (see apps.administration.audit)
+AUDIT_LOG_MODE = os.getenv("AUDIT_LOG_MODE", "async")  # async | sync (tests) | off
+# Queued records before back-pressure, and records per COPY
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "10000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+# Seconds: max write delay, wait for buffer room before writing inline, and
+# time allowed to drain the buffer at exit
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1"))
+AUDIT_ENQUEUE_TIMEOUT = float(os.getenv("AUDIT_ENQUEUE_TIMEOUT", "0.5"))
+AUDIT_SHUTDOWN_TIMEOUT = float(os.getenv("AUDIT_SHUTDOWN_TIMEOUT", "10"))
+
+# Audit log storage (see apps.administration.audit_storage)
+# Monthly partitions created ahead, months kept in the table before archiving,
+# and the default per-organization retention
+AUDIT_PARTITIONS_AHEAD = int(os.getenv("AUDIT_PARTITIONS_AHEAD", "3"))
+AUDIT_ARCHIVE_AFTER_MONTHS = int(os.getenv("AUDIT_ARCHIVE_AFTER_MONTHS", "12"))
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "84"))
+# Gzipped NDJSON archives
+AUDIT_ARCHIVE_DIR = Path(
+    os.getenv("AUDIT_ARCHIVE_DIR", str(BASE_DIR / "audit_archive"))
+)
+
 MIDDLEWARE = [
     # Tenant middleware must be first
     "apps.tenants.middleware.HeaderBasedTenantMiddleware",
@@ -83,6 +134,7 @@ MIDDLEWARE = [
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "apps.tenants.middleware.TenantContextMiddleware",
+    "apps.administration.middleware.AuditContextMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -160,6 +212,11 @@ USE_TZ = True
 STATIC_URL = "static/"
 STATIC_ROOT = BASE_DIR / "staticfiles"
 
+# Request size limit - raised for batch endpoints (spec validation, bulk edits)
+DATA_UPLOAD_MAX_MEMORY_SIZE = int(
+    os.getenv("DATA_UPLOAD_MAX_MEMORY_SIZE", str(50 * 1024 * 1024))
+)
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 